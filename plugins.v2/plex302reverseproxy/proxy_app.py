@@ -1,6 +1,5 @@
 from asyncio import Lock, create_task, gather, get_event_loop
 from contextlib import asynccontextmanager
-from time import monotonic
 from typing import Any, Dict, List, Tuple
 from urllib.parse import quote, urlparse
 
@@ -21,6 +20,8 @@ from websockets import connect
 
 from app.log import logger
 
+from .ttl_cache import LruTtlCache
+
 # 直链解析结果缓存 TTL（秒）：缓存的是 STRM 内部地址/规则替换结果（稳定中间地址），可长缓存
 REDIRECT_URL_CACHE_TTL_SECONDS = 900
 # Part 路径缓存 TTL（秒）：来自元数据 API 的 Part.key -> file 映射
@@ -187,14 +188,22 @@ def create_app(
         app.state.http_client_no_follow = AsyncClient(
             follow_redirects=False, limits=limits
         )
-        # part_key(如 /library/parts/1/2/file) -> (file_path, expiry)
-        app.state.part_info_cache = {}
-        # part_path -> (strm_content_url, expiry)
-        app.state.strm_content_cache = {}
+        # part_key(如 /library/parts/1/2/file) -> file_path
+        app.state.part_info_cache = LruTtlCache(
+            PART_INFO_CACHE_MAX_SIZE, PART_INFO_CACHE_TTL_SECONDS, name="part_info"
+        )
+        # part_path -> strm_content_url
+        app.state.strm_content_cache = LruTtlCache(
+            PART_INFO_CACHE_MAX_SIZE, PART_INFO_CACHE_TTL_SECONDS, name="strm_content"
+        )
         app.state.part_info_lock = Lock()
-        # (part_key, header_hash) -> (final_url, expiry)
-        app.state.redirect_url_cache = {}
-        app.state.redirect_cache_order = []
+        # part_path -> final_url
+        app.state.redirect_url_cache = LruTtlCache(
+            REDIRECT_URL_CACHE_MAX_SIZE,
+            REDIRECT_URL_CACHE_TTL_SECONDS,
+            lazy_expire=False,
+            name="redirect_url",
+        )
         app.state.redirect_cache_lock = Lock()
         # 单飞合并：part_path -> Future[str]，并发相同请求共享一次解析
         app.state.inflight_redirects = {}
@@ -225,20 +234,26 @@ def create_app(
         :param part_key: Part 的 key，如 /library/parts/123/456/file
         :param file_path: 媒体文件的真实路径
         """
-        if not part_key or not file_path:
-            return
-        cache = request.app.state.part_info_cache
-        async with request.app.state.part_info_lock:
-            if len(cache) >= PART_INFO_CACHE_MAX_SIZE:
-                now = monotonic()
-                expired = [k for k, v in cache.items() if v[1] < now]
-                for k in expired:
-                    cache.pop(k, None)
-                while len(cache) >= PART_INFO_CACHE_MAX_SIZE:
-                    cache.pop(next(iter(cache)), None)
+        await _cache_parts(request, [(part_key, file_path)])
+
+    async def _cache_parts(
+        request: Request, pairs: List[Tuple[str, str]]
+    ) -> Dict[str, int]:
+        """
+        批量缓存 Part 映射：整批只获取一次锁、最多做一次容量淘汰
+
+        :param request: 当前请求
+        :param pairs: (part_key, file_path) 列表
+        :return: {inserted, updated, evicted} 计数
+        """
+        rows = [
             # part_key 可能带查询参数，只取 path 部分
-            key = part_key.split("?", 1)[0]
-            cache[key] = (file_path, monotonic() + PART_INFO_CACHE_TTL_SECONDS)
+            (part_key.split("?", 1)[0], file_path)
+            for part_key, file_path in pairs
+            if part_key and file_path
+        ]
+        async with request.app.state.part_info_lock:
+            return request.app.state.part_info_cache.put_many(rows)
 
     async def _get_cached_part_path(request: Request, part_key: str) -> str:
         """
@@ -248,16 +263,8 @@ def create_app(
         :param part_key: Part 的 key（请求路径）
         :return: 命中的文件路径，未命中返回空串
         """
-        cache = request.app.state.part_info_cache
         async with request.app.state.part_info_lock:
-            entry = cache.get(part_key)
-            if not entry:
-                return ""
-            file_path, expiry = entry
-            if monotonic() >= expiry:
-                cache.pop(part_key, None)
-                return ""
-            return file_path
+            return request.app.state.part_info_cache.get(part_key, "")
 
     def _extract_parts_from_json(data: Any) -> List[Tuple[str, str]]:
         """
@@ -346,8 +353,12 @@ def create_app(
         except Exception:
             logger.debug("解析元数据响应失败，跳过 Part 缓存", exc_info=True)
             return 0
-        for key, file_path in pairs:
-            await _cache_part_info(request, key, file_path)
+        stats = await _cache_parts(request, pairs)
+        if stats["evicted"]:
+            logger.debug(
+                "Part 缓存批量写入: 新增 %s, 更新 %s, 淘汰 %s",
+                stats["inserted"], stats["updated"], stats["evicted"],
+            )
         # 单集详情页（Part 数少）时后台预热 STRM 解析，正式播放可直接命中缓存
         if 0 < len(pairs) <= PREWARM_MAX_PARTS:
             for key, file_path in pairs:
@@ -412,8 +423,8 @@ def create_app(
             )
             if resp.status_code == 200:
                 pairs = _extract_parts_from_json(resp.json())
+                await _cache_parts(request, pairs)
                 for key, file_path in pairs:
-                    await _cache_part_info(request, key, file_path)
                     if key.split("?", 1)[0] == part_path:
                         return file_path
                 if pairs:
@@ -434,13 +445,10 @@ def create_app(
         :return: STRM 指向的远程 URL，失败返回空串
         """
         strm_cache = request.app.state.strm_content_cache
-        entry = strm_cache.get(part_path)
-        if entry:
-            content, expiry = entry
-            if monotonic() < expiry:
-                logger.debug("STRM 内容缓存命中: %s", part_path)
-                return content
-            strm_cache.pop(part_path, None)
+        content = strm_cache.get(part_path)
+        if content:
+            logger.debug("STRM 内容缓存命中: %s", part_path)
+            return content
         token = _extract_token(request)
         if not token:
             return ""
@@ -451,18 +459,7 @@ def create_app(
             if 300 < resp.status_code < 309:
                 location = resp.headers.get("location", "")
                 if location and not location.startswith(plex_host):
-                    if len(strm_cache) >= PART_INFO_CACHE_MAX_SIZE:
-                        now = monotonic()
-                        for k in [
-                            k for k, v in strm_cache.items() if v[1] < now
-                        ]:
-                            strm_cache.pop(k, None)
-                        while len(strm_cache) >= PART_INFO_CACHE_MAX_SIZE:
-                            strm_cache.pop(next(iter(strm_cache)), None)
-                    strm_cache[part_path] = (
-                        location,
-                        monotonic() + PART_INFO_CACHE_TTL_SECONDS,
-                    )
+                    strm_cache.put(part_path, location)
                     return location
         except Exception:
             logger.debug("STRM 内容解析失败: %s", part_path, exc_info=True)
@@ -487,21 +484,13 @@ def create_app(
         # 缓存的是稳定中间地址（与客户端无关），仅按路径缓存以提高跨客户端命中率
         cache_key = part_path
         cache = request.app.state.redirect_url_cache
-        order = request.app.state.redirect_cache_order
         lock = request.app.state.redirect_cache_lock
 
         async with lock:
-            entry = cache.get(cache_key)
-            if entry:
-                final_url, expiry = entry
-                if monotonic() < expiry:
-                    logger.debug("直链缓存命中: %s", part_path)
-                    return RedirectResponse(url=final_url, status_code=302)
-                cache.pop(cache_key, None)
-                try:
-                    order.remove(cache_key)
-                except ValueError:
-                    pass
+            final_url = cache.get(cache_key)
+        if final_url:
+            logger.debug("直链缓存命中: %s", part_path)
+            return RedirectResponse(url=final_url, status_code=302)
 
         # 单飞合并：相同 part_path 的并发解析只执行一次
         inflight = request.app.state.inflight_redirects
@@ -537,15 +526,7 @@ def create_app(
         final_url = http_url
 
         async with lock:
-            now = monotonic()
-            expired = [k for k in order if cache.get(k) and cache[k][1] < now]
-            for k in expired:
-                cache.pop(k, None)
-            order[:] = [k for k in order if k not in frozenset(expired)]
-            while len(cache) >= REDIRECT_URL_CACHE_MAX_SIZE and order:
-                cache.pop(order.pop(0), None)
-            cache[cache_key] = (final_url, now + REDIRECT_URL_CACHE_TTL_SECONDS)
-            order.append(cache_key)
+            cache.put(cache_key, final_url)
 
         logger.info("302 重定向: %s -> %s", part_path, final_url)
         return RedirectResponse(url=final_url, status_code=302)
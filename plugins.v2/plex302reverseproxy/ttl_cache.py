@@ -0,0 +1,202 @@
+"""302 代理热路径使用的 LRU + TTL 缓存：get/put/淘汰均为 O(1)。"""
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class LruTtlCache:
+    """
+    带过期时间的 LRU 缓存。
+
+    以 OrderedDict 维护访问顺序：命中/写入移到队尾，容量满时从队首淘汰最久未用项，
+    不再整表扫描过期项。过期项默认惰性清理（访问时发现过期才删除）；
+    lazy_expire=False 时写入前额外从队首顺带清掉已过期的连续项（均摊 O(1)）。
+
+    非线程安全；在单个事件循环内使用时无需额外加锁。
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        lazy_expire: bool = True,
+        name: str = "",
+    ) -> None:
+        """
+        初始化缓存。
+
+        :param max_size: 最大条目数，超出时淘汰最久未访问项
+        :param ttl_seconds: 默认过期秒数
+        :param lazy_expire: True 仅在访问时清理过期项；False 写入时顺带清理队首过期项
+        :param name: 缓存名称，用于统计展示
+        """
+        self.name = name
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = float(ttl_seconds)
+        self.lazy_expire = lazy_expire
+        # key -> (value, expiry)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and monotonic() < entry[1]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        读取缓存并刷新其 LRU 位置；过期视为未命中并删除。
+
+        :param key: 缓存键
+        :param default: 未命中时返回的默认值
+        :return: 缓存值或 default
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expiry = entry
+        if monotonic() >= expiry:
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        读取缓存但不刷新 LRU 位置、不计入命中统计。
+
+        :param key: 缓存键
+        :param default: 未命中或已过期时返回的默认值
+        :return: 缓存值或 default
+        """
+        entry = self._data.get(key)
+        if entry is None or monotonic() >= entry[1]:
+            return default
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> bool:
+        """
+        写入缓存；已存在则更新值与过期时间，不存在且已满时淘汰最久未用项。
+
+        :param key: 缓存键
+        :param value: 缓存值
+        :param ttl: 本条过期秒数，缺省用初始化时的 ttl_seconds
+        :return: 新插入返回 True，更新已有项返回 False
+        """
+        now = monotonic()
+        expiry = now + (self.ttl_seconds if ttl is None else ttl)
+        if key in self._data:
+            self._data[key] = (value, expiry)
+            self._data.move_to_end(key)
+            return False
+        if not self.lazy_expire:
+            self._trim_expired_head(now)
+        while len(self._data) >= self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        self._data[key] = (value, expiry)
+        return True
+
+    def put_many(
+        self, items: Iterable[Tuple[Hashable, Any]], ttl: Optional[float] = None
+    ) -> Dict[str, int]:
+        """
+        批量写入：先整批写入，最后只做一次容量淘汰。
+
+        :param items: (key, value) 序列；同一批内重复的 key 以最后一次为准
+        :param ttl: 本批过期秒数，缺省用初始化时的 ttl_seconds
+        :return: {inserted, updated, evicted} 计数
+        """
+        now = monotonic()
+        expiry = now + (self.ttl_seconds if ttl is None else ttl)
+        if not self.lazy_expire:
+            self._trim_expired_head(now)
+        inserted = updated = 0
+        data = self._data
+        for key, value in items:
+            if key in data:
+                data.move_to_end(key)
+                updated += 1
+            else:
+                inserted += 1
+            data[key] = (value, expiry)
+        evicted = 0
+        while len(data) > self.max_size:
+            data.popitem(last=False)
+            evicted += 1
+        self.evictions += evicted
+        return {"inserted": inserted, "updated": updated, "evicted": evicted}
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        删除并返回缓存值（不论是否过期）。
+
+        :param key: 缓存键
+        :param default: 不存在时返回的默认值
+        :return: 被删除的值或 default
+        """
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        """清空缓存（保留统计计数）。"""
+        self._data.clear()
+
+    def items(self) -> Iterable[Tuple[Hashable, Any]]:
+        """
+        按 LRU 顺序（最久未用在前）遍历未过期条目，不刷新位置。
+
+        :return: (key, value) 迭代器
+        """
+        now = monotonic()
+        return [(k, v) for k, (v, exp) in self._data.items() if now < exp]
+
+    def purge_expired(self) -> int:
+        """
+        全量清理过期项（O(n)，仅供后台维护或统计前调用，热路径不要用）。
+
+        :return: 清理的条目数
+        """
+        now = monotonic()
+        expired = [k for k, (_, exp) in self._data.items() if exp <= now]
+        for k in expired:
+            del self._data[k]
+        self.expirations += len(expired)
+        return len(expired)
+
+    def _trim_expired_head(self, now: float) -> None:
+        """从 LRU 队首连续清理已过期项，遇到未过期项即停止。"""
+        while self._data:
+            key, (_, expiry) = next(iter(self._data.items()))
+            if expiry > now:
+                break
+            del self._data[key]
+            self.expirations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回缓存统计。
+
+        :return: {name, size, max_size, hits, misses, hit_ratio, evictions, expirations}
+        """
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -1,11 +1,16 @@
 """PLEX 工具箱插件：Plex 302 反向代理 + STRM 媒体流信息补全。"""
 
 import json
+from asyncio import to_thread
+from contextlib import contextmanager
+from functools import wraps
+from inspect import iscoroutinefunction
 from threading import Lock, Thread
 from time import monotonic, time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from fastapi import Request
+from httpx import AsyncClient, Client
 from uvicorn import Config, Server
 
 from app.log import logger
@@ -18,10 +23,24 @@ except Exception:
     IntervalTrigger = None
 
 from .proxy_app import create_app
-from .emby_client import EmbyClient
+from .emby_client import EmbyClient, EmbySeriesIndex
 from .helper_client import HelperClient
-from .mediainfo import MediaInfoCompleter
-from .plex_client import PlexClient
+from .http_pool import (
+    DEFAULT_MAX_CONNECTIONS,
+    DEFAULT_MAX_KEEPALIVE,
+    HttpSessionPool,
+)
+from .ffprobe_source import (
+    FFPROBE_DEFAULT_CONCURRENCY,
+    FFPROBE_DEFAULT_LADDER,
+    FFPROBE_DEFAULT_PER_HOST,
+    PROBE_MODE_HEADER,
+    FfprobePool,
+)
+from .mediainfo import SOURCE_MODE_EMBY, MediaInfoCompleter
+from .plex_client import DEFAULT_ENUM_IN_FLIGHT, PlexClient
+from .result_cache import MediaInfoResultCache
+from .write_queue import HelperWriteScheduler, PendingWriteQueue
 from .poster_fixer import PosterFixer
 from .scrape_tools import ScrapeTools
 
@@ -29,6 +48,43 @@ from .scrape_tools import ScrapeTools
 PIN_RULES_SEP = " => "
 
 
+def _uses_http_pool(func: Callable) -> Callable:
+    """
+    方法装饰器：执行期间登记为共享会话池的使用者（支持协程方法），
+    期间换池或停止服务时旧池等其结束后再关闭，在途请求不被中断。
+    """
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def _async_wrapper(self: "PlexToolbox", *args: Any, **kwargs: Any) -> Any:
+            # 协程跑在代理事件循环上，旧池交给后台线程关闭，不阻塞事件循环
+            self._enter_pool_use()
+            try:
+                return await func(self, *args, **kwargs)
+            finally:
+                retired = self._leave_pool_use()
+                if retired:
+                    Thread(target=_close_pools, args=(retired,), daemon=True).start()
+
+        return _async_wrapper
+
+    @wraps(func)
+    def _wrapper(self: "PlexToolbox", *args: Any, **kwargs: Any) -> Any:
+        with self._pool_in_use():
+            return func(self, *args, **kwargs)
+
+    return _wrapper
+
+
+def _close_pools(pools: List[HttpSessionPool]) -> None:
+    """
+    关闭已换下的会话池。
+
+    :param pools: 待关闭的会话池
+    """
+    for pool in pools:
+        pool.close()
+
+
 def _parse_pin_rules(raw: str) -> List[Tuple[str, str]]:
     """
     解析顶置路径规则字符串为 (路径前缀, 目标URL) 列表。
@@ -82,6 +138,7 @@ class PlexToolbox(_PluginBase):
     _force_direct_play = True
     _server = None
     _thread = None
+    _proxy_app = None
 
     # ---- 媒体信息补全配置 ----
     _mediainfo_enabled = False
@@ -91,9 +148,19 @@ class PlexToolbox(_PluginBase):
     _emby_url = ""
     _emby_apikey = ""
     _use_emby = True
+    _emby_prefetch = True
+    _result_cache_enabled = True
+    _source_mode = SOURCE_MODE_EMBY
+    _ffprobe_concurrency = FFPROBE_DEFAULT_CONCURRENCY
+    _ffprobe_per_host = FFPROBE_DEFAULT_PER_HOST
+    _ffprobe_ladder = FFPROBE_DEFAULT_LADDER
+    _ffprobe_probe_mode = PROBE_MODE_HEADER
     _overwrite_streams = True
     _only_missing = True
     _concurrency = 3
+    _enum_concurrency = DEFAULT_ENUM_IN_FLIGHT
+    _plex_rate_limit = 0.0
+    _enum_bulk = True
     _sections = ""
     _running = False
 
@@ -108,6 +175,27 @@ class PlexToolbox(_PluginBase):
     _helper_health_alerted = False
     _helper_health_ok: Optional[bool] = None
 
+    # ---- 共享 HTTP 会话池 ----
+    _http_max_connections = DEFAULT_MAX_CONNECTIONS
+    _http_max_keepalive = DEFAULT_MAX_KEEPALIVE
+    _http2 = False
+    _http_pool: Optional[HttpSessionPool] = None
+    _http_pool_lock = Lock()
+    # 正在使用会话池的补全 / 补写任务数，与等它们结束后再关闭的旧池
+    _http_pool_users = 0
+    _retired_http_pools: List[HttpSessionPool] = []
+    # Emby 剧集索引缓存（跨补全运行与播前补全共享）
+    _emby_index: Optional[EmbySeriesIndex] = None
+    # 媒体信息解析结果持久化缓存（按需打开，stop_service 时关闭）
+    _result_cache: Optional[MediaInfoResultCache] = None
+    _result_cache_lock = Lock()
+    # ffprobe 探测池（按需创建，stop_service 时关闭）
+    _ffprobe_pool: Optional[FfprobePool] = None
+    _ffprobe_pool_lock = Lock()
+    # helper 待写队列（Plex 繁忙时写不进去的媒体信息，按需打开，stop_service 时关闭）
+    _pending_writes: Optional[PendingWriteQueue] = None
+    _pending_writes_lock = Lock()
+
     def _proxy_signature(self) -> Tuple:
         """
         构建反代相关配置的签名，用于判断保存配置后是否需要重启代理。
@@ -155,8 +243,12 @@ class PlexToolbox(_PluginBase):
             self._plex_direct_host = (config.get("plex_direct_host") or "").strip()
             self._helper_url = (config.get("helper_url") or "").strip()
             self._helper_token = (config.get("helper_token") or "").strip()
+            old_emby = (self._emby_url, self._emby_apikey)
             self._emby_url = (config.get("emby_url") or "").strip()
             self._emby_apikey = (config.get("emby_apikey") or "").strip()
+            if old_emby != (self._emby_url, self._emby_apikey):
+                # 换了 Emby 服务器，旧索引作废
+                self._emby_index = None
             self._use_emby = config.get("use_emby", True)
             self._overwrite_streams = config.get("overwrite_streams", True)
             self._only_missing = config.get("only_missing", True)
@@ -164,6 +256,46 @@ class PlexToolbox(_PluginBase):
                 self._concurrency = int(config.get("concurrency") or 3)
             except (TypeError, ValueError):
                 self._concurrency = 3
+            try:
+                self._enum_concurrency = int(
+                    config.get("enum_concurrency") or DEFAULT_ENUM_IN_FLIGHT
+                )
+            except (TypeError, ValueError):
+                self._enum_concurrency = DEFAULT_ENUM_IN_FLIGHT
+            try:
+                self._plex_rate_limit = float(config.get("plex_rate_limit") or 0)
+            except (TypeError, ValueError):
+                self._plex_rate_limit = 0.0
+            self._enum_bulk = config.get("enum_bulk", True)
+            self._emby_prefetch = config.get("emby_prefetch", True)
+            self._result_cache_enabled = config.get("result_cache", True)
+            # ffprobe 数据源
+            old_probe_sig = (
+                self._ffprobe_concurrency, self._ffprobe_per_host,
+                self._ffprobe_ladder, self._ffprobe_probe_mode,
+            )
+            self._source_mode = config.get("source_mode") or SOURCE_MODE_EMBY
+            try:
+                self._ffprobe_concurrency = int(
+                    config.get("ffprobe_concurrency") or FFPROBE_DEFAULT_CONCURRENCY
+                )
+            except (TypeError, ValueError):
+                self._ffprobe_concurrency = FFPROBE_DEFAULT_CONCURRENCY
+            try:
+                self._ffprobe_per_host = int(
+                    config.get("ffprobe_per_host") or FFPROBE_DEFAULT_PER_HOST
+                )
+            except (TypeError, ValueError):
+                self._ffprobe_per_host = FFPROBE_DEFAULT_PER_HOST
+            self._ffprobe_ladder = (
+                config.get("ffprobe_ladder") or FFPROBE_DEFAULT_LADDER
+            ).strip()
+            self._ffprobe_probe_mode = config.get("ffprobe_probe_mode") or PROBE_MODE_HEADER
+            if old_probe_sig != (
+                self._ffprobe_concurrency, self._ffprobe_per_host,
+                self._ffprobe_ladder, self._ffprobe_probe_mode,
+            ):
+                self._close_ffprobe_pool()
             self._sections = (config.get("sections") or "").strip()
             # 自动补全触发
             self._webhook_enabled = config.get("webhook_enabled", False)
@@ -175,6 +307,23 @@ class PlexToolbox(_PluginBase):
                 self._forward_episodes = int(config.get("forward_episodes") or 5)
             except (TypeError, ValueError):
                 self._forward_episodes = 5
+            # 共享 HTTP 会话池
+            old_pool_sig = (self._http_max_connections, self._http_max_keepalive, self._http2)
+            try:
+                self._http_max_connections = int(
+                    config.get("http_max_connections") or DEFAULT_MAX_CONNECTIONS
+                )
+            except (TypeError, ValueError):
+                self._http_max_connections = DEFAULT_MAX_CONNECTIONS
+            try:
+                self._http_max_keepalive = int(
+                    config.get("http_max_keepalive") or DEFAULT_MAX_KEEPALIVE
+                )
+            except (TypeError, ValueError):
+                self._http_max_keepalive = DEFAULT_MAX_KEEPALIVE
+            self._http2 = config.get("http2", False)
+            if old_pool_sig != (self._http_max_connections, self._http_max_keepalive, self._http2):
+                self._close_http_pool()
             self._update_config()
 
         # 仅当反代相关配置变化或代理未运行时才重启代理，避免保存补全配置导致断链
@@ -199,12 +348,15 @@ class PlexToolbox(_PluginBase):
             force_direct_play=self._force_direct_play,
             preplay_cooldown_seconds=self._dedup_window,
             on_pre_play=self._on_pre_play_from_proxy,
+            on_pre_play_async=self._on_pre_play_async,
+            part_index_path=self._part_index_path(),
         )
         try:
             uv_config = Config(app=app, host=self._host, port=self._port, log_config=None)
             self._server = Server(uv_config)
             self._thread = Thread(target=self._server.run, daemon=True)
             self._thread.start()
+            self._proxy_app = app
             logger.info(
                 "PlexToolbox 302 代理已启动: %s:%s -> %s",
                 self._host, self._port, self._plex_host,
@@ -214,6 +366,18 @@ class PlexToolbox(_PluginBase):
             self._server = None
             self._thread = None
 
+    def _part_index_path(self) -> str:
+        """
+        返回 302 代理 Part 解析索引的持久化文件路径（位于插件数据目录）。
+
+        :return: 索引文件路径，数据目录不可用时返回空串（不持久化）
+        """
+        try:
+            return str(self.get_data_path() / "part_index.db")
+        except Exception as e:
+            logger.warning("PlexToolbox 无法获取插件数据目录，Part 索引不持久化: %s", e)
+            return ""
+
     def _update_config(self) -> None:
         """将当前配置写回插件配置存储。"""
         self.update_config(
@@ -236,13 +400,161 @@ class PlexToolbox(_PluginBase):
                 "overwrite_streams": self._overwrite_streams,
                 "only_missing": self._only_missing,
                 "concurrency": self._concurrency,
+                "enum_concurrency": self._enum_concurrency,
+                "plex_rate_limit": self._plex_rate_limit,
+                "enum_bulk": self._enum_bulk,
+                "emby_prefetch": self._emby_prefetch,
+                "result_cache": self._result_cache_enabled,
+                "source_mode": self._source_mode,
+                "ffprobe_concurrency": self._ffprobe_concurrency,
+                "ffprobe_per_host": self._ffprobe_per_host,
+                "ffprobe_ladder": self._ffprobe_ladder,
+                "ffprobe_probe_mode": self._ffprobe_probe_mode,
                 "sections": self._sections,
                 "webhook_enabled": self._webhook_enabled,
                 "dedup_window": self._dedup_window,
                 "forward_episodes": self._forward_episodes,
+                "http_max_connections": self._http_max_connections,
+                "http_max_keepalive": self._http_max_keepalive,
+                "http2": self._http2,
             }
         )
 
+    def _session_pool(self) -> HttpSessionPool:
+        """
+        取插件共享的 HTTP 会话池（按需创建，stop_service 时关闭）。
+
+        :return: 会话池
+        """
+        with self._http_pool_lock:
+            if self._http_pool is None:
+                self._http_pool = HttpSessionPool(
+                    max_connections=self._http_max_connections,
+                    max_keepalive=self._http_max_keepalive,
+                    http2=bool(self._http2),
+                )
+            return self._http_pool
+
+    def _session(self, name: str) -> Optional[Client]:
+        """
+        取指定用途（plex/emby/helper）的共享长连接会话。
+
+        :param name: 会话用途名
+        :return: httpx.Client，池已关闭时为 None
+        """
+        return self._session_pool().session(name)
+
+    def _close_http_pool(self) -> None:
+        """
+        换下共享会话池（之后按新配置重建）：没有使用者时立即关闭释放长连接，
+        否则等当前补全 / 补写任务全部结束后再关闭。
+        """
+        with self._http_pool_lock:
+            pool, self._http_pool = self._http_pool, None
+            if pool is not None and self._http_pool_users:
+                self._retired_http_pools = self._retired_http_pools + [pool]
+                pool = None
+        if pool is not None:
+            pool.close()
+
+    def _enter_pool_use(self) -> None:
+        """登记一个会话池使用者。"""
+        with self._http_pool_lock:
+            self._http_pool_users += 1
+
+    def _leave_pool_use(self) -> List[HttpSessionPool]:
+        """
+        注销一个会话池使用者。
+
+        :return: 最后一个使用者结束时返回待关闭的旧池，否则为空列表
+        """
+        with self._http_pool_lock:
+            self._http_pool_users -= 1
+            retired: List[HttpSessionPool] = []
+            if not self._http_pool_users:
+                retired, self._retired_http_pools = self._retired_http_pools, []
+        return retired
+
+    @contextmanager
+    def _pool_in_use(self) -> Iterator[None]:
+        """登记一个会话池使用者；最后一个使用者结束时关闭已换下的旧池。"""
+        self._enter_pool_use()
+        try:
+            yield
+        finally:
+            _close_pools(self._leave_pool_use())
+
+    def _media_result_cache(self) -> Optional[MediaInfoResultCache]:
+        """
+        取插件共享的媒体信息解析结果缓存（按需打开）。
+
+        :return: 缓存实例；未启用或数据目录不可用时返回 None
+        """
+        if not self._result_cache_enabled:
+            return None
+        with self._result_cache_lock:
+            if self._result_cache is None:
+                try:
+                    db_path = str(self.get_data_path() / "mediainfo_cache.db")
+                except Exception as e:
+                    logger.warning("PlexToolbox 无法获取插件数据目录，不缓存解析结果: %s", e)
+                    return None
+                self._result_cache = MediaInfoResultCache(db_path)
+            return self._result_cache
+
+    def _close_result_cache(self) -> None:
+        """落盘并关闭解析结果缓存。"""
+        with self._result_cache_lock:
+            cache, self._result_cache = self._result_cache, None
+        if cache is not None:
+            cache.close()
+
+    def _pending_write_queue(self) -> Optional[PendingWriteQueue]:
+        """
+        取插件共享的 helper 待写队列（按需打开）。
+
+        :return: 队列实例；数据目录不可用时返回 None（写不进去的条目不保留）
+        """
+        with self._pending_writes_lock:
+            if self._pending_writes is None:
+                try:
+                    db_path = str(self.get_data_path() / "pending_writes.db")
+                except Exception as e:
+                    logger.warning("PlexToolbox 无法获取插件数据目录，不保留待写条目: %s", e)
+                    return None
+                self._pending_writes = PendingWriteQueue(db_path)
+            return self._pending_writes
+
+    def _close_pending_writes(self) -> None:
+        """关闭 helper 待写队列。"""
+        with self._pending_writes_lock:
+            queue, self._pending_writes = self._pending_writes, None
+        if queue is not None:
+            queue.close()
+
+    def _probe_pool(self) -> FfprobePool:
+        """
+        取插件共享的 ffprobe 探测池（按需创建）。
+
+        :return: 探测池
+        """
+        with self._ffprobe_pool_lock:
+            if self._ffprobe_pool is None:
+                self._ffprobe_pool = FfprobePool(
+                    concurrency=self._ffprobe_concurrency,
+                    per_host=self._ffprobe_per_host,
+                    ladder=self._ffprobe_ladder,
+                    probe_mode=self._ffprobe_probe_mode,
+                )
+            return self._ffprobe_pool
+
+    def _close_ffprobe_pool(self) -> None:
+        """停止 ffprobe 探测池。"""
+        with self._ffprobe_pool_lock:
+            pool, self._ffprobe_pool = self._ffprobe_pool, None
+        if pool is not None:
+            pool.close()
+
     def _build_completer(self, force_write: bool = False) -> Optional[MediaInfoCompleter]:
         """
         根据配置构建媒体信息补全器。
@@ -259,11 +571,27 @@ class PlexToolbox(_PluginBase):
             return None
         if not plex_host.startswith(("http://", "https://")):
             plex_host = "http://" + plex_host
-        plex = PlexClient(plex_host, self._plex_token)
-        helper = HelperClient(self._helper_url, self._helper_token)
+        plex = PlexClient(
+            plex_host,
+            self._plex_token,
+            session=self._session("plex"),
+            max_in_flight=self._enum_concurrency,
+            rate_limit=self._plex_rate_limit,
+            bulk_enum=self._enum_bulk,
+        )
+        helper = HelperClient(
+            self._helper_url, self._helper_token, session=self._session("helper")
+        )
         emby = None
         if self._use_emby and self._emby_url and self._emby_apikey:
-            emby = EmbyClient(self._emby_url, self._emby_apikey)
+            if self._emby_index is None:
+                self._emby_index = EmbySeriesIndex()
+            emby = EmbyClient(
+                self._emby_url,
+                self._emby_apikey,
+                session=self._session("emby"),
+                series_index=self._emby_index,
+            )
         return MediaInfoCompleter(
             plex=plex,
             helper=helper,
@@ -272,8 +600,14 @@ class PlexToolbox(_PluginBase):
             overwrite_streams=self._overwrite_streams,
             concurrency=self._concurrency,
             force_write=force_write,
+            emby_prefetch=self._emby_prefetch,
+            result_cache=self._media_result_cache(),
+            ffprobe=self._probe_pool() if self._source_mode != SOURCE_MODE_EMBY else None,
+            source_mode=self._source_mode,
+            pending_writes=self._pending_write_queue(),
         )
 
+    @_uses_http_pool
     def run_completion(
         self, source: str = "manual", force_write: bool = False,
         section_keys: Optional[List[str]] = None,
@@ -352,6 +686,8 @@ class PlexToolbox(_PluginBase):
                 "emby_hits": summary.get("emby_hits", 0),
                 "written_ok": summary.get("written_ok", 0),
                 "write_failed": summary.get("write_failed", 0),
+                "write_queued": summary.get("write_queued", 0),
+                "write_unchanged": summary.get("write_unchanged", 0),
                 "unresolved": summary.get("unresolved", 0),
                 "helper_busy": summary.get("helper_busy", False),
                 # 逐条明细（label+状态），最多留 20 条防膨胀
@@ -373,7 +709,9 @@ class PlexToolbox(_PluginBase):
             return False
         if not plex_host.startswith(("http://", "https://")):
             plex_host = "http://" + plex_host
-        section_key = PlexClient(plex_host, self._plex_token).item_section_key(rating_key)
+        section_key = PlexClient(
+            plex_host, self._plex_token, session=self._session("plex")
+        ).item_section_key(rating_key)
         if not section_key:
             logger.warning("PlexToolbox 无法确认条目所属媒体库，跳过补全 ratingKey=%s", rating_key)
             return False
@@ -403,36 +741,38 @@ class PlexToolbox(_PluginBase):
             return
 
         def _worker() -> None:
-            """后台线程执行单条补全。"""
-            completer = self._build_completer(force_write=False)
-            if not completer:
-                return
-            try:
-                summary = completer.run_rating_key(
-                    str(rating_key),
-                    only_missing=self._only_missing,
-                    forward=self._forward_episodes,
-                )
-                summary["success"] = True
-                summary["source"] = source
-                self.save_data("last_play_result", summary)
-                self._append_play_history(summary)
-                logger.info(
-                    "PlexToolbox 条目补全完成 (%s) %s: 处理 %s, 写入 %s, 未命中 %s",
-                    source,
-                    summary.get("label") or f"ratingKey={rating_key}",
-                    summary.get("strm_parts", 0),
-                    summary.get("written_ok", 0),
-                    summary.get("unresolved", 0),
-                )
-            except Exception as exc:
-                logger.error(
-                    "PlexToolbox 单条补全异常 ratingKey=%s: %s",
-                    rating_key, exc, exc_info=True,
-                )
+            """后台线程执行单条补全（期间占用共享会话池）。"""
+            with self._pool_in_use():
+                completer = self._build_completer(force_write=False)
+                if not completer:
+                    return
+                try:
+                    summary = completer.run_rating_key(
+                        str(rating_key),
+                        only_missing=self._only_missing,
+                        forward=self._forward_episodes,
+                    )
+                    summary["success"] = True
+                    summary["source"] = source
+                    self.save_data("last_play_result", summary)
+                    self._append_play_history(summary)
+                    logger.info(
+                        "PlexToolbox 条目补全完成 (%s) %s: 处理 %s, 写入 %s, 未命中 %s",
+                        source,
+                        summary.get("label") or f"ratingKey={rating_key}",
+                        summary.get("strm_parts", 0),
+                        summary.get("written_ok", 0),
+                        summary.get("unresolved", 0),
+                    )
+                except Exception as exc:
+                    logger.error(
+                        "PlexToolbox 单条补全异常 ratingKey=%s: %s",
+                        rating_key, exc, exc_info=True,
+                    )
 
         Thread(target=_worker, daemon=True).start()
 
+    @_uses_http_pool
     def _on_pre_play_from_proxy(self, rating_key: str) -> None:
         """
         反代播前回调（同步阻塞）：播放/继续观看起播前，先补全该条目媒体流信息。
@@ -454,20 +794,64 @@ class PlexToolbox(_PluginBase):
             summary = completer.run_rating_key(
                 str(rating_key), only_missing=True, forward=self._forward_episodes,
             )
-            summary["success"] = True
-            summary["source"] = "pre_play"
-            summary["ts"] = int(time())
-            self.save_data("last_play_result", summary)
-            self._append_play_history(summary)
-            if summary.get("written_ok"):
-                logger.info(
-                    "PlexToolbox 播前补全 %s: 写入 %s 条",
-                    summary.get("label") or f"ratingKey={rating_key}",
-                    summary.get("written_ok"),
-                )
+            self._record_pre_play(summary)
         except Exception as exc:
             logger.debug("PlexToolbox 播前补全异常 ratingKey=%s: %s", rating_key, exc)
 
+    @_uses_http_pool
+    async def _on_pre_play_async(
+        self, rating_key: str, client: AsyncClient, deadline: float
+    ) -> None:
+        """
+        反代播前回调（异步）：在代理事件循环内直接完成播前补全。
+
+        复用代理的连接池，不占线程；数据源查询在 deadline 前截止，
+        代理只在预算内等待，超出预算后本协程（含 helper 写入）在后台跑完。
+
+        :param rating_key: 即将播放条目的 ratingKey
+        :param client: 代理共享的 httpx AsyncClient
+        :param deadline: 事件循环时钟上的预算截止时间
+        """
+        if not (self._enabled and self._mediainfo_enabled):
+            return
+        selected = {item.strip() for item in self._sections.split(",") if item.strip()}
+        if not selected:
+            logger.info("PlexToolbox 跳过单条补全：未选择 Plex 媒体库 ratingKey=%s", rating_key)
+            return
+        # 首次使用或换配置后会打开结果缓存 / 待写队列 / ffprobe 池，放到线程里避免阻塞代理事件循环
+        completer = await to_thread(self._build_completer, force_write=True)
+        if not completer:
+            return
+        summary = await completer.run_rating_key_async(
+            client,
+            str(rating_key),
+            only_missing=True,
+            forward=self._forward_episodes,
+            section_keys=selected,
+            deadline=deadline,
+        )
+        if summary is not None:
+            # 结果落库不占起播预算，交给后台线程
+            Thread(target=self._record_pre_play, args=(summary,), daemon=True).start()
+
+    def _record_pre_play(self, summary: Dict[str, Any]) -> None:
+        """
+        保存一次播前补全结果并追加到播放补全历史。
+
+        :param summary: run_rating_key / run_rating_key_async 的汇总结果
+        """
+        summary["success"] = True
+        summary["source"] = "pre_play"
+        summary["ts"] = int(time())
+        self.save_data("last_play_result", summary)
+        self._append_play_history(summary)
+        if summary.get("written_ok"):
+            logger.info(
+                "PlexToolbox 播前补全 %s: 写入 %s 条",
+                summary.get("label") or f"ratingKey={summary.get('rating_key')}",
+                summary.get("written_ok"),
+            )
+
     def get_state(self) -> bool:
         """返回插件启用状态。"""
         return self._enabled
@@ -491,22 +875,47 @@ class PlexToolbox(_PluginBase):
         ]
 
     def get_service(self) -> List[Dict[str, Any]]:
-        """返回 Helper 健康检查服务。"""
+        """返回 Helper 健康检查与待写队列补写服务。"""
         if not (self._enabled and self._mediainfo_enabled and self._helper_url):
             return []
         trigger = IntervalTrigger(minutes=5) if IntervalTrigger else "*/5 * * * *"
+        drain_trigger = IntervalTrigger(minutes=10) if IntervalTrigger else "*/10 * * * *"
         return [
             {
                 "id": "plextoolbox_helper_health",
                 "name": "PLEX 工具箱 Helper 健康检查",
                 "trigger": trigger,
                 "func": self.check_helper_health,
-            }
+            },
+            {
+                "id": "plextoolbox_pending_writes",
+                "name": "PLEX 工具箱待写媒体信息补写",
+                "trigger": drain_trigger,
+                "func": self.drain_pending_writes,
+            },
         ]
 
+    @_uses_http_pool
+    def drain_pending_writes(self) -> None:
+        """每 10 分钟检查待写队列，helper 报告 Plex 空闲时补写（补全运行中跳过）。"""
+        if self._running:
+            return
+        queue = self._pending_write_queue()
+        if queue is None or not queue.count():
+            return
+        helper = HelperClient(
+            self._helper_url, self._helper_token, session=self._session("helper")
+        )
+        result = HelperWriteScheduler(helper, queue).drain()
+        if result["busy"]:
+            logger.info("PlexToolbox Plex 繁忙，待写队列 %s 条留待下次补写", result["pending"])
+
+    @_uses_http_pool
     def check_helper_health(self) -> None:
         """每 5 分钟检查 Helper；连续失败 3 次后仅告警一次。"""
-        healthy = HelperClient(self._helper_url, self._helper_token).health()
+        healthy = HelperClient(
+            self._helper_url, self._helper_token, session=self._session("helper")
+        ).health()
         self._helper_health_ok = healthy
         if healthy:
             if self._helper_health_failures:
@@ -570,8 +979,29 @@ class PlexToolbox(_PluginBase):
             "use_emby": self._use_emby,
             "helper_health_ok": self._helper_health_ok,
             "helper_health_failures": self._helper_health_failures,
+            "proxy_metrics": self._proxy_metrics(),
+            "http_sessions": self._http_pool.stats() if self._http_pool else None,
+            "emby_index": self._emby_index.stats() if self._emby_index else None,
+            "result_cache": self._result_cache.stats() if self._result_cache else None,
+            "ffprobe": self._ffprobe_pool.stats() if self._ffprobe_pool else None,
+            "pending_writes": self._pending_writes.stats() if self._pending_writes else None,
         }
 
+    def _proxy_metrics(self) -> Optional[Dict[str, Any]]:
+        """
+        读取 302 代理运行指标（与代理 /__proxy/metrics 端点内容一致）。
+
+        :return: 指标字典，代理未运行或读取失败时返回 None
+        """
+        app = self._proxy_app
+        if app is None or self._server is None:
+            return None
+        try:
+            return app.state.metrics_snapshot()
+        except Exception as e:
+            logger.debug("PlexToolbox 读取代理指标失败: %s", e)
+            return None
+
     def sections_api(self) -> Dict[str, Any]:
         """获取 Plex 媒体库分区列表，供前端勾选。"""
         plex_host = self._plex_direct_host or self._plex_host
@@ -580,7 +1010,9 @@ class PlexToolbox(_PluginBase):
         if not plex_host.startswith(("http://", "https://")):
             plex_host = "http://" + plex_host
         try:
-            sections = PlexClient(plex_host, self._plex_token).list_sections()
+            sections = PlexClient(
+                plex_host, self._plex_token, session=self._session("plex")
+            ).list_sections()
             return {"success": True, "sections": sections}
         except Exception as e:
             return {"success": False, "error": str(e), "sections": []}
@@ -589,7 +1021,9 @@ class PlexToolbox(_PluginBase):
         """检查 helper 连通性与数据库探测结果。"""
         if not self._helper_url:
             return {"success": False, "error": "未配置 helper 地址"}
-        client = HelperClient(self._helper_url, self._helper_token)
+        client = HelperClient(
+            self._helper_url, self._helper_token, session=self._session("helper")
+        )
         if not client.health():
             return {"success": False, "error": "helper 不可达"}
         info = client.dbinfo()
@@ -654,7 +1088,7 @@ class PlexToolbox(_PluginBase):
             return None
         if not plex_host.startswith(("http://", "https://")):
             plex_host = "http://" + plex_host
-        return PlexClient(plex_host, self._plex_token)
+        return PlexClient(plex_host, self._plex_token, session=self._session("plex"))
 
     def _scrape_dir(self, dir_path: str) -> Dict[str, Any]:
         """
@@ -781,7 +1215,7 @@ class PlexToolbox(_PluginBase):
         if not plex:
             return {"success": False, "error": "未配置 Plex 直连地址或 token"}
         try:
-            fixer = PosterFixer(plex)
+            fixer = PosterFixer(plex, pool=self._session_pool())
             res = fixer.fix(
                 section,
                 dry_run=bool(payload.get("dry_run", True)),
@@ -842,6 +1276,19 @@ class PlexToolbox(_PluginBase):
             "overwrite_streams": self._overwrite_streams,
             "only_missing": self._only_missing,
             "concurrency": self._concurrency,
+            "http_max_connections": self._http_max_connections,
+            "http_max_keepalive": self._http_max_keepalive,
+            "http2": self._http2,
+            "enum_concurrency": self._enum_concurrency,
+            "plex_rate_limit": self._plex_rate_limit,
+            "emby_prefetch": self._emby_prefetch,
+            "result_cache": self._result_cache_enabled,
+            "source_mode": self._source_mode,
+            "ffprobe_probe_mode": self._ffprobe_probe_mode,
+            "ffprobe_concurrency": self._ffprobe_concurrency,
+            "ffprobe_per_host": self._ffprobe_per_host,
+            "ffprobe_ladder": self._ffprobe_ladder,
+            "enum_bulk": self._enum_bulk,
             "sections": self._sections,
             "webhook_enabled": self._webhook_enabled,
             "dedup_window": self._dedup_window,
@@ -854,6 +1301,10 @@ class PlexToolbox(_PluginBase):
 
     def stop_service(self) -> None:
         """停止代理服务并释放资源。"""
+        self._close_http_pool()
+        self._close_result_cache()
+        self._close_ffprobe_pool()
+        self._close_pending_writes()
         if self._server is not None:
             try:
                 self._server.should_exit = True
@@ -865,3 +1316,4 @@ class PlexToolbox(_PluginBase):
             finally:
                 self._server = None
                 self._thread = None
+                self._proxy_app = None
@@ -81,6 +81,8 @@ const _hoisted_36 = { class: "ptb-dashboard-title" };
 
 const {computed,defineComponent,h,onMounted,reactive,ref,resolveComponent,watch} = await importShared('vue');
 
+const sourceModeOptions = [{ title: '仅 Emby', value: 'emby' }, { title: 'Emby 优先，未命中用 ffprobe', value: 'emby_ffprobe' }, { title: 'ffprobe 优先，失败用 Emby', value: 'ffprobe_emby' }];
+const probeModeOptions = [{ title: 'Range 拉容器头（失败再阶梯）', value: 'header' }, { title: '直接阶梯探测', value: 'ladder' }];
 const helperDocUrl = 'https://github.com/shyblacktea/MoviePilot-Plugins/blob/main/plugins.v2/plextoolbox/helper/README.md';
 
 const _sfc_main = {
@@ -127,7 +129,7 @@ const busyKey = ref('');
 const matchingResult = ref(null);
 const scrapingResult = ref(null);
 
-const defaults = { enabled: false, proxy_enabled: false, plex_host: '', plex_token: '', host: '0.0.0.0', port: 32401, pin_rules: '', force_direct_play: true, mediainfo_enabled: false, plex_direct_host: '', helper_url: '', helper_token: '', emby_url: '', emby_apikey: '', use_emby: true, overwrite_streams: true, only_missing: true, concurrency: 3, sections: '', webhook_enabled: false, dedup_window: 300, forward_episodes: 5 };
+const defaults = { enabled: false, proxy_enabled: false, plex_host: '', plex_token: '', host: '0.0.0.0', port: 32401, pin_rules: '', force_direct_play: true, mediainfo_enabled: false, plex_direct_host: '', helper_url: '', helper_token: '', emby_url: '', emby_apikey: '', use_emby: true, overwrite_streams: true, only_missing: true, concurrency: 3, http_max_connections: 20, http_max_keepalive: 10, http2: false, enum_concurrency: 6, plex_rate_limit: 0, emby_prefetch: true, result_cache: true, source_mode: 'emby', ffprobe_probe_mode: 'header', ffprobe_concurrency: 4, ffprobe_per_host: 2, ffprobe_ladder: '1:2,5:5,20:10', enum_bulk: true, sections: '', webhook_enabled: false, dedup_window: 300, forward_episodes: 5 };
 const config = reactive({ ...defaults, ...props.initialConfig });
 const savedBaseline = ref(JSON.parse(JSON.stringify(defaults)));
 
@@ -146,8 +148,8 @@ const DashboardRow = defineComponent({ props: { icon: String, label: String, val
 const StatCard = defineComponent({ props: { label: String, value: [String, Number] }, setup(cardProps) { return () => h('div', { class: 'ptb-stat' }, [h('div', { class: 'ptb-stat-value' }, String(cardProps.value ?? '-')), h('div', { class: 'ptb-stat-label' }, cardProps.label)]) } });
 const TargetFields = defineComponent({ setup() { return () => h('div', { class: 'ptb-target-grid' }, [h(VSelectComponent, { modelValue: scrapeSection.value, 'onUpdate:modelValue': value => { scrapeSection.value = value; }, items: sectionOptions.value, itemTitle: 'title', itemValue: 'value', label: '目标 Plex 媒体库', variant: 'outlined', density: 'compact', hideDetails: 'auto', loading: loadingSections.value }), h(VTextFieldComponent, { modelValue: scrapeLimit.value, 'onUpdate:modelValue': value => { scrapeLimit.value = Number(value) || 0; }, type: 'number', min: 0, label: '限制条数（0=不限）', variant: 'outlined', density: 'compact', hideDetails: 'auto' })]) } });
 
-function statusLabel(value) { return ({ written: '已写入', resolved: '已解析', unresolved: '未命中', write_failed: '写入失败', busy: 'Plex忙' })[value] || (value || '-') }
-function statusColor(value) { return ({ written: 'success', resolved: 'teal', unresolved: 'orange', write_failed: 'error', busy: 'warning' })[value] || 'grey' }
+function statusLabel(value) { return ({ written: '已写入', resolved: '已解析', unresolved: '未命中', write_failed: '写入失败', busy: 'Plex忙', queued: '待补写', unchanged: '无变化' })[value] || (value || '-') }
+function statusColor(value) { return ({ written: 'success', resolved: 'teal', unresolved: 'orange', write_failed: 'error', busy: 'warning', queued: 'info', unchanged: 'success' })[value] || 'grey' }
 function fmtTime(value) { if (!value) return '-'; const numeric = Number(value); const date = Number.isFinite(numeric) ? new Date(numeric > 100000000000 ? numeric : numeric * 1000) : new Date(value); if (Number.isNaN(date.getTime())) return String(value); const pad = item => String(item).padStart(2, '0'); return `${pad(date.getMonth() + 1)}-${pad(date.getDate())} ${pad(date.getHours())}:${pad(date.getMinutes())}` }
 function showMatching(type, text) { matchingResult.value = { type, text }; }
 function showScraping(type, text) { scrapingResult.value = { type, text }; }
@@ -761,6 +763,238 @@ return (_ctx, _cache) => {
                           }, null, 8, ["modelValue"])
                         ]),
                         _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "4"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VTextField, {
+                            modelValue: config.http_max_connections,
+                            "onUpdate:modelValue": _cache[65] || (_cache[65] = $event => ((config.http_max_connections) = $event)),
+                            modelModifiers: { number: true },
+                            type: "number",
+                            min: "1",
+                            label: "HTTP 最大连接数",
+                            variant: "outlined",
+                            density: "compact",
+                            "hide-details": "auto"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "4"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VTextField, {
+                            modelValue: config.http_max_keepalive,
+                            "onUpdate:modelValue": _cache[66] || (_cache[66] = $event => ((config.http_max_keepalive) = $event)),
+                            modelModifiers: { number: true },
+                            type: "number",
+                            min: "0",
+                            label: "HTTP 保活连接数",
+                            variant: "outlined",
+                            density: "compact",
+                            "hide-details": "auto"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "4"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VSwitch, {
+                            modelValue: config.http2,
+                            "onUpdate:modelValue": _cache[67] || (_cache[67] = $event => ((config.http2) = $event)),
+                            color: "primary",
+                            "hide-details": "",
+                            inset: "",
+                            label: "启用 HTTP/2（需安装 h2）"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "6"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VTextField, {
+                            modelValue: config.enum_concurrency,
+                            "onUpdate:modelValue": _cache[68] || (_cache[68] = $event => ((config.enum_concurrency) = $event)),
+                            modelModifiers: { number: true },
+                            type: "number",
+                            min: "1",
+                            label: "Plex 枚举并发数",
+                            variant: "outlined",
+                            density: "compact",
+                            "hide-details": "auto"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "6"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VTextField, {
+                            modelValue: config.plex_rate_limit,
+                            "onUpdate:modelValue": _cache[69] || (_cache[69] = $event => ((config.plex_rate_limit) = $event)),
+                            modelModifiers: { number: true },
+                            type: "number",
+                            min: "0",
+                            label: "Plex 请求限速（次/秒，0=不限）",
+                            variant: "outlined",
+                            density: "compact",
+                            "hide-details": "auto"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "6"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VSwitch, {
+                            modelValue: config.emby_prefetch,
+                            "onUpdate:modelValue": _cache[70] || (_cache[70] = $event => ((config.emby_prefetch) = $event)),
+                            color: "primary",
+                            "hide-details": "",
+                            inset: "",
+                            label: "全量补全前预取 Emby 媒体库"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "6"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VSwitch, {
+                            modelValue: config.result_cache,
+                            "onUpdate:modelValue": _cache[71] || (_cache[71] = $event => ((config.result_cache) = $event)),
+                            color: "primary",
+                            "hide-details": "",
+                            inset: "",
+                            label: "缓存解析结果（按 STRM 目标）"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "6"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VSelect, {
+                            modelValue: config.source_mode,
+                            "onUpdate:modelValue": _cache[72] || (_cache[72] = $event => ((config.source_mode) = $event)),
+                            items: sourceModeOptions,
+                            "item-title": "title",
+                            "item-value": "value",
+                            label: "媒体信息数据源",
+                            variant: "outlined",
+                            density: "compact",
+                            "hide-details": "auto"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "6"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VSelect, {
+                            modelValue: config.ffprobe_probe_mode,
+                            "onUpdate:modelValue": _cache[73] || (_cache[73] = $event => ((config.ffprobe_probe_mode) = $event)),
+                            items: probeModeOptions,
+                            "item-title": "title",
+                            "item-value": "value",
+                            label: "ffprobe 探测方式",
+                            variant: "outlined",
+                            density: "compact",
+                            "hide-details": "auto"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "4"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VTextField, {
+                            modelValue: config.ffprobe_concurrency,
+                            "onUpdate:modelValue": _cache[74] || (_cache[74] = $event => ((config.ffprobe_concurrency) = $event)),
+                            modelModifiers: { number: true },
+                            type: "number",
+                            min: "1",
+                            label: "ffprobe 总并发数",
+                            variant: "outlined",
+                            density: "compact",
+                            "hide-details": "auto"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "4"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VTextField, {
+                            modelValue: config.ffprobe_per_host,
+                            "onUpdate:modelValue": _cache[75] || (_cache[75] = $event => ((config.ffprobe_per_host) = $event)),
+                            modelModifiers: { number: true },
+                            type: "number",
+                            min: "1",
+                            label: "ffprobe 单主机并发数",
+                            variant: "outlined",
+                            density: "compact",
+                            "hide-details": "auto"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "4"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VTextField, {
+                            modelValue: config.ffprobe_ladder,
+                            "onUpdate:modelValue": _cache[76] || (_cache[76] = $event => ((config.ffprobe_ladder) = $event)),
+                            label: "ffprobe 探测阶梯（MB:秒，逗号分隔）",
+                            variant: "outlined",
+                            density: "compact",
+                            "hide-details": "auto"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
+                      }),
+                      _createVNode(_component_VCol, {
+                        cols: "12",
+                        md: "6"
+                      }, {
+                        default: _withCtx(() => [
+                          _createVNode(_component_VSwitch, {
+                            modelValue: config.enum_bulk,
+                            "onUpdate:modelValue": _cache[77] || (_cache[77] = $event => ((config.enum_bulk) = $event)),
+                            color: "primary",
+                            "hide-details": "",
+                            inset: "",
+                            label: "批量分页枚举 Plex 条目"
+                          }, null, 8, ["modelValue"])
+                        ]),
+                        _: 1
                       })
                     ]),
                     _: 1
@@ -4,28 +4,274 @@ from __future__ import annotations
 
 import os
 import re
-from typing import Any, Dict, List, Optional
+from asyncio import Future, get_running_loop, shield
+from copy import deepcopy
+from threading import Event, Lock
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Generator, List, Optional, Set, Tuple
 from urllib.parse import quote, urlparse, unquote
 
-from httpx import Client
+from httpx import AsyncClient, Client
 
 from app.log import logger
 
+from .http_pool import send
+from .ttl_cache import LruTtlCache
+
+# 查询计划：逐步 yield (path, params) 请求、接收其 JSON 结果，最终 return 查询结果；
+# 同一套匹配策略由同步/异步两种驱动方式共用
+_LookupPlan = Generator[Tuple[str, Dict[str, str]], Optional[dict], Optional[Dict[str, Any]]]
+
+# 剧集索引：最多缓存的剧集数与过期秒数
+SERIES_INDEX_MAX_SERIES = 200
+SERIES_INDEX_TTL_SECONDS = 1800.0
+# 索引中查不到某集时，距上次构建超过该秒数才重新拉取（兼顾新入库的集）
+SERIES_INDEX_REFRESH_SECONDS = 60.0
+# 等待其他线程进行中的同一请求的最长秒数
+SHARED_FETCH_WAIT_SECONDS = 60.0
+# 全库预取：每页条目数
+LIBRARY_PREFETCH_PAGE_SIZE = 500
+
+
+class _Flight:
+    """进行中的一次共享请求（线程间单飞）。"""
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.result: Optional[dict] = None
+
+
+class EmbySeriesIndex:
+    """
+    Emby 剧集索引缓存：tmdb id -> Series Id 列表，Series Id -> {文件名 stem -> 归一化媒体信息}。
+
+    同一剧集的每一集 STRM 都会走「按 tmdb 查条目 → 拉全剧集列表」两步，
+    缓存后一部剧每次运行只需拉一次集列表，播前补全窗口同样命中。
+    插件级共享，多线程（全量补全）与代理事件循环（播前补全）并用，内部加锁；
+    相同请求并发到达时只发一次（线程与协程各自单飞）。
+    """
+
+    def __init__(
+        self,
+        max_series: int = SERIES_INDEX_MAX_SERIES,
+        ttl_seconds: float = SERIES_INDEX_TTL_SECONDS,
+        refresh_after: float = SERIES_INDEX_REFRESH_SECONDS,
+    ) -> None:
+        """
+        :param max_series: 最多缓存的剧集数（LRU 淘汰）
+        :param ttl_seconds: 索引过期秒数
+        :param refresh_after: 查不到某集时允许重建索引的最小间隔秒数
+        """
+        self._lock = Lock()
+        self._series_by_tmdb = LruTtlCache(max_series, ttl_seconds, name="emby_tmdb_series")
+        self._episodes = LruTtlCache(max_series, ttl_seconds, name="emby_series_episodes")
+        self._refresh_after = refresh_after
+        self._flights: Dict[str, _Flight] = {}
+        self._aflights: Dict[str, Future] = {}
+        self.builds = 0
+        self.shared_fetches = 0
+
+    def series_for(self, tmdb_id: str) -> Optional[List[str]]:
+        """
+        取 tmdb id 对应的 Emby Series Id 列表。
+
+        :param tmdb_id: TMDB ID
+        :return: Series Id 列表，未缓存返回 None
+        """
+        with self._lock:
+            return self._series_by_tmdb.get(tmdb_id)
+
+    def remember_series(self, tmdb_id: str, series_ids: List[str]) -> None:
+        """
+        记录 tmdb id 对应的 Emby Series Id 列表。
+
+        :param tmdb_id: TMDB ID
+        :param series_ids: Series Id 列表
+        """
+        with self._lock:
+            self._series_by_tmdb.put(tmdb_id, list(series_ids))
+
+    def lookup(self, series_id: str, stem: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        在剧集索引中按文件名 stem 查某一集的媒体信息。
+
+        :param series_id: Emby Series Id
+        :param stem: 无扩展名文件名
+        :return: (是否可信, 媒体信息副本)；未缓存，或查不到且索引已可重建时为 (False, None)
+        """
+        with self._lock:
+            entry = self._episodes.get(series_id)
+        if entry is None:
+            return False, None
+        built_at, index = entry
+        info = index.get(stem) or index.get("")
+        if info is None and monotonic() - built_at >= self._refresh_after:
+            return False, None
+        return True, deepcopy(info)
+
+    def store(self, series_id: str, index: Dict[str, Dict[str, Any]]) -> None:
+        """
+        写入某剧集的 stem -> 媒体信息索引。
+
+        :param series_id: Emby Series Id
+        :param index: 文件名 stem -> 归一化媒体信息
+        """
+        with self._lock:
+            self._episodes.put(series_id, (monotonic(), index))
+            self.builds += 1
+
+    def shared_fetch(self, key: str, fetch: Callable[[], Optional[dict]]) -> Optional[dict]:
+        """
+        线程间单飞：同一 key 的请求并发到达时只执行一次，其余等待并共享结果。
+
+        :param key: 请求标识
+        :param fetch: 实际请求函数
+        :return: 请求结果
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.shared_fetches += 1
+        if not owner:
+            flight.done.wait(SHARED_FETCH_WAIT_SECONDS)
+            return flight.result
+        try:
+            flight.result = fetch()
+            return flight.result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def shared_fetch_async(
+        self, key: str, fetch: Callable[[], Awaitable[Optional[dict]]]
+    ) -> Optional[dict]:
+        """
+        协程间单飞（仅在代理事件循环内使用）。
+
+        :param key: 请求标识
+        :param fetch: 实际请求协程函数
+        :return: 请求结果；发起方被取消时等待方得到 None
+        """
+        waiting = self._aflights.get(key)
+        if waiting is not None:
+            self.shared_fetches += 1
+            return await shield(waiting)
+        future = get_running_loop().create_future()
+        self._aflights[key] = future
+        result: Optional[dict] = None
+        try:
+            result = await fetch()
+            return result
+        finally:
+            self._aflights.pop(key, None)
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回索引缓存统计。
+
+        :return: {series, tmdb, builds, shared_fetches}
+        """
+        with self._lock:
+            return {
+                "series": self._episodes.stats(),
+                "tmdb": self._series_by_tmdb.stats(),
+                "builds": self.builds,
+                "shared_fetches": self.shared_fetches,
+            }
+
+
+class EmbyLibraryIndex:
+    """
+    全库预取得到的 文件名 stem -> 归一化媒体信息 索引（供一次全量补全使用）。
+
+    同一 stem 对应多个不同条目（如多部剧都有 01.mkv）时记为歧义，不在此命中，
+    交回逐条查询按 tmdb 精确匹配。构建后只读，多个解析线程可并发查询。
+    """
+
+    def __init__(
+        self,
+        entries: Dict[str, Dict[str, Any]],
+        ambiguous: Set[str],
+        items: int,
+        pages: int,
+    ) -> None:
+        """
+        :param entries: stem -> 归一化媒体信息
+        :param ambiguous: 歧义 stem 集合
+        :param items: 预取到的条目数
+        :param pages: 预取请求页数
+        """
+        self._entries = entries
+        self._ambiguous = ambiguous
+        self._lock = Lock()
+        self.items = items
+        self.pages = pages
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, file_name: str) -> Optional[Dict[str, Any]]:
+        """
+        按 STRM 路径的文件名 stem 查媒体信息。
+
+        :param file_name: STRM 文件路径或文件名
+        :return: 媒体信息副本，未命中或歧义返回 None
+        """
+        stem = os.path.splitext(os.path.basename(file_name))[0]
+        info = None if stem in self._ambiguous else self._entries.get(stem)
+        with self._lock:
+            if info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return deepcopy(info)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回预取索引统计。
+
+        :return: {items, pages, stems, ambiguous, hits, misses}
+        """
+        with self._lock:
+            return {
+                "items": self.items,
+                "pages": self.pages,
+                "stems": len(self._entries),
+                "ambiguous": len(self._ambiguous),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
 
 class EmbyClient:
     """封装 Emby 只读查询，用于按文件名匹配媒体并取其媒体流信息作为数据源。"""
 
-    def __init__(self, base_url: str, api_key: str, timeout: float = 30.0) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        timeout: float = 30.0,
+        session: Optional[Client] = None,
+        series_index: Optional[EmbySeriesIndex] = None,
+    ) -> None:
         """
         初始化 Emby 客户端。
 
         :param base_url: Emby 根地址，如 http://192.168.0.121:8096
         :param api_key: Emby API Key
         :param timeout: 请求超时秒数
+        :param session: 插件共享的长连接会话；为 None 时每次请求新建连接
+        :param series_index: 插件共享的剧集索引缓存；为 None 时每集都拉取集列表
         """
         self._base = base_url.rstrip("/")
         self._key = api_key
         self._timeout = timeout
+        self._session = session
+        self._index = series_index
         self._user_id: Optional[str] = None
 
     def _get(self, path: str, params: Optional[Dict[str, str]] = None) -> Optional[dict]:
@@ -36,24 +282,161 @@ class EmbyClient:
         :param params: 查询参数
         :return: JSON 或 None
         """
-        query = {"api_key": self._key}
-        if params:
-            query.update(params)
-        qs = "&".join(f"{k}={quote(str(v), safe='')}" for k, v in query.items())
-        url = f"{self._base}{path}?{qs}"
         try:
-            with Client(timeout=self._timeout) as client:
-                resp = client.get(url, headers={"Accept": "application/json"})
-                if resp.status_code == 200:
-                    return resp.json()
-                logger.warning("Emby API %s 返回 %s", path, resp.status_code)
+            resp = send(
+                self._session, "GET", self._url(path, params), self._timeout,
+                headers={"Accept": "application/json"},
+            )
+            if resp.status_code == 200:
+                return resp.json()
+            logger.warning("Emby API %s 返回 %s", path, resp.status_code)
+        except Exception as e:
+            logger.warning("Emby API 请求失败 %s: %s", path, e)
+        return None
+
+    async def _aget(
+        self, client: AsyncClient, path: str, params: Optional[Dict[str, str]] = None
+    ) -> Optional[dict]:
+        """
+        异步发起 GET 请求并解析 JSON（复用调用方的连接池）。
+
+        :param client: 共享的 httpx AsyncClient
+        :param path: 相对路径
+        :param params: 查询参数
+        :return: JSON 或 None
+        """
+        try:
+            resp = await client.get(
+                self._url(path, params),
+                headers={"Accept": "application/json"},
+                timeout=self._timeout,
+            )
+            if resp.status_code == 200:
+                return resp.json()
+            logger.warning("Emby API %s 返回 %s", path, resp.status_code)
         except Exception as e:
             logger.warning("Emby API 请求失败 %s: %s", path, e)
         return None
 
+    def _url(self, path: str, params: Optional[Dict[str, str]] = None) -> str:
+        """
+        拼接带 api_key 的完整请求地址。
+
+        :param path: 相对路径
+        :param params: 查询参数
+        :return: 完整 URL
+        """
+        query = {"api_key": self._key}
+        if params:
+            query.update(params)
+        qs = "&".join(f"{k}={quote(str(v), safe='')}" for k, v in query.items())
+        return f"{self._base}{path}?{qs}"
+
     def find_streams_by_name(self, file_name: str) -> Optional[Dict[str, Any]]:
         """
-        搜索 Emby 条目并返回其归一化媒体流信息。
+        搜索 Emby 条目并返回其归一化媒体流信息（同步）。
+
+        :param file_name: STRM 文件路径或文件名
+        :return: 归一化后的媒体信息 dict，未找到返回 None
+        """
+        plan = self._find_streams_plan(file_name)
+        try:
+            path, params = next(plan)
+            while True:
+                if self._index is None:
+                    data = self._get(path, params)
+                else:
+                    data = self._index.shared_fetch(
+                        self._url(path, params), lambda: self._get(path, params)
+                    )
+                path, params = plan.send(data)
+        except StopIteration as stop:
+            return stop.value
+
+    async def find_streams_by_name_async(
+        self, client: AsyncClient, file_name: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        find_streams_by_name 的异步版本，匹配策略相同，可随时取消。
+
+        :param client: 共享的 httpx AsyncClient
+        :param file_name: STRM 文件路径或文件名
+        :return: 归一化后的媒体信息 dict，未找到返回 None
+        """
+        plan = self._find_streams_plan(file_name)
+        try:
+            path, params = next(plan)
+            while True:
+                if self._index is None:
+                    data = await self._aget(client, path, params)
+                else:
+                    data = await self._index.shared_fetch_async(
+                        self._url(path, params),
+                        lambda: self._aget(client, path, params),
+                    )
+                path, params = plan.send(data)
+        except StopIteration as stop:
+            return stop.value
+
+    def build_library_index(
+        self, page_size: int = LIBRARY_PREFETCH_PAGE_SIZE
+    ) -> Optional[EmbyLibraryIndex]:
+        """
+        分页拉取 Emby 全部电影 / 单集及其 MediaSources，构建文件名索引。
+
+        请求数约为 条目数 / page_size，之后每个 STRM part 以字典查找代替逐条搜索。
+        键为 MediaSource 路径 stem（直链取 file_name= 参数，见 _basename_stem），
+        另以条目自身 Path 的 stem 作补充键。
+
+        :param page_size: 每页条目数
+        :return: 索引；首页请求失败返回 None（调用方退回逐条查询）
+        """
+        page_size = max(1, page_size)
+        entries: Dict[str, Dict[str, Any]] = {}
+        owners: Dict[str, str] = {}
+        ambiguous: Set[str] = set()
+        start = items = pages = 0
+        while True:
+            data = self._get(
+                "/Items",
+                {
+                    "Recursive": "true",
+                    "IncludeItemTypes": "Movie,Episode",
+                    "Fields": "MediaSources,Path",
+                    "StartIndex": str(start),
+                    "Limit": str(page_size),
+                },
+            )
+            if data is None:
+                if not pages:
+                    return None
+                logger.warning("PlexToolbox Emby 预取第 %s 页失败，使用已取到的部分", pages + 1)
+                break
+            pages += 1
+            page = data.get("Items", []) or []
+            for item in page:
+                owner = str(item.get("Id") or id(item))
+                item_stem = self._basename_stem(item.get("Path") or "")
+                for stem, info in self._build_episode_index([item]).items():
+                    for key in {stem, item_stem} - {""}:
+                        if owners.setdefault(key, owner) != owner:
+                            ambiguous.add(key)
+                        else:
+                            entries.setdefault(key, info)
+            items += len(page)
+            start += len(page)
+            total = data.get("TotalRecordCount")
+            if len(page) < page_size or (isinstance(total, int) and start >= total):
+                break
+        logger.info(
+            "PlexToolbox Emby 预取完成：%s 个条目 / %s 页，索引 %s 个文件名（歧义 %s）",
+            items, pages, len(entries), len(ambiguous),
+        )
+        return EmbyLibraryIndex(entries, ambiguous, items, pages)
+
+    def _find_streams_plan(self, file_name: str) -> _LookupPlan:
+        """
+        按文件名查找 Emby 媒体流信息的查询计划。
 
         匹配策略（按优先级）：
         1) 从 STRM 路径的 {tmdb-xxxxx} 提取 TMDB ID，用 AnyProviderIdEquals 精确定位
@@ -70,8 +453,17 @@ class EmbyClient:
 
         # 策略1：按路径中的 TMDB ID 精确搜
         tmdb_id = self._extract_tmdb_id(file_name)
-        if tmdb_id:
-            data = self._get(
+        cached_series = (
+            self._index.series_for(tmdb_id) if tmdb_id and self._index else None
+        )
+        if cached_series:
+            # 已知是剧集：直接查剧集索引，省去按 tmdb 查条目
+            for sid in cached_series:
+                info = yield from self._series_episodes_plan(sid, stem)
+                if info:
+                    return info
+        elif tmdb_id:
+            data = yield (
                 "/Items",
                 {
                     "Recursive": "true",
@@ -88,11 +480,14 @@ class EmbyClient:
                     it for it in items
                     if it.get("Type") == "Series" or not (it.get("MediaSources"))
                 ]
+                series_ids = [it["Id"] for it in series_items if it.get("Id")]
+                if self._index is not None and series_ids and len(series_items) == len(items):
+                    self._index.remember_series(tmdb_id, series_ids)
                 for it in series_items:
                     sid = it.get("Id")
                     if not sid:
                         continue
-                    info = self._find_in_series_episodes(sid, stem)
+                    info = yield from self._series_episodes_plan(sid, stem)
                     if info:
                         return info
                 # 电影/直接可播放条目：先按文件名精确匹配 MediaSource
@@ -108,7 +503,7 @@ class EmbyClient:
                             return info
 
         # 策略2：回退到文件名 SearchTerm 模糊搜
-        data = self._get(
+        data = yield (
             "/Items",
             {
                 "Recursive": "true",
@@ -125,30 +520,53 @@ class EmbyClient:
                 return info
         return None
 
-    def _find_in_series_episodes(
-        self, series_id: str, want_stem: str
-    ) -> Optional[Dict[str, Any]]:
+    def _series_episodes_plan(self, series_id: str, want_stem: str) -> _LookupPlan:
         """
         下钻某 Emby 剧集（Series）的所有集，按文件名 stem 精确匹配某一集的媒体流信息。
 
         剧集路径里的 tmdb-xxxx 是剧集级 ID，命中的 Series 条目本身无 MediaSources，
         真正带流信息的是每个 Episode，需用 /Shows/{id}/Episodes 下钻后匹配。
+        拉取结果整理成 stem 索引写入剧集索引缓存，同剧其他集直接命中。
 
         :param series_id: Emby Series 条目 Id
         :param want_stem: 目标无扩展名文件名
         :return: 归一化媒体信息，未匹配返回 None
         """
-        data = self._get(
+        if self._index is not None:
+            trusted, info = self._index.lookup(series_id, want_stem)
+            if trusted:
+                return info
+        data = yield (
             f"/Shows/{series_id}/Episodes",
             {"Fields": "MediaSources,Path", "Limit": "2000"},
         )
         if not data:
             return None
-        for ep in data.get("Items", []) or []:
-            info = self._extract_from_item(ep, want_stem)
-            if info:
-                return info
-        return None
+        index = self._build_episode_index(data.get("Items", []) or [])
+        if self._index is not None:
+            self._index.store(series_id, index)
+        return deepcopy(index.get(want_stem) or index.get(""))
+
+    def _build_episode_index(self, episodes: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        把剧集全部集的 MediaSource 整理成 文件名 stem -> 归一化媒体信息。
+
+        同一 stem 以首个有流的源为准；无路径/名称的源记在空串键下，任意 stem 均可匹配
+        （与逐集匹配时的规则一致）。
+
+        :param episodes: /Shows/{id}/Episodes 返回的 Items
+        :return: stem 索引
+        """
+        index: Dict[str, Dict[str, Any]] = {}
+        for ep in episodes:
+            for src in ep.get("MediaSources") or []:
+                stem = self._basename_stem(src.get("Path") or src.get("Name") or "")
+                if stem in index:
+                    continue
+                info = self._normalize_source(src)
+                if info:
+                    index[stem] = info
+        return index
 
     @staticmethod
     def _extract_tmdb_id(path: str) -> Optional[str]:
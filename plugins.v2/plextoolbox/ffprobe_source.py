@@ -5,12 +5,50 @@ from __future__ import annotations
 import json
 import os
 import subprocess
-from typing import Any, Dict, List, Optional
+from asyncio import (
+    AbstractEventLoop,
+    CancelledError,
+    Future,
+    Semaphore,
+    TimeoutError as AsyncTimeoutError,
+    create_subprocess_exec,
+    new_event_loop,
+    run_coroutine_threadsafe,
+    set_event_loop,
+    shield,
+    to_thread,
+    wait_for,
+    wrap_future,
+)
+from asyncio.subprocess import DEVNULL, PIPE
+from concurrent.futures import Future as ConcurrentFuture
+from shutil import which
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
-from httpx import Client
+from httpx import AsyncClient, Client
 
 from app.log import logger
 
+from .header_probe import apply_header_meta, fetch_minimal_header
+from .ttl_cache import LruTtlCache
+
+# 探测池默认总并发与单主机并发（网盘直链对同一主机并发很敏感）
+FFPROBE_DEFAULT_CONCURRENCY = 4
+FFPROBE_DEFAULT_PER_HOST = 2
+# 默认探测阶梯：probesize(MB):analyzeduration(秒)，先小后大，失败才升级
+FFPROBE_DEFAULT_LADDER = "1:2,5:5,20:10"
+# 单次 ffprobe 超时秒数
+FFPROBE_TIMEOUT_SECONDS = 40.0
+# 探测结果缓存：容量、成功结果保留秒数、失败结果保留秒数（避免反复探测坏链接）
+FFPROBE_CACHE_MAX_SIZE = 2000
+FFPROBE_CACHE_TTL_SECONDS = 6 * 3600.0
+FFPROBE_NEGATIVE_TTL_SECONDS = 600.0
+# 探测方式：header 先用 Range 只拉容器头交给 ffprobe，不完整再走阶梯；ladder 直接阶梯探测
+PROBE_MODE_HEADER = "header"
+PROBE_MODE_LADDER = "ladder"
+
 
 def read_strm_url(strm_path: str) -> str:
     """
@@ -87,6 +125,335 @@ def ffprobe_url(url: str, timeout: int = 40) -> Optional[Dict[str, Any]]:
     return _normalize_ffprobe(data)
 
 
+def parse_ladder(text: str) -> List[Tuple[int, int]]:
+    """
+    解析探测阶梯配置。
+
+    :param text: 形如 "1:2,5:5,20:10"，每级为 probesize(MB):analyzeduration(秒)，秒数可省略
+    :return: [(probesize 字节, analyzeduration 微秒)]，解析不出时用默认阶梯
+    """
+    ladder: List[Tuple[int, int]] = []
+    for rung in (text or "").split(","):
+        size_s, _, dur_s = rung.strip().partition(":")
+        try:
+            size_mb = float(size_s)
+            dur = float(dur_s) if dur_s.strip() else size_mb
+        except ValueError:
+            continue
+        if size_mb > 0 and dur > 0:
+            ladder.append((int(size_mb * 1_000_000), int(dur * 1_000_000)))
+    if not ladder and text != FFPROBE_DEFAULT_LADDER:
+        return parse_ladder(FFPROBE_DEFAULT_LADDER)
+    return ladder
+
+
+def _probe_complete(info: Optional[Dict[str, Any]]) -> bool:
+    """
+    判断一次探测结果是否足够完整（不完整则升级到下一级阶梯）。
+
+    :param info: 归一化媒体信息
+    :return: 有流且视频流带分辨率（纯音频则有音频流）时为 True
+    """
+    if not info:
+        return False
+    videos = [s for s in info["streams"] if s.get("stream_type") == 1]
+    if videos:
+        return bool(videos[0].get("width") and videos[0].get("height"))
+    return any(s.get("stream_type") == 2 for s in info["streams"])
+
+
+class FfprobePool:
+    """
+    异步 ffprobe 探测池，运行在自己的事件循环线程上。
+
+    全量补全的解析线程与代理事件循环都向同一个池提交任务，共用总并发与按主机的并发上限；
+    每个直链按阶梯由小到大探测，探测不完整才加大 probesize；结果（含失败）按 STRM 地址
+    缓存，同一地址并发请求只探测一次。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = FFPROBE_DEFAULT_CONCURRENCY,
+        per_host: int = FFPROBE_DEFAULT_PER_HOST,
+        ladder: str = FFPROBE_DEFAULT_LADDER,
+        timeout: float = FFPROBE_TIMEOUT_SECONDS,
+        probe_mode: str = PROBE_MODE_HEADER,
+    ) -> None:
+        """
+        :param concurrency: 同时运行的 ffprobe 进程数上限
+        :param per_host: 单个直链主机同时探测数上限
+        :param ladder: 探测阶梯配置，见 parse_ladder
+        :param timeout: 单次 ffprobe 超时秒数
+        :param probe_mode: 探测方式，见 PROBE_MODE_*
+        """
+        self._binary = which("ffprobe")
+        self._concurrency = max(1, concurrency)
+        self._per_host = max(1, per_host)
+        self._ladder = parse_ladder(ladder)
+        self._timeout = timeout
+        self._loop: Optional[AbstractEventLoop] = None
+        self._thread: Optional[Thread] = None
+        self._loop_lock = Lock()
+        self._slots: Optional[Semaphore] = None
+        self._host_slots: Dict[str, Semaphore] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._client: Optional[AsyncClient] = None
+        self._cache = LruTtlCache(
+            FFPROBE_CACHE_MAX_SIZE, FFPROBE_CACHE_TTL_SECONDS, name="ffprobe"
+        )
+        self.probes = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.rung_hits: Dict[int, int] = {}
+        self._probe_mode = probe_mode
+        self.header_probes = 0
+        self.header_hits = 0
+        self.header_bytes = 0
+        self.header_bytes_max = 0
+        if self._binary is None:
+            logger.warning("PlexToolbox 未找到 ffprobe，ffprobe 数据源不可用")
+
+    @property
+    def available(self) -> bool:
+        """是否可用（找到了 ffprobe 可执行文件）。"""
+        return self._binary is not None
+
+    def _ensure_loop(self) -> AbstractEventLoop:
+        """按需启动探测池的事件循环线程（多个补全线程可能同时首次调用，加锁）。"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = new_event_loop()
+
+                def _run() -> None:
+                    set_event_loop(loop)
+                    loop.run_forever()
+
+                self._thread = Thread(target=_run, name="plextoolbox-ffprobe", daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _submit(self, url: str) -> ConcurrentFuture:
+        """
+        把一次探测提交到池事件循环。
+
+        :param url: STRM 指向的地址
+        :return: 探测结果的 Future
+        :raises RuntimeError: 池事件循环已关闭
+        """
+        coro = self._probe(url)
+        try:
+            return run_coroutine_threadsafe(coro, self._ensure_loop())
+        except Exception:
+            coro.close()
+            raise
+
+    def probe_strm(self, strm_path: str) -> Optional[Dict[str, Any]]:
+        """
+        探测 STRM 指向的媒体（阻塞调用，供补全线程使用）。
+
+        :param strm_path: STRM 文件路径
+        :return: 归一化媒体信息，失败返回 None
+        """
+        if not self.available:
+            return None
+        url = read_strm_url(strm_path)
+        if not url:
+            return None
+        try:
+            # 池已关闭（事件循环停止）时提交本身也会抛错
+            return self._submit(url).result()
+        except Exception as e:
+            logger.debug("ffprobe 探测失败 %s: %s", strm_path, e)
+            return None
+
+    async def probe_strm_async(self, strm_path: str) -> Optional[Dict[str, Any]]:
+        """
+        探测 STRM 指向的媒体（在调用方事件循环内等待，可随时取消）。
+
+        :param strm_path: STRM 文件路径
+        :return: 归一化媒体信息，失败返回 None（取消照常向上传播）
+        """
+        if not self.available:
+            return None
+        url = await to_thread(read_strm_url, strm_path)
+        if not url:
+            return None
+        try:
+            return await wrap_future(self._submit(url))
+        except CancelledError:
+            raise
+        except Exception as e:
+            logger.debug("ffprobe 探测失败 %s: %s", strm_path, e)
+            return None
+
+    async def _probe(self, url: str) -> Optional[Dict[str, Any]]:
+        """查缓存 → 单飞 → 阶梯探测（在池事件循环内执行）。"""
+        cached = self._cache.get(url, False)
+        if cached is not False:
+            return dict(cached) if cached else None
+        waiting = self._inflight.get(url)
+        if waiting is not None:
+            return await shield(waiting)
+        future = self._loop.create_future()
+        self._inflight[url] = future
+        info: Optional[Dict[str, Any]] = None
+        try:
+            info = await self._probe_ladder(url)
+            self._cache.put(
+                url, info, ttl=None if info else FFPROBE_NEGATIVE_TTL_SECONDS
+            )
+            return dict(info) if info else None
+        finally:
+            self._inflight.pop(url, None)
+            future.set_result(info)
+
+    async def _probe_ladder(self, url: str) -> Optional[Dict[str, Any]]:
+        """解析最终直链后先做头部探测（header 模式），再按阶梯逐级探测，结果完整即停止。"""
+        if self._slots is None:
+            self._slots = Semaphore(self._concurrency)
+        # 302 解析请求打到原始地址所在主机，同样受该主机的并发上限约束
+        async with self._host_semaphore(url), self._slots:
+            final_url = await self._final_url(url)
+        best: Optional[Dict[str, Any]] = None
+        async with self._host_semaphore(final_url), self._slots:
+            if self._probe_mode == PROBE_MODE_HEADER:
+                info = await self._probe_header(final_url)
+                if _probe_complete(info):
+                    self.header_hits += 1
+                    return info
+                best = info
+            for rung, (probesize, analyzeduration) in enumerate(self._ladder):
+                info = await self._run_ffprobe(final_url, probesize, analyzeduration)
+                if info and best is None:
+                    best = info
+                if _probe_complete(info):
+                    self.rung_hits[rung] = self.rung_hits.get(rung, 0) + 1
+                    return info
+        if best is None:
+            self.failures += 1
+        return best
+
+    def _host_semaphore(self, url: str) -> Semaphore:
+        """取 URL 所在主机的并发信号量，首次遇到该主机时创建。"""
+        host = urlparse(url).hostname or ""
+        host_slots = self._host_slots.get(host)
+        if host_slots is None:
+            host_slots = self._host_slots[host] = Semaphore(self._per_host)
+        return host_slots
+
+    async def _probe_header(self, url: str) -> Optional[Dict[str, Any]]:
+        """Range 拉取容器头拼成最小文件，经管道交给 ffprobe，并记录下载字节数。"""
+        data, meta = await fetch_minimal_header(self._client, url)
+        self.header_probes += 1
+        self.header_bytes += meta["downloaded"]
+        self.header_bytes_max = max(self.header_bytes_max, meta["downloaded"])
+        logger.debug(
+            "头部探测 %s：%s，%s 次请求共下载 %s 字节",
+            url, meta["container"] or "未知容器", meta["requests"], meta["downloaded"],
+        )
+        if not data:
+            return None
+        info = await self._run_ffprobe("pipe:0", len(data), 1_000_000, stdin_data=data)
+        return apply_header_meta(info, meta) if info else None
+
+    async def _final_url(self, url: str) -> str:
+        """跟随一次 302 取最终直链（异步版 resolve_final_url）。"""
+        if self._client is None:
+            self._client = AsyncClient(follow_redirects=False)
+        try:
+            resp = await self._client.head(url, timeout=15.0)
+            if 300 < resp.status_code < 400 and resp.headers.get("location"):
+                return resp.headers["location"]
+        except Exception as e:
+            logger.debug("解析最终直链失败 %s: %s", url, e)
+        return url
+
+    async def _run_ffprobe(
+        self,
+        url: str,
+        probesize: int,
+        analyzeduration: int,
+        stdin_data: Optional[bytes] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """以指定 probesize/analyzeduration 运行一次 ffprobe 子进程（可经 stdin 喂入数据）。"""
+        self.probes += 1
+        proc = await create_subprocess_exec(
+            self._binary,
+            "-v", "quiet",
+            "-print_format", "json",
+            "-show_format",
+            "-show_streams",
+            "-analyzeduration", str(analyzeduration),
+            "-probesize", str(probesize),
+            url,
+            stdin=DEVNULL if stdin_data is None else PIPE,
+            stdout=PIPE, stderr=DEVNULL,
+        )
+        try:
+            stdout, _ = await wait_for(proc.communicate(stdin_data), self._timeout)
+        except (AsyncTimeoutError, CancelledError) as e:
+            proc.kill()
+            await proc.wait()
+            if isinstance(e, CancelledError):
+                raise
+            self.timeouts += 1
+            logger.debug("ffprobe 超时（probesize=%s）: %s", probesize, url)
+            return None
+        if proc.returncode != 0:
+            return None
+        try:
+            return _normalize_ffprobe(json.loads(stdout or b"{}"))
+        except ValueError:
+            return None
+
+    def close(self) -> None:
+        """停止探测池事件循环（进行中的探测随之取消）。"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        async def _shutdown() -> None:
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+        try:
+            run_coroutine_threadsafe(_shutdown(), loop).result(timeout=5.0)
+        except Exception as e:
+            logger.debug("PlexToolbox 关闭 ffprobe 探测池异常: %s", e)
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回探测池统计。
+
+        :return: {available, probes, timeouts, failures, rung_hits, header_*, cache}
+        """
+        return {
+            "available": self.available,
+            "ladder": [
+                {"probesize": p, "analyzeduration": a} for p, a in self._ladder
+            ],
+            "probes": self.probes,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "rung_hits": dict(self.rung_hits),
+            "probe_mode": self._probe_mode,
+            "header_probes": self.header_probes,
+            "header_hits": self.header_hits,
+            "header_bytes_total": self.header_bytes,
+            "header_bytes_avg": (
+                int(self.header_bytes / self.header_probes) if self.header_probes else None
+            ),
+            "header_bytes_max": self.header_bytes_max,
+            "cache": self._cache.stats(),
+        }
+
+
 def _normalize_ffprobe(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     将 ffprobe JSON 输出归一化为 helper 需要的 payload 结构。
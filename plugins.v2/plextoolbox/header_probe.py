@@ -0,0 +1,409 @@
+"""按 HTTP Range 只拉取容器头部与索引区，拼成最小文件交给 ffprobe 探测，避免整段网络读取。"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from httpx import AsyncClient
+
+from app.log import logger
+
+# 首次请求的文件头字节数：MKV 的 EBML/Info/Tracks 与 MP4 前置 moov 通常都在其中
+HEADER_HEAD_BYTES = 256 * 1024
+# MP4 moov 后置时，一次拉取的文件尾字节数
+HEADER_TAIL_BYTES = 1024 * 1024
+# 按 SeekHead / box 跳转定位元素时，先拉取的字节数
+HEADER_ELEMENT_PEEK_BYTES = 64 * 1024
+# 单个头部元素（Tracks / moov）允许的最大字节数，超出则放弃（回退阶梯探测）
+HEADER_ELEMENT_MAX_BYTES = 16 * 1024 * 1024
+# MKV Cues（索引）允许的最大字节数，超出则不拉取 Cues，只用 Info / Tracks 探测
+HEADER_CUES_MAX_BYTES = 2 * 1024 * 1024
+# MP4 逐个顶层 box 跳转查找 moov 的最大次数
+MP4_MAX_BOX_HOPS = 16
+
+# Matroska 元素 ID
+_EBML_ID = 0x1A45DFA3
+_SEGMENT_ID = 0x18538067
+_SEEK_HEAD_ID = 0x114D9B74
+_SEEK_ID = 0x4DBB
+_SEEK_ELEMENT_ID = 0x53AB
+_SEEK_POSITION_ID = 0x53AC
+_INFO_ID = 0x1549A966
+_TRACKS_ID = 0x1654AE6B
+_CUES_ID = 0x1C53BB6B
+_CLUSTER_ID = 0x1F43B675
+# 未知长度的 Segment 头（8 字节全 1 长度），拼接最小 MKV 时使用
+_SEGMENT_UNKNOWN_HEADER = bytes.fromhex("18538067") + bytes.fromhex("01ffffffffffffff")
+
+
+class RangeUnsupported(Exception):
+    """源站不支持 Range 请求（返回了整个文件）。"""
+
+
+class RangeReader:
+    """对单个直链发 Range 请求，累计实际下载字节数。"""
+
+    def __init__(self, client: AsyncClient, url: str, timeout: float = 20.0) -> None:
+        """
+        :param client: 共享的 httpx AsyncClient
+        :param url: 最终直链
+        :param timeout: 单次请求超时秒数
+        """
+        self._client = client
+        self._url = url
+        self._timeout = timeout
+        self.downloaded = 0
+        self.requests = 0
+        self.total_size: Optional[int] = None
+
+    async def read(self, start: Optional[int], length: int) -> bytes:
+        """
+        读取一段字节。
+
+        :param start: 起始偏移；None 表示读取文件末尾 length 字节
+        :param length: 字节数
+        :return: 读到的字节（可能短于 length）
+        :raises RangeUnsupported: 源站忽略 Range 时
+        """
+        if length <= 0:
+            return b""
+        spec = f"bytes=-{length}" if start is None else f"bytes={start}-{start + length - 1}"
+        self.requests += 1
+        buf = bytearray()
+        async with self._client.stream(
+            "GET", self._url, headers={"Range": spec}, timeout=self._timeout
+        ) as resp:
+            if resp.status_code == 416:
+                return b""
+            if resp.status_code != 206:
+                raise RangeUnsupported(f"HTTP {resp.status_code}")
+            self.total_size = _content_range_total(resp.headers.get("content-range"))
+            # 只读所需字节，源站多给也不继续下载
+            async for chunk in resp.aiter_bytes():
+                buf.extend(chunk)
+                if len(buf) >= length:
+                    break
+        self.downloaded += len(buf)
+        return bytes(buf[:length])
+
+
+def _content_range_total(value: Optional[str]) -> Optional[int]:
+    """从 Content-Range（bytes a-b/total）中取文件总大小。"""
+    if not value or "/" not in value:
+        return None
+    total = value.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+# ---- Matroska ----
+
+
+def _ebml_id(buf: bytes, pos: int) -> Tuple[int, int]:
+    """读取 EBML 元素 ID，返回 (id, 字节数)。"""
+    first = buf[pos]
+    length = 9 - first.bit_length()
+    if first == 0 or length > 4 or pos + length > len(buf):
+        raise IndexError("EBML ID 不完整")
+    return int.from_bytes(buf[pos:pos + length], "big"), length
+
+
+def _ebml_size(buf: bytes, pos: int) -> Tuple[Optional[int], int]:
+    """读取 EBML 长度（vint），返回 (长度或 None 表示未知, 字节数)。"""
+    first = buf[pos]
+    length = 9 - first.bit_length()
+    if first == 0 or pos + length > len(buf):
+        raise IndexError("EBML 长度不完整")
+    value = first & ((1 << (8 - length)) - 1)
+    for b in buf[pos + 1:pos + length]:
+        value = (value << 8) | b
+    if value == (1 << (7 * length)) - 1:
+        return None, length
+    return value, length
+
+
+def _ebml_header(buf: bytes, pos: int) -> Tuple[int, int, Optional[int]]:
+    """
+    读取元素头。
+
+    :return: (元素 ID, 数据起始偏移, 数据长度或 None)
+    :raises IndexError: 缓冲区不足以读出完整元素头
+    """
+    eid, id_len = _ebml_id(buf, pos)
+    size, size_len = _ebml_size(buf, pos + id_len)
+    return eid, pos + id_len + size_len, size
+
+
+def _parse_seek_head(data: bytes) -> Dict[int, int]:
+    """
+    解析 SeekHead 数据区，得到 元素 ID -> 相对 Segment 数据区的偏移。
+
+    :param data: SeekHead 元素数据（不含头）
+    :return: {element_id: position}
+    """
+    result: Dict[int, int] = {}
+    pos = 0
+    while pos < len(data):
+        eid, start, size = _ebml_header(data, pos)
+        if size is None:
+            break
+        if eid == _SEEK_ID:
+            target, position = None, None
+            inner = data[start:start + size]
+            ipos = 0
+            while ipos < len(inner):
+                cid, cstart, csize = _ebml_header(inner, ipos)
+                if csize is None:
+                    break
+                value = inner[cstart:cstart + csize]
+                if cid == _SEEK_ELEMENT_ID:
+                    target = int.from_bytes(value, "big")
+                elif cid == _SEEK_POSITION_ID:
+                    position = int.from_bytes(value, "big")
+                ipos = cstart + csize
+            if target is not None and position is not None:
+                result.setdefault(target, position)
+        pos = start + size
+    return result
+
+
+async def _mkv_minimal(reader: RangeReader, head: bytes) -> Optional[bytes]:
+    """
+    定位 MKV 的 EBML 头、Info、Tracks 与 Cues，拼成只含这几个元素的最小 MKV。
+
+    优先在文件头内顺序查找；不在文件头内的元素按 SeekHead 记录的位置单独 Range 读取。
+    Cues 为可选：没有、定位不到或超过 HEADER_CUES_MAX_BYTES 时省略，不影响探测。
+
+    :param reader: Range 读取器
+    :param head: 文件头字节
+    :return: 最小 MKV 字节，定位失败返回 None
+    """
+    eid, start, size = _ebml_header(head, 0)
+    if eid != _EBML_ID or size is None:
+        return None
+    ebml = head[:start + size]
+    eid, segment_data, _ = _ebml_header(head, start + size)
+    if eid != _SEGMENT_ID:
+        return None
+    found: Dict[int, bytes] = {}
+    # 元素 ID -> 绝对偏移（从文件头内的截断元素或 SeekHead 得知）
+    located: Dict[int, int] = {}
+    pos = segment_data
+    while pos < len(head):
+        try:
+            eid, start, size = _ebml_header(head, pos)
+        except IndexError:
+            break
+        if size is None or eid == _CLUSTER_ID:
+            break
+        end = start + size
+        if eid in (_INFO_ID, _TRACKS_ID, _CUES_ID, _SEEK_HEAD_ID):
+            if end <= len(head):
+                if eid == _SEEK_HEAD_ID:
+                    for target, offset in _parse_seek_head(head[start:end]).items():
+                        located.setdefault(target, segment_data + offset)
+                else:
+                    found[eid] = head[pos:end]
+            elif eid != _SEEK_HEAD_ID:
+                located[eid] = pos
+        pos = end
+    for eid in (_INFO_ID, _TRACKS_ID):
+        if eid in found:
+            continue
+        offset = located.get(eid)
+        if offset is None:
+            return None
+        element = await _read_element(reader, offset, _ebml_element_length)
+        if element is None:
+            return None
+        found[eid] = element
+    if _CUES_ID not in found and _CUES_ID in located:
+        cues = await _read_element(
+            reader, located[_CUES_ID], _ebml_element_length, HEADER_CUES_MAX_BYTES
+        )
+        if cues is not None:
+            found[_CUES_ID] = cues
+    return (
+        ebml
+        + _SEGMENT_UNKNOWN_HEADER
+        + found[_INFO_ID]
+        + found[_TRACKS_ID]
+        + found.get(_CUES_ID, b"")
+    )
+
+
+def _ebml_element_length(peek: bytes) -> Optional[int]:
+    """由元素开头的字节算出整个 EBML 元素（含头）的长度。"""
+    _eid, start, size = _ebml_header(peek, 0)
+    return None if size is None else start + size
+
+
+# ---- MP4 ----
+
+
+def _mp4_box(buf: bytes, pos: int) -> Tuple[bytes, int, int]:
+    """
+    读取 MP4 box 头。
+
+    :return: (类型, 头长度, box 总长度；0 表示延伸到文件尾)
+    :raises IndexError: 缓冲区不足以读出完整 box 头
+    """
+    if pos + 8 > len(buf):
+        raise IndexError("box 头不完整")
+    size = int.from_bytes(buf[pos:pos + 4], "big")
+    kind = buf[pos + 4:pos + 8]
+    if size == 1:
+        if pos + 16 > len(buf):
+            raise IndexError("box 头不完整")
+        return kind, 16, int.from_bytes(buf[pos + 8:pos + 16], "big")
+    return kind, 8, size
+
+
+def _mp4_box_length(peek: bytes) -> Optional[int]:
+    """由 box 开头的字节算出整个 box 的长度。"""
+    _kind, header_len, size = _mp4_box(peek, 0)
+    return size if size >= header_len else None
+
+
+def _find_moov_in_tail(tail: bytes) -> Optional[bytes]:
+    """在文件尾字节中查找完整的 moov box。"""
+    idx = tail.find(b"moov")
+    while idx >= 4:
+        size = int.from_bytes(tail[idx - 4:idx], "big")
+        if 8 <= size and idx - 4 + size <= len(tail):
+            return tail[idx - 4:idx - 4 + size]
+        idx = tail.find(b"moov", idx + 4)
+    return None
+
+
+async def _mp4_minimal(reader: RangeReader, head: bytes) -> Optional[bytes]:
+    """
+    定位 MP4 的 ftyp 与 moov，拼成只含这两个 box 的最小 MP4。
+
+    moov 在文件头内（faststart）时直接截取；否则先读文件尾查找，仍找不到再按顶层
+    box 长度逐个跳转定位。
+
+    :param reader: Range 读取器
+    :param head: 文件头字节
+    :return: 最小 MP4 字节，定位失败返回 None
+    """
+    ftyp = b""
+    pos = 0
+    next_box: Optional[int] = None
+    while True:
+        try:
+            kind, header_len, size = _mp4_box(head, pos)
+        except IndexError:
+            next_box = pos
+            break
+        if size == 0:
+            break
+        if size < header_len:
+            return None
+        if kind == b"ftyp":
+            ftyp = head[pos:pos + size]
+        elif kind == b"moov":
+            if pos + size <= len(head):
+                return ftyp + head[pos:pos + size]
+            moov = await _read_element(reader, pos, _mp4_box_length)
+            return ftyp + moov if moov else None
+        if pos + size > len(head):
+            next_box = pos + size
+            break
+        pos += size
+    if next_box is None:
+        return None
+    moov = _find_moov_in_tail(await reader.read(None, HEADER_TAIL_BYTES))
+    if moov:
+        return ftyp + moov
+    total = reader.total_size
+    for _ in range(MP4_MAX_BOX_HOPS):
+        if total is not None and next_box >= total:
+            return None
+        peek = await reader.read(next_box, 16)
+        try:
+            kind, header_len, size = _mp4_box(peek, 0)
+        except IndexError:
+            return None
+        if kind == b"moov":
+            moov = await _read_element(reader, next_box, _mp4_box_length)
+            return ftyp + moov if moov else None
+        if size < header_len:
+            return None
+        next_box += size
+    return None
+
+
+async def _read_element(
+    reader: RangeReader,
+    offset: int,
+    measure: Callable[[bytes], Optional[int]],
+    max_bytes: int = HEADER_ELEMENT_MAX_BYTES,
+) -> Optional[bytes]:
+    """
+    读取从 offset 开始的一个完整元素 / box（先少量预读得出长度，不够再补读）。
+
+    :param reader: Range 读取器
+    :param offset: 元素绝对偏移
+    :param measure: 由开头字节计算元素总长度的函数
+    :param max_bytes: 元素允许的最大字节数
+    :return: 元素字节，长度未知、过大或读取不全时返回 None
+    """
+    peek = await reader.read(offset, min(HEADER_ELEMENT_PEEK_BYTES, max_bytes))
+    try:
+        length = measure(peek)
+    except IndexError:
+        return None
+    if length is None or length > max_bytes:
+        return None
+    if length > len(peek):
+        peek += await reader.read(offset + len(peek), length - len(peek))
+    return peek[:length] if len(peek) >= length else None
+
+
+async def fetch_minimal_header(
+    client: AsyncClient, url: str
+) -> Tuple[Optional[bytes], Dict[str, Any]]:
+    """
+    只用 Range 请求取出 MKV / MP4 的容器头与轨道信息，拼成可交给 ffprobe 的最小文件。
+
+    :param client: 共享的 httpx AsyncClient（不跟随跳转，url 应为最终直链）
+    :param url: 最终直链
+    :return: (最小文件字节或 None, {container, size, downloaded, requests})
+    """
+    reader = RangeReader(client, url)
+    meta: Dict[str, Any] = {"container": None, "size": None, "downloaded": 0, "requests": 0}
+    data: Optional[bytes] = None
+    try:
+        head = await reader.read(0, HEADER_HEAD_BYTES)
+        if head[:4] == bytes.fromhex("1a45dfa3"):
+            meta["container"] = "mkv"
+            data = await _mkv_minimal(reader, head)
+        elif head[4:8] == b"ftyp":
+            meta["container"] = "mp4"
+            data = await _mp4_minimal(reader, head)
+    except RangeUnsupported as e:
+        logger.debug("直链不支持 Range，放弃头部探测 %s: %s", url, e)
+    except (IndexError, ValueError) as e:
+        logger.debug("容器头解析失败 %s: %s", url, e)
+    except Exception as e:
+        logger.debug("头部探测请求失败 %s: %s", url, e)
+    meta.update(size=reader.total_size, downloaded=reader.downloaded, requests=reader.requests)
+    return data, meta
+
+
+def apply_header_meta(info: Dict[str, Any], meta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    用 Range 响应得到的真实文件大小修正探测结果（最小文件的大小与码率没有意义）。
+
+    :param info: 对最小文件 ffprobe 的归一化结果
+    :param meta: fetch_minimal_header 返回的元信息
+    :return: 修正后的 info
+    """
+    size = meta.get("size")
+    info["size"] = size
+    duration = info.get("duration")
+    info["bitrate"] = int(size * 8 / duration) if size and duration else None
+    if meta.get("container"):
+        info["container"] = meta["container"]
+    return info
+
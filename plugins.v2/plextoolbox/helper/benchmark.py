@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+helper 写库性能基准：生成指定规模的模拟 Plex 库，按不同批大小驱动 write_media_info_batch，
+输出吞吐、单批延迟分位、WAL 增长与写锁持有时间（JSON），便于对比写入器优化前后的结果。
+
+用法示例：
+    python3 benchmark.py --parts 100000 --batch-sizes 1,10,100,1000,5000 --output bench.json
+    python3 benchmark.py --db /tmp/bench.db --keep    # 复用 / 保留生成的库
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import plex_mediainfo_helper as h
+
+# 生成库时每次 executemany 的行数
+GENERATE_CHUNK = 20000
+# 模拟库的容器 / 编码取值
+_CONTAINERS = ("mkv", "mp4", "avi", "ts")
+_VIDEO_CODECS = ("h264", "hevc", "av1", "mpeg2video")
+_AUDIO_CODECS = ("aac", "ac3", "eac3", "dca", "truehd", "flac")
+_SUB_CODECS = ("srt", "ass", "pgs")
+_LANGUAGES = ("chi", "eng", "jpn", "kor", "fre", "ger")
+_RESOLUTIONS = ((1280, 720), (1920, 1080), (3840, 2160))
+
+# 近似 Plex 的表结构：除写入器管理的列外，带几列 Plex 自行维护的列
+_SCHEMA = """
+CREATE TABLE media_items (
+    id INTEGER PRIMARY KEY, library_section_id INTEGER, metadata_item_id INTEGER,
+    width INTEGER, height INTEGER, size INTEGER, duration INTEGER, bitrate INTEGER,
+    container TEXT, video_codec TEXT, audio_codec TEXT, display_aspect_ratio REAL,
+    frames_per_second REAL, audio_channels INTEGER, media_analysis_version INTEGER,
+    created_at INTEGER, updated_at INTEGER, extra_data TEXT
+);
+CREATE TABLE media_parts (
+    id INTEGER PRIMARY KEY, media_item_id INTEGER, directory_id INTEGER,
+    hash TEXT, file TEXT, size INTEGER, duration INTEGER, container TEXT,
+    created_at INTEGER, updated_at INTEGER, extra_data TEXT
+);
+CREATE TABLE media_streams (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, stream_type_id INTEGER, media_item_id INTEGER,
+    media_part_id INTEGER, codec TEXT, language TEXT, "index" INTEGER,
+    width INTEGER, height INTEGER, bitrate INTEGER, channels INTEGER,
+    frame_rate REAL, bit_depth INTEGER, sampling_rate INTEGER, "default" INTEGER,
+    forced INTEGER, created_at INTEGER, updated_at INTEGER, extra_data TEXT
+);
+CREATE INDEX index_media_parts_on_media_item_id ON media_parts (media_item_id);
+CREATE INDEX index_media_streams_on_media_part_id ON media_streams (media_part_id);
+CREATE INDEX index_media_streams_on_media_item_id ON media_streams (media_item_id);
+"""
+
+
+def fake_streams(rng: random.Random) -> List[Dict[str, Any]]:
+    """
+    生成一个 part 的流列表：1 条视频、1~4 条音频、0~8 条字幕。
+
+    :param rng: 随机数发生器
+    :return: helper payload 格式的流列表
+    """
+    width, height = rng.choice(_RESOLUTIONS)
+    streams = [{
+        "stream_type": 1, "codec": rng.choice(_VIDEO_CODECS), "index": 0,
+        "width": width, "height": height, "bitrate": rng.randint(2000, 60000),
+        "frame_rate": rng.choice((23.976, 25.0, 29.97)), "bit_depth": rng.choice((8, 10)),
+    }]
+    for _ in range(rng.randint(1, 4)):
+        streams.append({
+            "stream_type": 2, "codec": rng.choice(_AUDIO_CODECS), "index": len(streams),
+            "channels": rng.choice((2, 6, 8)), "language": rng.choice(_LANGUAGES),
+            "sampling_rate": 48000, "bitrate": rng.randint(128, 4000),
+        })
+    for _ in range(rng.choice((0, 0, 1, 2, 2, 3, 4, 6, 8))):
+        streams.append({
+            "stream_type": 3, "codec": rng.choice(_SUB_CODECS), "index": len(streams),
+            "language": rng.choice(_LANGUAGES),
+        })
+    return streams
+
+
+def fake_payload(part_id: int, rng: random.Random) -> Dict[str, Any]:
+    """
+    生成一条写入载荷（与插件发给 helper 的格式一致）。
+
+    :param part_id: media_parts.id
+    :param rng: 随机数发生器
+    :return: helper payload
+    """
+    streams = fake_streams(rng)
+    video = streams[0]
+    audio = streams[1]
+    return {
+        "part_id": part_id,
+        "container": rng.choice(_CONTAINERS),
+        "duration": rng.randint(1200, 10800) * 1000,
+        "size": rng.randint(300, 80000) * 1024 * 1024,
+        "bitrate": video["bitrate"] + audio["bitrate"],
+        "width": video["width"],
+        "height": video["height"],
+        "video_codec": video["codec"],
+        "audio_codec": audio["codec"],
+        "frame_rate": video["frame_rate"],
+        "audio_channels": audio["channels"],
+        "overwrite_streams": True,
+        "streams": streams,
+    }
+
+
+def generate_db(path: str, parts: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    生成模拟 Plex 库：每个 media_item 一个 part，流条数按 fake_streams 分布，开启 WAL。
+
+    :param path: 数据库文件路径（须不存在）
+    :param parts: part 数量
+    :param seed: 随机种子
+    :return: {parts, streams, seconds, db_bytes}
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(_SCHEMA)
+    now = int(time.time())
+    streams_total = 0
+    for start in range(1, parts + 1, GENERATE_CHUNK):
+        items, part_rows, stream_rows = [], [], []
+        for pid in range(start, min(start + GENERATE_CHUNK, parts + 1)):
+            p = fake_payload(pid, rng)
+            items.append((
+                pid, 1, pid, p["width"], p["height"], p["size"], p["duration"],
+                p["bitrate"], p["container"], p["video_codec"], p["audio_codec"],
+                p["frame_rate"], p["audio_channels"], 6, now, now,
+            ))
+            part_rows.append((
+                pid, pid, 1, f"{pid:040x}", f"/strm/{pid // 1000}/{pid}.strm",
+                p["size"], p["duration"], p["container"], now, now,
+            ))
+            for st in p["streams"]:
+                stream_rows.append((
+                    st["stream_type"], pid, pid, st["codec"], st.get("language"),
+                    st["index"], st.get("width"), st.get("height"), st.get("bitrate"),
+                    st.get("channels"), st.get("frame_rate"), st.get("bit_depth"),
+                    st.get("sampling_rate"), now, now,
+                ))
+        conn.executemany(
+            "INSERT INTO media_items (id, library_section_id, metadata_item_id, width, height, "
+            "size, duration, bitrate, container, video_codec, audio_codec, frames_per_second, "
+            "audio_channels, media_analysis_version, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            items,
+        )
+        conn.executemany(
+            "INSERT INTO media_parts (id, media_item_id, directory_id, hash, file, size, "
+            "duration, container, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            part_rows,
+        )
+        conn.executemany(
+            'INSERT INTO media_streams (stream_type_id, media_item_id, media_part_id, codec, '
+            'language, "index", width, height, bitrate, channels, frame_rate, bit_depth, '
+            "sampling_rate, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            stream_rows,
+        )
+        conn.commit()
+        streams_total += len(stream_rows)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return {
+        "parts": parts,
+        "streams": streams_total,
+        "seconds": round(time.perf_counter() - started, 3),
+        "db_bytes": os.path.getsize(path),
+    }
+
+
+def count_parts(path: str) -> int:
+    """返回已有模拟库中的 part 数量。"""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT MAX(id) FROM media_parts").fetchone()[0] or 0
+    finally:
+        conn.close()
+
+
+def checkpoint(path: str) -> None:
+    """把 WAL 合并回主库并截断，使每组测量从空 WAL 开始。"""
+    conn = sqlite3.connect(path, timeout=30.0)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+def _wal_bytes(path: str) -> int:
+    """返回 -wal 文件当前大小。"""
+    try:
+        return os.path.getsize(path + "-wal")
+    except OSError:
+        return 0
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """最近秩法分位数。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class LockTimer:
+    """
+    替换 helper 的 _open_conn，用 SQL 跟踪回调记录每个写事务从 BEGIN IMMEDIATE
+    到 COMMIT/ROLLBACK 的时长（即写锁持有时间）。
+    """
+
+    def __init__(self) -> None:
+        self.holds: List[float] = []
+        self._began: Optional[float] = None
+        self._orig = h._open_conn
+
+    def _trace(self, sql: str) -> None:
+        if sql.startswith("BEGIN"):
+            self._began = time.perf_counter()
+        elif sql in ("COMMIT", "ROLLBACK") and self._began is not None:
+            self.holds.append(time.perf_counter() - self._began)
+            self._began = None
+
+    def _open(self, db_path: str) -> sqlite3.Connection:
+        conn = self._orig(db_path)
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def __enter__(self) -> "LockTimer":
+        h._open_conn = self._open
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        h._open_conn = self._orig
+
+
+def run_batch_size(
+    db: str, parts: int, batch_size: int, items: int, offset: int, seed: int
+) -> Dict[str, Any]:
+    """
+    以固定批大小写入 items 条（part 从 offset 起依次取，超出库规模时回绕），
+    载荷内容与库中现有记录不同，测量的是真实写入而非“无变化”跳过。
+
+    :param db: 数据库路径
+    :param parts: 库中 part 数量
+    :param batch_size: 每批条数
+    :param items: 本组写入总条数
+    :param offset: 起始 part 序号
+    :param seed: 随机种子
+    :return: 本组测量结果
+    """
+    rng = random.Random(seed)
+    checkpoint(db)
+    # 旁观连接模拟常驻的 Plex：有连接未关时，写连接关闭不会把 WAL 合并删除，才能看到 WAL 增长
+    observer = sqlite3.connect(db)
+    observer.execute("SELECT 1 FROM media_parts LIMIT 1").fetchall()
+    wal_max = 0
+    latencies: List[float] = []
+    written = unchanged = failed = 0
+    started = time.perf_counter()
+    with LockTimer() as timer:
+        done = 0
+        while done < items:
+            n = min(batch_size, items - done)
+            batch = [
+                fake_payload((offset + done + i) % parts + 1, rng) for i in range(n)
+            ]
+            t0 = time.perf_counter()
+            ok, results = h.write_media_info_batch(db, batch)
+            latencies.append(time.perf_counter() - t0)
+            written += ok
+            failed += n - ok
+            unchanged += sum(1 for r in results if r.get("unchanged"))
+            wal_max = max(wal_max, _wal_bytes(db))
+            done += n
+    elapsed = time.perf_counter() - started
+    wal_end = _wal_bytes(db)
+    observer.close()
+    holds = timer.holds
+    return {
+        "batch_size": batch_size,
+        "items": items,
+        "batches": len(latencies),
+        "ok": written,
+        "failed": failed,
+        "unchanged": unchanged,
+        "seconds": round(elapsed, 3),
+        "items_per_sec": round(items / elapsed, 1) if elapsed else None,
+        "batch_latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 3),
+            "p99": round(_percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3),
+        },
+        "lock_hold_ms": {
+            "total": round(sum(holds) * 1000, 3),
+            "p50": round(_percentile(holds, 50) * 1000, 3),
+            "p99": round(_percentile(holds, 99) * 1000, 3),
+            "max": round(max(holds, default=0) * 1000, 3),
+        },
+        "wal_bytes": {"end": wal_end, "max": wal_max},
+    }
+
+
+def main() -> None:
+    """解析参数、准备模拟库、逐个批大小测量并输出 JSON。"""
+    parser = argparse.ArgumentParser(description="helper 写库性能基准")
+    parser.add_argument("--parts", type=int, default=10000, help="模拟库 part 数量（如 10000/100000/1000000）")
+    parser.add_argument("--batch-sizes", default="1,10,100,1000,5000", help="逗号分隔的批大小")
+    parser.add_argument("--items", type=int, default=10000, help="每个批大小写入的总条数")
+    parser.add_argument("--single-items", type=int, default=1000, help="批大小为 1 时写入的条数（逐条提交较慢）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--db", default="", help="模拟库路径；已存在则直接复用，不存在则在此生成")
+    parser.add_argument("--keep", action="store_true", help="保留临时生成的模拟库")
+    parser.add_argument("--output", default="", help="结果 JSON 输出文件（默认打印到标准输出）")
+    args = parser.parse_args()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b.strip()]
+
+    tmp = ""
+    db = args.db
+    if not db:
+        tmp = tempfile.mkdtemp(prefix="pth-bench-")
+        db = os.path.join(tmp, "com.plexapp.plugins.library.db")
+    if os.path.isfile(db):
+        generated = {"reused": True, "parts": count_parts(db), "db_bytes": os.path.getsize(db)}
+    else:
+        print(f"生成模拟库 {db}（{args.parts} parts）…", file=sys.stderr)
+        generated = generate_db(db, args.parts, args.seed)
+    parts = generated["parts"]
+
+    report: Dict[str, Any] = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "sqlite_has_upsert": h.SQLITE_HAS_UPSERT,
+        },
+        "db": dict(generated, path=db),
+        "runs": [],
+    }
+    offset = 0
+    try:
+        for i, size in enumerate(batch_sizes):
+            items = args.single_items if size == 1 else args.items
+            print(f"批大小 {size}：写入 {items} 条…", file=sys.stderr)
+            run = run_batch_size(db, parts, size, items, offset, args.seed + i + 1)
+            report["runs"].append(run)
+            print(
+                f"  {run['items_per_sec']} 条/秒，单批 p99 {run['batch_latency_ms']['p99']} ms",
+                file=sys.stderr,
+            )
+            offset += items
+    finally:
+        report["db"]["final_bytes"] = os.path.getsize(db)
+        if tmp and not args.keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
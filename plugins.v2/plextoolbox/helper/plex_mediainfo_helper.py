@@ -10,23 +10,32 @@ Plex MediaInfo Helper —— 运行在 Plex 所在机器上的本地写库小服
 安全约束：
 - 仅监听内网地址，并用简单 token 校验。
 - 每次写入前对数据库做带时间戳的备份，仅保留最近 N 份。
-- 使用 WAL + busy_timeout，并对写操作串行化。
+- 使用 WAL + busy_timeout，并对写操作串行化：默认 async 模式下由单个写线程持有长期连接，
+  并发到达的写请求合并进同一事务提交；HTTP 层为 asyncio 长连接服务。
 - 通过 PRAGMA table_info 自省列名，只写实际存在的列，绝不 ALTER TABLE。
+  表结构按数据库文件与 schema_version 缓存，SQL 文本按列组合缓存，流记录批量插入。
+- 写入前比较新旧记录与流指纹，内容未变的 part 不产生任何写入，变化的流按 (类型, 序号) 差量更新。
 
 仅依赖 Python 标准库。
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
 import os
-import shutil
+import queue
 import sqlite3
+import sys
 import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime
 from glob import glob
+from hashlib import sha1
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from typing import Any, Dict, List, Optional, Tuple
+from itertools import groupby
+from typing import Any, Collection, Dict, FrozenSet, List, Optional, Tuple
 
 LISTEN_HOST = os.environ.get("PTH_HOST", "0.0.0.0")
 LISTEN_PORT = int(os.environ.get("PTH_PORT", "9001"))
@@ -39,6 +48,32 @@ REFUSE_WHEN_PLAYING = os.environ.get("PTH_REFUSE_WHEN_PLAYING", "1") == "1"
 # 每次写入前是否备份数据库。全量备份大库耗时高（写慢的主因之一），默认关闭；
 # 需要兜底时置 PTH_BACKUP_ON_WRITE=1。
 BACKUP_ON_WRITE = os.environ.get("PTH_BACKUP_ON_WRITE", "0") == "1"
+# 写前备份方式：full（在线备份 API 整库快照，按时间窗限频）/ journal（只记录被改动行的修改前镜像）
+BACKUP_MODE = os.environ.get("PTH_BACKUP_MODE", "full").strip().lower()
+# full 模式：两次整库备份的最小间隔（秒），窗口内的写入复用最近一份备份
+BACKUP_MIN_INTERVAL = float(os.environ.get("PTH_BACKUP_MIN_INTERVAL", "3600"))
+# full 模式：在线备份每步复制的页数
+BACKUP_PAGES_PER_STEP = int(os.environ.get("PTH_BACKUP_PAGES", "1024"))
+# full 模式：每步之间让出的毫秒数，给 Plex 留出磁盘带宽
+BACKUP_STEP_SLEEP = float(os.environ.get("PTH_BACKUP_SLEEP_MS", "20")) / 1000
+# full 模式：源库被其他连接写入会让分页备份从头重来，重来超过该次数即放弃分页
+BACKUP_MAX_RESTARTS = int(os.environ.get("PTH_BACKUP_MAX_RESTARTS", "3"))
+# full 模式：分页备份最长秒数，超时同样放弃分页
+BACKUP_MAX_SECONDS = float(os.environ.get("PTH_BACKUP_MAX_SECONDS", "120"))
+# journal 模式：行镜像保留天数
+JOURNAL_KEEP_DAYS = float(os.environ.get("PTH_JOURNAL_KEEP_DAYS", "30"))
+# 服务模式：async（asyncio 长连接 + 单写线程合并事务，默认）/ threaded（旧版每请求一线程、每次写入新建连接）
+SERVER_MODE = os.environ.get("PTH_SERVER_MODE", "async").strip().lower()
+# async 模式：空闲长连接保持秒数
+KEEPALIVE_SECONDS = float(os.environ.get("PTH_KEEPALIVE_SECONDS", "75"))
+# async 模式：单个合并事务最多写入的条数
+COALESCE_MAX_ITEMS = int(os.environ.get("PTH_COALESCE_MAX_ITEMS", "1000"))
+# async 模式：请求体字节数上限
+MAX_BODY_BYTES = 64 * 1024 * 1024
+# Plex 繁忙状态后台轮询间隔（秒）；0 表示不启用监视器，每次请求实时检测
+BUSY_POLL_SECONDS = float(os.environ.get("PTH_BUSY_POLL_SECONDS", "5"))
+# 繁忙检测单次请求本地 Plex API 的超时秒数（一次检测最多两次请求）
+BUSY_PROBE_TIMEOUT_SECONDS = 6.0
 
 DB_CANDIDATES = [
     "/config/Library/Application Support/Plex Media Server/Plug-in Support/Databases/com.plexapp.plugins.library.db",
@@ -49,6 +84,24 @@ DB_CANDIDATES = [
 
 _WRITE_LOCK = threading.Lock()
 
+# SQLite 3.24 起支持 INSERT ... ON CONFLICT DO UPDATE，更早的版本退回先查后写
+SQLITE_HAS_UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+# 每个连接缓存的预编译语句条数（sqlite3 按 SQL 文本命中）
+STATEMENT_CACHE_SIZE = 256
+# 写入涉及的表
+_WRITE_TABLES = ("media_items", "media_parts", "media_streams")
+# (数据库路径, schema_version) -> {表名: 列名集合}；Plex 升级改表后 schema_version 变化自动重新自省
+_SCHEMA_CACHE: Dict[Tuple[str, int], Dict[str, FrozenSet[str]]] = {}
+_SCHEMA_LOCK = threading.Lock()
+# 写入器管理的 media_streams 列：流指纹与差量更新只比较这些列，其余列（Plex 自行分析写入的）保持不动
+_STREAM_COLUMNS = (
+    "media_item_id", "media_part_id", "stream_type_id", "stream_type", "codec",
+    "index", "width", "height", "bitrate", "channels", "language", "frame_rate",
+    "bit_depth", "sampling_rate",
+)
+# 差量更新时用来对应新旧流记录的列
+_STREAM_MATCH_COLUMNS = ("stream_type_id", "stream_type", "index")
+
 
 def _now_str() -> str:
     """返回用于备份文件名的时间戳字符串。"""
@@ -98,27 +151,90 @@ def list_db_candidates() -> List[str]:
     return found
 
 
+def _backup_dir(db_path: str) -> str:
+    """返回（并创建）数据库同级的备份目录。"""
+    backup_dir = os.path.join(os.path.dirname(db_path), "pth_backups")
+    os.makedirs(backup_dir, exist_ok=True)
+    return backup_dir
+
+
+class _PagedBackupAborted(Exception):
+    """分页备份被反复重来或超时，改用一次性复制。"""
+
+
+def _copy_db(db_path: str, tmp: str) -> None:
+    """
+    在线备份到 tmp：先分页限速复制；源库持续被写导致重来超过 BACKUP_MAX_RESTARTS 次、
+    或耗时超过 BACKUP_MAX_SECONDS 时，改为一步复制全部页（单个读事务内完成，
+    WAL 下不阻塞 Plex 写入，也不会再被打断重来）。
+
+    :param db_path: 数据库文件路径
+    :param tmp: 目标临时文件路径
+    """
+    deadline = time.monotonic() + BACKUP_MAX_SECONDS
+    state = {"remaining": None, "restarts": 0}
+
+    def _throttle(_status: int, remaining: int, _total: int) -> None:
+        last = state["remaining"]
+        if last is not None and remaining > last:
+            state["restarts"] += 1
+        state["remaining"] = remaining
+        if state["restarts"] > BACKUP_MAX_RESTARTS or time.monotonic() > deadline:
+            raise _PagedBackupAborted()
+        if remaining and BACKUP_STEP_SLEEP > 0:
+            time.sleep(BACKUP_STEP_SLEEP)
+
+    src = sqlite3.connect(db_path, timeout=30.0)
+    try:
+        target = sqlite3.connect(tmp)
+        try:
+            src.backup(target, pages=max(1, BACKUP_PAGES_PER_STEP), progress=_throttle)
+            return
+        except _PagedBackupAborted:
+            print(
+                f"[{_now_str()}] 分页备份重来 {state['restarts']} 次或超时，改为一次性复制"
+            )
+        finally:
+            target.close()
+        os.remove(tmp)
+        target = sqlite3.connect(tmp)
+        try:
+            src.backup(target)
+        finally:
+            target.close()
+    finally:
+        src.close()
+
+
 def backup_db(db_path: str) -> str:
     """
-    备份数据库文件（含 -wal/-shm），并清理超出保留份数的旧备份。
+    用 SQLite 在线备份 API 复制数据库（含 WAL 中已提交的内容），并清理超出保留份数的旧备份。
+
+    每步复制 BACKUP_PAGES_PER_STEP 页后暂停 BACKUP_STEP_SLEEP 秒，步与步之间不持有读锁，
+    Plex 可照常读写；被持续写入打断时退回一次性复制（见 _copy_db），耗时有上限。
+    先写临时文件，完成后再改名，中途失败不会留下半截备份。
 
     :param db_path: 数据库文件路径
     :return: 备份文件路径
+    :raises sqlite3.Error: 备份失败（本次写入随之失败，不会在无备份的情况下写库）
     """
-    backup_dir = os.path.join(os.path.dirname(db_path), "pth_backups")
-    os.makedirs(backup_dir, exist_ok=True)
+    backup_dir = _backup_dir(db_path)
     base = os.path.basename(db_path)
     dst = os.path.join(backup_dir, f"{base}.{_now_str()}.bak")
-    shutil.copy2(db_path, dst)
-    for suffix in ("-wal", "-shm"):
-        side = db_path + suffix
-        if os.path.isfile(side):
-            shutil.copy2(side, dst + suffix)
+    tmp = dst + ".part"
+    try:
+        _copy_db(db_path, tmp)
+    except Exception as e:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise sqlite3.OperationalError(f"写前备份失败: {e}") from e
+    os.replace(tmp, dst)
     backups = sorted(glob(os.path.join(backup_dir, f"{base}.*.bak")))
     excess = len(backups) - BACKUP_KEEP
     for old in backups[: max(0, excess)]:
         try:
             os.remove(old)
+            # 旧版整文件复制留下的 -wal/-shm
             for suffix in ("-wal", "-shm"):
                 if os.path.isfile(old + suffix):
                     os.remove(old + suffix)
@@ -127,6 +243,239 @@ def backup_db(db_path: str) -> str:
     return dst
 
 
+# 数据库路径 -> (备份时刻 monotonic, 备份路径, 备份后的库文件签名)
+_LAST_BACKUP: Dict[str, Tuple[float, str, Tuple[int, ...]]] = {}
+_BACKUP_LOCK = threading.Lock()
+
+
+def _db_signature(db_path: str) -> Tuple[int, ...]:
+    """库文件与 -wal 的 (大小, 修改时间)，用来判断备份后库是否有变化。"""
+    sig: List[int] = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+            sig += [st.st_size, st.st_mtime_ns]
+        except OSError:
+            sig += [0, 0]
+    return tuple(sig)
+
+
+def ensure_backup(db_path: str) -> str:
+    """
+    写前整库备份（限频去重）：距上次备份不足 BACKUP_MIN_INTERVAL 秒、
+    或上次备份后库文件未变化时，复用最近一份备份，不再复制。
+
+    :param db_path: 数据库文件路径
+    :return: 本次写入对应的备份文件路径
+    """
+    with _BACKUP_LOCK:
+        last = _LAST_BACKUP.get(db_path)
+        if last and os.path.isfile(last[1]):
+            if (
+                time.monotonic() - last[0] < BACKUP_MIN_INTERVAL
+                or last[2] == _db_signature(db_path)
+            ):
+                return last[1]
+        dst = backup_db(db_path)
+        _LAST_BACKUP[db_path] = (time.monotonic(), dst, _db_signature(db_path))
+        return dst
+
+
+def _journal_path(db_path: str) -> str:
+    """行镜像日志库路径（与整库备份同目录）。"""
+    return os.path.join(_backup_dir(db_path), f"{os.path.basename(db_path)}.journal.db")
+
+
+_JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS row_journal (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch      TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    tbl        TEXT NOT NULL,
+    key_col    TEXT NOT NULL,
+    key_val    INTEGER NOT NULL,
+    rows       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_row_journal_batch ON row_journal(batch);
+"""
+
+
+def _open_journal(db_path: str) -> sqlite3.Connection:
+    """打开行镜像日志库并确保表结构存在。"""
+    conn = sqlite3.connect(_journal_path(db_path), timeout=30.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_JOURNAL_SCHEMA)
+    return conn
+
+
+def _encode_value(value: Any) -> Any:
+    """行镜像 JSON 编码：BLOB 转十六进制标记。"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$blob": bytes(value).hex()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    """_encode_value 的逆操作。"""
+    if isinstance(value, dict) and "$blob" in value:
+        return bytes.fromhex(value["$blob"])
+    return value
+
+
+class ChangeJournal:
+    """
+    一次写事务的行镜像日志：改动前记录 media_items/media_parts 行、某个 part 的全部
+    media_streams 行的原始内容（不存在记为空），事务提交后落盘，可按批次回滚。
+
+    同一批次内同一行只记第一次（即事务开始前的状态）；单条写入失败回滚时一并丢弃其记录。
+    """
+
+    def __init__(self, db_path: str) -> None:
+        """
+        :param db_path: Plex 数据库路径（日志库放在其备份目录下）
+        """
+        self.db_path = db_path
+        # 批次号按时间排序，回滚时“此批次及之后”据此比较
+        self.batch = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self._entries: List[Tuple[str, str, Any, List[Dict[str, Any]]]] = []
+        self._seen: Dict[Tuple[str, Any], int] = {}
+
+    def record(self, conn: sqlite3.Connection, table: str, key_col: str, key_val: Any) -> None:
+        """
+        记录 table 中 key_col=key_val 的全部行的当前内容。
+
+        :param conn: 写事务所在连接
+        :param table: 表名
+        :param key_col: 定位列（media_streams 用 media_part_id，其余用 id）
+        :param key_val: 定位值
+        """
+        seen_key = (table, key_val)
+        if seen_key in self._seen:
+            return
+        cur = conn.execute(f'SELECT * FROM {table} WHERE "{key_col}"=?', (key_val,))
+        names = [d[0] for d in cur.description]
+        rows = [dict(zip(names, r)) for r in cur.fetchall()]
+        self._seen[seen_key] = len(self._entries)
+        self._entries.append((table, key_col, key_val, rows))
+
+    def mark(self) -> int:
+        """返回当前记录位置，配合 discard 丢弃单条写入的记录。"""
+        return len(self._entries)
+
+    def discard(self, mark: int) -> None:
+        """丢弃 mark 之后的记录（对应的写入已回滚）。"""
+        del self._entries[mark:]
+        self._seen = {k: i for k, i in self._seen.items() if i < mark}
+
+    def flush(self) -> int:
+        """
+        把本批次记录写入日志库，并清理超过保留天数的旧记录。
+
+        在数据库事务提交后调用；日志库写失败只打印告警，不影响已提交的写入结果。
+
+        :return: 写入的记录条数
+        """
+        if not self._entries:
+            return 0
+        now = time.time()
+        try:
+            conn = _open_journal(self.db_path)
+        except (sqlite3.Error, OSError) as e:
+            print(f"[{_now_str()}] 行镜像日志写入失败（批次 {self.batch}）: {e}")
+            return 0
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO row_journal (batch, created_at, tbl, key_col, key_val, rows) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            self.batch, now, table, key_col, key_val,
+                            json.dumps(
+                                [{k: _encode_value(v) for k, v in r.items()} for r in rows],
+                                ensure_ascii=False, separators=(",", ":"),
+                            ),
+                        )
+                        for table, key_col, key_val, rows in self._entries
+                    ],
+                )
+                conn.execute(
+                    "DELETE FROM row_journal WHERE created_at < ?",
+                    (now - JOURNAL_KEEP_DAYS * 86400,),
+                )
+        except sqlite3.Error as e:
+            print(f"[{_now_str()}] 行镜像日志写入失败（批次 {self.batch}）: {e}")
+            return 0
+        finally:
+            conn.close()
+        n = len(self._entries)
+        self._entries, self._seen = [], {}
+        return n
+
+
+def prepare_backup(db_path: str) -> Tuple[str, Optional[ChangeJournal]]:
+    """
+    写前备份入口：按 BACKUP_MODE 做限频整库备份或开启行镜像日志。
+
+    :param db_path: 数据库路径
+    :return: (响应中的 backup 字段, 行镜像日志；非 journal 模式为 None)
+    """
+    if not BACKUP_ON_WRITE:
+        return "", None
+    if BACKUP_MODE == "journal":
+        journal = ChangeJournal(db_path)
+        return f"journal:{journal.batch}", journal
+    return ensure_backup(db_path), None
+
+
+def rollback_journal(db_path: str, batch: str) -> Dict[str, Any]:
+    """
+    按行镜像日志回滚：把指定批次及其之后所有批次改动过的行恢复为改动前的内容
+    （从新到旧逐条恢复），成功后删除这些日志记录。应在 helper 停止写入时执行。
+
+    :param db_path: 数据库路径
+    :param batch: 批次号（写入响应中 backup 字段 "journal:" 之后的部分）
+    :return: {success, batches, rows} 或 {success: False, error}
+    """
+    jconn = _open_journal(db_path)
+    try:
+        entries = jconn.execute(
+            "SELECT id, batch, tbl, key_col, key_val, rows FROM row_journal "
+            "WHERE batch >= ? ORDER BY id DESC",
+            (batch,),
+        ).fetchall()
+        if not entries:
+            return {"success": False, "error": f"日志中没有批次 {batch} 及之后的记录"}
+        conn = _open_conn(db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for _id, _batch, table, key_col, key_val, raw in entries:
+                if table not in _WRITE_TABLES:
+                    raise ValueError(f"日志中出现未知表 {table}")
+                rows = [{k: _decode_value(v) for k, v in r.items()} for r in json.loads(raw)]
+                conn.execute(f'DELETE FROM {table} WHERE "{key_col}"=?', (key_val,))
+                for r in rows:
+                    cols = tuple(r)
+                    conn.execute(
+                        _build_sql("insert", table, key_col, cols), [r[c] for c in cols]
+                    )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return {"success": False, "error": f"回滚失败: {e}"}
+        finally:
+            conn.close()
+        with jconn:
+            jconn.execute("DELETE FROM row_journal WHERE batch >= ?", (batch,))
+        return {
+            "success": True,
+            "batches": len({e[1] for e in entries}),
+            "rows": len(entries),
+        }
+    finally:
+        jconn.close()
+
+
 def plex_is_busy() -> Tuple[bool, str]:
     """
     检测 Plex 是否繁忙（有播放会话或正在扫描）。无法查询时视为不繁忙。
@@ -143,7 +492,7 @@ def plex_is_busy() -> Tuple[bool, str]:
         url = f"{PLEX_LOCAL_URL}{path}{sep}X-Plex-Token={PLEX_TOKEN}"
         try:
             req = urllib.request.Request(url, headers={"Accept": "application/json"})
-            with urllib.request.urlopen(req, timeout=6) as r:
+            with urllib.request.urlopen(req, timeout=BUSY_PROBE_TIMEOUT_SECONDS) as r:
                 return r.read().decode("utf-8", errors="replace")
         except Exception:
             return None
@@ -169,6 +518,127 @@ def plex_is_busy() -> Tuple[bool, str]:
     return False, "空闲"
 
 
+class BusyMonitor:
+    """
+    后台线程定时调用 plex_is_busy，缓存最近一次结果。
+
+    /busy 与写入前的繁忙检测直接读缓存快照。一个轮询周期是「间隔 + 检测耗时」，
+    Plex 慢或不可达时检测本身最多耗时两次请求超时，因此快照有效期按
+    2 个间隔 + 2 次请求超时计算；超过（轮询线程卡住）或尚无快照时才退回实时检测。
+    实时检测与轮询共用一把锁，同一时刻只有一次检测在跑，并发调用方等它的结果。
+    """
+
+    def __init__(self, interval: float) -> None:
+        """
+        :param interval: 轮询间隔秒数
+        """
+        self._interval = max(0.05, interval)
+        self._max_age = self._interval * 2 + BUSY_PROBE_TIMEOUT_SECONDS * 2
+        self._lock = threading.Lock()
+        # 保证同一时刻只有一次 plex_is_busy 在跑
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        # (是否繁忙, 说明, monotonic 时间, 墙钟时间)
+        self._snapshot: Optional[Tuple[bool, str, float, float]] = None
+        self.polls = 0
+        self.live_checks = 0
+        self._thread = threading.Thread(target=self._run, name="pth-busy", daemon=True)
+
+    def start(self) -> None:
+        """启动轮询线程。"""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止轮询线程。"""
+        self._stop.set()
+
+    def _run(self) -> None:
+        """轮询主循环：立即检测一次，此后每 interval 秒检测一次。"""
+        while not self._stop.is_set():
+            self._refresh()
+            with self._lock:
+                self.polls += 1
+            self._stop.wait(self._interval)
+
+    def _refresh(self) -> Tuple[bool, str]:
+        """实时检测一次并更新快照。"""
+        with self._refresh_lock:
+            busy, reason = plex_is_busy()
+            with self._lock:
+                self._snapshot = (busy, reason, time.monotonic(), time.time())
+        return busy, reason
+
+    def cached(self) -> Optional[Tuple[bool, str, float, float]]:
+        """
+        返回未过期的快照。
+
+        :return: (是否繁忙, 说明, 快照年龄秒数, 检测时刻时间戳)；无快照或已过期返回 None
+        """
+        with self._lock:
+            snap = self._snapshot
+        if snap is None:
+            return None
+        age = time.monotonic() - snap[2]
+        if age > self._max_age:
+            return None
+        return snap[0], snap[1], age, snap[3]
+
+    def check(self) -> Tuple[bool, str, float, float]:
+        """
+        取繁忙状态：优先用快照，不可用时实时检测。
+
+        已有检测在跑时等待其完成并复用结果，不再各自发起检测。
+
+        :return: (是否繁忙, 说明, 快照年龄秒数, 检测时刻时间戳)
+        """
+        snap = self.cached()
+        if snap is not None:
+            return snap
+        with self._refresh_lock:
+            snap = self.cached()
+            if snap is not None:
+                return snap
+            with self._lock:
+                self.live_checks += 1
+            busy, reason = plex_is_busy()
+            now = time.time()
+            with self._lock:
+                self._snapshot = (busy, reason, time.monotonic(), now)
+        return busy, reason, 0.0, now
+
+    def stats(self) -> Dict[str, Any]:
+        """返回轮询统计。"""
+        with self._lock:
+            return {
+                "interval": self._interval,
+                "polls": self.polls,
+                "live_checks": self.live_checks,
+            }
+
+
+# 进程内的繁忙状态监视器（main 中按 PTH_BUSY_POLL_SECONDS 启动）
+_BUSY_MONITOR: Optional[BusyMonitor] = None
+
+
+def busy_state(block: bool = True) -> Optional[Tuple[bool, str, float, float]]:
+    """
+    取 Plex 繁忙状态（有监视器时读缓存快照）。
+
+    :param block: 快照不可用时是否实时检测；为 False 时直接返回 None
+    :return: (是否繁忙, 说明, 快照年龄秒数, 检测时刻时间戳)
+    """
+    monitor = _BUSY_MONITOR
+    if monitor is not None:
+        snap = monitor.cached()
+        if snap is not None or not block:
+            return snap
+        return monitor.check()
+    if not block:
+        return None
+    busy, reason = plex_is_busy()
+    return busy, reason, 0.0, time.time()
+
+
 def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
     """
     通过 PRAGMA 自省表的列名。
@@ -181,7 +651,7 @@ def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
     return [row[1] for row in cur.fetchall()]
 
 
-def _filter_columns(data: Dict[str, Any], allowed: List[str]) -> Dict[str, Any]:
+def _filter_columns(data: Dict[str, Any], allowed: Collection[str]) -> Dict[str, Any]:
     """
     仅保留目标表中真实存在且非空的列。
 
@@ -192,202 +662,426 @@ def _filter_columns(data: Dict[str, Any], allowed: List[str]) -> Dict[str, Any]:
     return {k: v for k, v in data.items() if k in allowed and v is not None}
 
 
-def _upsert(
-    conn: sqlite3.Connection,
-    table: str,
-    key_cols: List[str],
-    row: Dict[str, Any],
-) -> str:
+def _load_schema(conn: sqlite3.Connection, db_path: str) -> Dict[str, FrozenSet[str]]:
     """
-    按主键列做存在则更新、不存在则插入。
+    取写入相关表的列名集合：同一数据库文件且表结构未变时复用缓存，只查一次 schema_version。
 
     :param conn: 数据库连接
-    :param table: 表名
-    :param key_cols: 定位记录的键列
-    :param row: 已过滤为真实列的键值
-    :return: 'update'、'insert' 或 'skip'
-    """
-    if not row:
-        return "skip"
-    keys = [c for c in key_cols if c in row]
-    where = " AND ".join(f'"{c}"=?' for c in keys)
-    where_vals = [row[c] for c in keys]
-    exists = False
-    if where:
-        cur = conn.execute(f"SELECT 1 FROM {table} WHERE {where} LIMIT 1", where_vals)
-        exists = cur.fetchone() is not None
-    if exists:
-        set_cols = [c for c in row.keys() if c not in key_cols]
-        if not set_cols:
-            return "skip"
-        set_clause = ", ".join(f'"{c}"=?' for c in set_cols)
-        conn.execute(
-            f"UPDATE {table} SET {set_clause} WHERE {where}",
-            [row[c] for c in set_cols] + where_vals,
-        )
-        return "update"
-    cols = list(row.keys())
-    quoted = ", ".join(f'"{c}"' for c in cols)
-    placeholders = ", ".join("?" for _ in cols)
-    conn.execute(
-        f"INSERT INTO {table} ({quoted}) VALUES ({placeholders})",
-        [row[c] for c in cols],
-    )
-    return "insert"
+    :param db_path: 数据库路径（缓存键）
+    :return: {表名: 列名集合}
+    """
+    version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    key = (db_path, version)
+    with _SCHEMA_LOCK:
+        schema = _SCHEMA_CACHE.get(key)
+    if schema is None:
+        schema = {t: frozenset(_table_columns(conn, t)) for t in _WRITE_TABLES}
+        with _SCHEMA_LOCK:
+            for stale in [k for k in _SCHEMA_CACHE if k[0] == db_path]:
+                del _SCHEMA_CACHE[stale]
+            _SCHEMA_CACHE[key] = schema
+    return schema
+
+
+def _normalize(value: Any) -> Any:
+    """统一数值表示（布尔与整数值的浮点按整数），用于新旧记录比较。"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _fingerprint(rows: List[Tuple[Any, ...]]) -> str:
+    """
+    计算一组流记录的稳定指纹（与行顺序无关）。
 
+    :param rows: 已按 _STREAM_COLUMNS 顺序归一化的记录元组
+    :return: sha1 摘要
+    """
+    canonical = sorted(json.dumps(r, ensure_ascii=False, default=str) for r in rows)
+    return sha1("\n".join(canonical).encode("utf-8")).hexdigest()
 
-def _open_conn(db_path: str) -> sqlite3.Connection:
+
+def _build_sql(kind: str, table: str, key: str, cols: Tuple[str, ...]) -> str:
     """
-    打开写库连接并设置 WAL/busy_timeout。
+    生成写入语句文本。
 
-    :param db_path: 数据库路径
-    :return: 数据库连接
+    :param kind: insert / upsert / update / exists / select
+    :param table: 表名
+    :param key: 定位记录的键列
+    :param cols: 参与写入的列（upsert/update 含键列）
+    :return: SQL 文本
     """
-    conn = sqlite3.connect(db_path, timeout=30.0)
-    conn.execute("PRAGMA busy_timeout=30000")
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    quoted = ", ".join(f'"{c}"' for c in cols)
+    placeholders = ", ".join("?" for _ in cols)
+    set_cols = [c for c in cols if c != key]
+    if kind == "insert":
+        return f"INSERT INTO {table} ({quoted}) VALUES ({placeholders})"
+    if kind == "upsert":
+        action = (
+            "DO UPDATE SET " + ", ".join(f'"{c}"=excluded."{c}"' for c in set_cols)
+            if set_cols else "DO NOTHING"
+        )
+        return (
+            f"INSERT INTO {table} ({quoted}) VALUES ({placeholders}) "
+            f'ON CONFLICT("{key}") {action}'
+        )
+    if kind == "update":
+        set_clause = ", ".join(f'"{c}"=?' for c in set_cols)
+        return f'UPDATE {table} SET {set_clause} WHERE "{key}"=?'
+    if kind == "exists":
+        return f'SELECT 1 FROM {table} WHERE "{key}"=? LIMIT 1'
+    if kind == "select":
+        return f'SELECT {quoted} FROM {table} WHERE "{key}"=?'
+    raise ValueError(f"未知语句类型: {kind}")
 
 
-def _write_one(conn: sqlite3.Connection, payload: Dict[str, Any]) -> Dict[str, Any]:
+class MediaInfoWriter:
     """
-    在已开启事务的连接上写入单条媒体信息（用 SAVEPOINT 隔离失败项）。
-
-    payload 关键字段：part_id（必填，media_parts.id）、media_item_id（可选）、
-    container/duration/size/bitrate/width/height/video_codec/audio_codec、
-    streams（逐条流列表，含 stream_type 1视频/2音频/3字幕）、overwrite_streams。
+    绑定单个连接的媒体信息写入器。
 
-    :param conn: 已建立的数据库连接（外层负责 BEGIN/COMMIT）
-    :param payload: 媒体信息载荷
-    :return: 写入结果统计
+    表结构在构造时取一次（跨连接按数据库文件缓存），SQL 文本按 (类型, 表, 列组合) 缓存，
+    同一文本在连接内命中 sqlite3 的预编译语句缓存；media_streams 按列组合 executemany。
     """
-    part_id = payload.get("part_id")
-    if not part_id:
-        return {"success": False, "error": "缺少 part_id"}
-    result: Dict[str, Any] = {
-        "success": False,
-        "part_id": part_id,
-        "media_items": "skip",
-        "media_parts": "skip",
-        "streams_deleted": 0,
-        "streams_written": 0,
-    }
-    conn.execute("SAVEPOINT item_write")
-    try:
-        media_item_id = payload.get("media_item_id")
-        if not media_item_id:
-            cur = conn.execute(
-                "SELECT media_item_id FROM media_parts WHERE id=?", (part_id,)
-            )
-            row = cur.fetchone()
-            if row:
-                media_item_id = row[0]
-        if not media_item_id:
-            conn.execute("ROLLBACK TO item_write")
-            result["error"] = f"无法定位 part_id={part_id} 的 media_item_id"
-            return result
 
-        mi_cols = _table_columns(conn, "media_items")
-        mi_row = _filter_columns(
-            {
-                "id": media_item_id,
-                "width": payload.get("width"),
-                "height": payload.get("height"),
-                "duration": payload.get("duration"),
-                "bitrate": payload.get("bitrate"),
-                "container": payload.get("container"),
-                "video_codec": payload.get("video_codec"),
-                "audio_codec": payload.get("audio_codec"),
-                "display_aspect_ratio": payload.get("display_aspect_ratio"),
-                "frames_per_second": payload.get("frame_rate"),
-                "audio_channels": payload.get("audio_channels"),
-                "media_analysis_version": 6,
-            },
-            mi_cols,
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        db_path: str = "",
+        journal: Optional[ChangeJournal] = None,
+    ) -> None:
+        """
+        :param conn: 已建立的数据库连接（外层负责 BEGIN/COMMIT）
+        :param db_path: 数据库路径，用作表结构缓存键
+        :param journal: 行镜像日志，非空时改动前记录原始行（外层负责提交后 flush）
+        """
+        self._conn = conn
+        self._journal = journal
+        self._schema = _load_schema(conn, db_path)
+        self._sql: Dict[Tuple[str, str, str, Tuple[str, ...]], str] = {}
+        self._stream_cols = tuple(
+            c for c in _STREAM_COLUMNS if c in self._schema["media_streams"]
         )
-        if mi_row:
-            result["media_items"] = _upsert(conn, "media_items", ["id"], mi_row)
-
-        mp_cols = _table_columns(conn, "media_parts")
-        mp_row = _filter_columns(
-            {
-                "id": part_id,
-                "duration": payload.get("duration"),
-                "size": payload.get("size"),
-                "container": payload.get("container"),
-            },
-            mp_cols,
+        self._match_pos = [
+            self._stream_cols.index(c) for c in _STREAM_MATCH_COLUMNS if c in self._stream_cols
+        ]
+
+    def _statement(self, kind: str, table: str, key: str, cols: Tuple[str, ...]) -> str:
+        """取（首次则生成）缓存的 SQL 文本。"""
+        cache_key = (kind, table, key, cols)
+        sql = self._sql.get(cache_key)
+        if sql is None:
+            sql = self._sql[cache_key] = _build_sql(kind, table, key, cols)
+        return sql
+
+    def upsert(self, table: str, row: Dict[str, Any], key: str = "id") -> str:
+        """
+        按键列存在则更新、不存在则插入。
+
+        :param table: 表名
+        :param row: 已过滤为真实列的键值（须含键列）
+        :param key: 键列
+        :return: 'upsert'（ON CONFLICT 一条语句完成）、'update'、'insert' 或 'skip'
+        """
+        if not row:
+            return "skip"
+        cols = tuple(row)
+        if key not in row:
+            self._conn.execute(
+                self._statement("insert", table, key, cols), [row[c] for c in cols]
+            )
+            return "insert"
+        if SQLITE_HAS_UPSERT:
+            self._conn.execute(
+                self._statement("upsert", table, key, cols), [row[c] for c in cols]
+            )
+            return "upsert"
+        exists = self._conn.execute(
+            self._statement("exists", table, key, (key,)), (row[key],)
+        ).fetchone()
+        if exists:
+            set_cols = tuple(c for c in cols if c != key)
+            if not set_cols:
+                return "skip"
+            self._conn.execute(
+                self._statement("update", table, key, cols),
+                [row[c] for c in set_cols] + [row[key]],
+            )
+            return "update"
+        self._conn.execute(
+            self._statement("insert", table, key, cols), [row[c] for c in cols]
         )
-        if mp_row:
-            result["media_parts"] = _upsert(conn, "media_parts", ["id"], mp_row)
-
-        streams = payload.get("streams") or []
-        if streams:
-            ms_cols = _table_columns(conn, "media_streams")
-            if payload.get("overwrite_streams"):
+        return "insert"
+
+    def upsert_changed(self, table: str, row: Dict[str, Any], key: str = "id") -> str:
+        """
+        与库中记录逐列比较，内容相同则不写，否则 upsert。
+
+        :param table: 表名
+        :param row: 已过滤为真实列的键值（须含键列）
+        :param key: 键列
+        :return: 'unchanged' 或 upsert 的返回值
+        """
+        if row and key in row:
+            cols = tuple(row)
+            current = self._conn.execute(
+                self._statement("select", table, key, cols), (row[key],)
+            ).fetchone()
+            if current is not None and all(
+                _normalize(v) == _normalize(row[c]) for c, v in zip(cols, current)
+            ):
+                return "unchanged"
+        if self._journal is not None and key in row:
+            self._journal.record(self._conn, table, key, row[key])
+        return self.upsert(table, row, key)
+
+    def sync_streams(
+        self, part_id: Any, rows: List[Dict[str, Any]], overwrite: bool
+    ) -> Dict[str, Any]:
+        """
+        按指纹同步某个 part 的流记录。
+
+        新旧指纹一致时不写；overwrite 时按 (类型, 序号) 对应新旧记录，只更新有变化的、
+        删除多余的、插入新增的（对应关系不唯一时整体删除重写）；不 overwrite 时追加。
+
+        :param part_id: media_parts.id
+        :param rows: 已过滤为真实列的新流记录
+        :param overwrite: 是否以新记录替换该 part 的旧流
+        :return: {streams_deleted, streams_written, streams_updated, streams_kept, streams_fingerprint}
+        """
+        cols = self._stream_cols
+        rows = [r for r in rows if r]
+        incoming = [tuple(_normalize(r.get(c)) for c in cols) for r in rows]
+        existing = self._conn.execute(
+            self._statement("select", "media_streams", "media_part_id", ("id",) + cols),
+            (part_id,),
+        ).fetchall()
+        current = [tuple(_normalize(v) for v in row[1:]) for row in existing]
+        stats = {
+            "streams_deleted": 0,
+            "streams_written": 0,
+            "streams_updated": 0,
+            "streams_kept": 0,
+            "streams_fingerprint": _fingerprint(incoming),
+        }
+        if stats["streams_fingerprint"] == _fingerprint(current):
+            stats["streams_kept"] = len(current)
+            return stats
+        if self._journal is not None:
+            self._journal.record(self._conn, "media_streams", "media_part_id", part_id)
+        if not overwrite:
+            stats["streams_written"] = self.insert_streams(rows)
+            return stats
+
+        def match_key(values: Tuple[Any, ...]) -> Tuple[Any, ...]:
+            return tuple(values[i] for i in self._match_pos)
+
+        old = {match_key(t): (row[0], t) for row, t in zip(existing, current)}
+        new_keys = [match_key(t) for t in incoming]
+        if not self._match_pos or len(old) != len(existing) or len(set(new_keys)) != len(new_keys):
+            cur = self._conn.execute(
+                "DELETE FROM media_streams WHERE media_part_id=?", (part_id,)
+            )
+            stats["streams_deleted"] = cur.rowcount or 0
+            stats["streams_written"] = self.insert_streams(rows)
+            return stats
+        inserts: List[Dict[str, Any]] = []
+        update_sql = self._statement("update", "media_streams", "id", ("id",) + cols)
+        for r, values, k in zip(rows, incoming, new_keys):
+            hit = old.pop(k, None)
+            if hit is None:
+                inserts.append(r)
+            elif hit[1] == values:
+                stats["streams_kept"] += 1
+            else:
+                # 管理列整体覆盖（未提供的列置空，与删除重写一致）
+                self._conn.execute(update_sql, [r.get(c) for c in cols] + [hit[0]])
+                stats["streams_updated"] += 1
+        if old:
+            self._conn.executemany(
+                "DELETE FROM media_streams WHERE id=?", [(sid,) for sid, _t in old.values()]
+            )
+            stats["streams_deleted"] = len(old)
+        stats["streams_written"] = self.insert_streams(inserts)
+        return stats
+
+    def insert_streams(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        批量插入流记录：相邻且列组合相同的行合并为一次 executemany，保持原有顺序。
+
+        :param rows: 已过滤为真实列的流记录
+        :return: 插入条数
+        """
+        written = 0
+        for cols, group in groupby((r for r in rows if r), key=lambda r: tuple(r)):
+            values = [[r[c] for c in cols] for r in group]
+            self._conn.executemany(
+                self._statement("insert", "media_streams", "id", cols), values
+            )
+            written += len(values)
+        return written
+
+    def write(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        写入单条媒体信息（用 SAVEPOINT 隔离失败项）。
+
+        payload 关键字段：part_id（必填，media_parts.id）、media_item_id（可选）、
+        container/duration/size/bitrate/width/height/video_codec/audio_codec、
+        streams（逐条流列表，含 stream_type 1视频/2音频/3字幕）、overwrite_streams。
+
+        :param payload: 媒体信息载荷
+        :return: 写入结果统计
+        """
+        conn = self._conn
+        part_id = payload.get("part_id")
+        if not part_id:
+            return {"success": False, "error": "缺少 part_id"}
+        result: Dict[str, Any] = {
+            "success": False,
+            "part_id": part_id,
+            "media_items": "skip",
+            "media_parts": "skip",
+            "streams_deleted": 0,
+            "streams_written": 0,
+            "streams_updated": 0,
+            "unchanged": False,
+        }
+        mark = self._journal.mark() if self._journal is not None else 0
+        conn.execute("SAVEPOINT item_write")
+        try:
+            media_item_id = payload.get("media_item_id")
+            if not media_item_id:
                 cur = conn.execute(
-                    "DELETE FROM media_streams WHERE media_part_id=?", (part_id,)
+                    "SELECT media_item_id FROM media_parts WHERE id=?", (part_id,)
                 )
-                result["streams_deleted"] = cur.rowcount or 0
-            written = 0
-            for st in streams:
+                row = cur.fetchone()
+                if row:
+                    media_item_id = row[0]
+            if not media_item_id:
+                conn.execute("ROLLBACK TO item_write")
+                if self._journal is not None:
+                    self._journal.discard(mark)
+                result["error"] = f"无法定位 part_id={part_id} 的 media_item_id"
+                return result
+
+            mi_row = _filter_columns(
+                {
+                    "id": media_item_id,
+                    "width": payload.get("width"),
+                    "height": payload.get("height"),
+                    "duration": payload.get("duration"),
+                    "bitrate": payload.get("bitrate"),
+                    "container": payload.get("container"),
+                    "video_codec": payload.get("video_codec"),
+                    "audio_codec": payload.get("audio_codec"),
+                    "display_aspect_ratio": payload.get("display_aspect_ratio"),
+                    "frames_per_second": payload.get("frame_rate"),
+                    "audio_channels": payload.get("audio_channels"),
+                    "media_analysis_version": 6,
+                },
+                self._schema["media_items"],
+            )
+            if mi_row:
+                result["media_items"] = self.upsert_changed("media_items", mi_row)
+
+            mp_row = _filter_columns(
+                {
+                    "id": part_id,
+                    "duration": payload.get("duration"),
+                    "size": payload.get("size"),
+                    "container": payload.get("container"),
+                },
+                self._schema["media_parts"],
+            )
+            if mp_row:
+                result["media_parts"] = self.upsert_changed("media_parts", mp_row)
+
+            streams = payload.get("streams") or []
+            if streams:
+                ms_cols = self._schema["media_streams"]
                 # 兼容不同 Plex 版本的流类型列名（stream_type_id / stream_type）
-                stype = st.get("stream_type")
-                st_row = _filter_columns(
-                    {
-                        "media_item_id": media_item_id,
-                        "media_part_id": part_id,
-                        "stream_type_id": stype,
-                        "stream_type": stype,
-                        "codec": st.get("codec"),
-                        "index": st.get("index"),
-                        "width": st.get("width"),
-                        "height": st.get("height"),
-                        "bitrate": st.get("bitrate"),
-                        "channels": st.get("channels"),
-                        "language": st.get("language"),
-                        "frame_rate": st.get("frame_rate"),
-                        "bit_depth": st.get("bit_depth"),
-                        "sampling_rate": st.get("sampling_rate"),
-                    },
-                    ms_cols,
-                )
-                if st_row:
-                    quoted = ", ".join(f'"{c}"' for c in st_row.keys())
-                    conn.execute(
-                        f"INSERT INTO media_streams ({quoted}) "
-                        f"VALUES ({', '.join('?' for _ in st_row)})",
-                        list(st_row.values()),
+                rows = [
+                    _filter_columns(
+                        {
+                            "media_item_id": media_item_id,
+                            "media_part_id": part_id,
+                            "stream_type_id": st.get("stream_type"),
+                            "stream_type": st.get("stream_type"),
+                            "codec": st.get("codec"),
+                            "index": st.get("index"),
+                            "width": st.get("width"),
+                            "height": st.get("height"),
+                            "bitrate": st.get("bitrate"),
+                            "channels": st.get("channels"),
+                            "language": st.get("language"),
+                            "frame_rate": st.get("frame_rate"),
+                            "bit_depth": st.get("bit_depth"),
+                            "sampling_rate": st.get("sampling_rate"),
+                        },
+                        ms_cols,
                     )
-                    written += 1
-            result["streams_written"] = written
+                    for st in streams
+                ]
+                result.update(
+                    self.sync_streams(part_id, rows, bool(payload.get("overwrite_streams")))
+                )
 
-        conn.execute("RELEASE item_write")
-        result["success"] = True
-        return result
-    except Exception as e:
-        try:
-            conn.execute("ROLLBACK TO item_write")
-        except sqlite3.Error:
-            pass
-        result["error"] = f"写入异常: {e}"
-        return result
+            result["unchanged"] = (
+                result["media_items"] in ("unchanged", "skip")
+                and result["media_parts"] in ("unchanged", "skip")
+                and not (
+                    result["streams_deleted"]
+                    or result["streams_written"]
+                    or result["streams_updated"]
+                )
+            )
+            conn.execute("RELEASE item_write")
+            result["success"] = True
+            return result
+        except Exception as e:
+            try:
+                conn.execute("ROLLBACK TO item_write")
+            except sqlite3.Error:
+                pass
+            if self._journal is not None:
+                self._journal.discard(mark)
+            result["error"] = f"写入异常: {e}"
+            return result
 
 
-def write_media_info(db_path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+def _open_conn(db_path: str) -> sqlite3.Connection:
+    """
+    打开写库连接并设置 WAL/busy_timeout。
+
+    :param db_path: 数据库路径
+    :return: 数据库连接
+    """
+    conn = sqlite3.connect(db_path, timeout=30.0, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def write_media_info(
+    db_path: str, payload: Dict[str, Any], journal: Optional[ChangeJournal] = None
+) -> Dict[str, Any]:
     """
     单条写入入口：建连接、开事务、写入并提交。
 
     :param db_path: 数据库路径
     :param payload: 媒体信息载荷
+    :param journal: 行镜像日志（journal 备份模式），提交后落盘
     :return: 写入结果统计
     """
     conn = _open_conn(db_path)
     try:
         conn.execute("BEGIN IMMEDIATE")
-        result = _write_one(conn, payload)
+        result = MediaInfoWriter(conn, db_path, journal).write(payload)
         if result.get("success"):
             conn.commit()
+            if journal is not None:
+                journal.flush()
         else:
             conn.rollback()
         return result
@@ -399,13 +1093,14 @@ def write_media_info(db_path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def write_media_info_batch(
-    db_path: str, items: List[Dict[str, Any]]
+    db_path: str, items: List[Dict[str, Any]], journal: Optional[ChangeJournal] = None
 ) -> Tuple[int, List[Dict[str, Any]]]:
     """
     批量写入：整批共用一个连接一个事务，单条失败用 SAVEPOINT 回滚不影响其余。
 
     :param db_path: 数据库路径
     :param items: 媒体信息载荷列表
+    :param journal: 行镜像日志（journal 备份模式），提交后落盘
     :return: (成功条数, 每条结果列表)
     """
     results: List[Dict[str, Any]] = []
@@ -413,12 +1108,15 @@ def write_media_info_batch(
     conn = _open_conn(db_path)
     try:
         conn.execute("BEGIN IMMEDIATE")
+        writer = MediaInfoWriter(conn, db_path, journal)
         for it in items:
-            r = _write_one(conn, it)
+            r = writer.write(it)
             if r.get("success"):
                 ok += 1
             results.append(r)
         conn.commit()
+        if journal is not None:
+            journal.flush()
     except Exception as e:
         conn.rollback()
         # 整批事务级失败：未产生结果的项标记失败
@@ -436,6 +1134,379 @@ def write_media_info_batch(
     return ok, results
 
 
+def _token_valid(value: str) -> bool:
+    """校验访问 token。未配置 token 时不校验。"""
+    return not ACCESS_TOKEN or value == ACCESS_TOKEN
+
+
+def _dbinfo_response() -> Dict[str, Any]:
+    """构建 /dbinfo 响应体。"""
+    db = discover_db_path()
+    return {
+        "success": bool(db),
+        "db_path": db,
+        "candidates": list_db_candidates(),
+        "backup_keep": BACKUP_KEEP,
+        "backup_on_write": BACKUP_ON_WRITE,
+        "backup_mode": BACKUP_MODE,
+    }
+
+
+def _busy_response(state: Optional[Tuple[bool, str, float, float]] = None) -> Dict[str, Any]:
+    """
+    构建 /busy 响应体（附快照年龄与检测时刻）。
+
+    :param state: busy_state 的返回值，缺省时现取
+    """
+    busy, reason, age, checked_at = state or busy_state()
+    return {
+        "success": True,
+        "busy": busy,
+        "reason": reason,
+        "age_seconds": round(age, 3),
+        "checked_at": round(checked_at, 3),
+        "cached": _BUSY_MONITOR is not None,
+    }
+
+
+def _write_response(
+    path: str, results: List[Dict[str, Any]], backup: str
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    由写入结果构建 /write、/write_batch 响应。
+
+    :param path: 请求路径
+    :param results: 每条写入结果
+    :param backup: 本次备份文件路径（journal 模式为 "journal:<批次号>"，未备份为空串）
+    :return: (HTTP 状态码, 响应体)
+    """
+    if path == "/write":
+        res = dict(results[0])
+        res["backup"] = backup
+        return (200 if res.get("success") else 500), res
+    return 200, {
+        "success": True,
+        "total": len(results),
+        "ok": sum(1 for r in results if r.get("success")),
+        "backup": backup,
+        "results": results,
+    }
+
+
+class _WriteJob:
+    """一次写请求：条目列表 + 供请求方等待结果的 Future。"""
+
+    __slots__ = ("db_path", "items", "future")
+
+    def __init__(self, db_path: str, items: List[Dict[str, Any]]) -> None:
+        self.db_path = db_path
+        self.items = items
+        self.future: Future = Future()
+
+
+class CoalescingWriter:
+    """
+    单写线程：持有一个长期 SQLite 连接，把排队的写请求合并进同一个事务。
+
+    上一个事务提交期间到达的请求在下一个事务中一次写完（单个事务最多 max_items 条），
+    每条仍由 SAVEPOINT 隔离；数据库文件被替换（inode 变化）或事务异常时重建连接。
+    """
+
+    def __init__(self, max_items: int = COALESCE_MAX_ITEMS) -> None:
+        """
+        :param max_items: 单个合并事务最多写入的条数
+        """
+        self._max_items = max(1, max_items)
+        self._queue: "queue.Queue[Optional[_WriteJob]]" = queue.Queue()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_key: Optional[Tuple[str, int, int]] = None
+        self._lock = threading.Lock()
+        self.transactions = 0
+        self.requests = 0
+        self.items = 0
+        self.max_coalesced = 0
+        self.connects = 0
+        self._thread = threading.Thread(target=self._run, name="pth-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, db_path: str, items: List[Dict[str, Any]]) -> Future:
+        """
+        提交一次写请求。
+
+        :param db_path: 数据库路径
+        :param items: 媒体信息载荷列表
+        :return: Future，结果为 (每条写入结果, 备份路径)
+        """
+        job = _WriteJob(db_path, items)
+        self._queue.put(job)
+        return job.future
+
+    def close(self) -> None:
+        """停止写线程（已排队的请求处理完后退出）并关闭连接。"""
+        self._queue.put(None)
+        self._thread.join(timeout=30)
+
+    def _run(self) -> None:
+        """写线程主循环：取一个请求，再捎带队列中已到达的同库请求合并提交。"""
+        carry: List[_WriteJob] = []
+        while True:
+            job = carry.pop(0) if carry else self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            count = len(job.items)
+            stopping = False
+            while count < self._max_items:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stopping = True
+                    break
+                if nxt.db_path != job.db_path:
+                    carry.append(nxt)
+                    continue
+                batch.append(nxt)
+                count += len(nxt.items)
+            self._commit(batch)
+            if stopping:
+                for left in carry:
+                    self._commit([left])
+                break
+        self._close_conn()
+
+    def _connection(self, db_path: str) -> sqlite3.Connection:
+        """取长期连接；库路径或文件 inode 变化时重建。"""
+        try:
+            st = os.stat(db_path)
+            key = (db_path, st.st_dev, st.st_ino)
+        except OSError:
+            key = (db_path, 0, 0)
+        if self._conn is None or self._conn_key != key:
+            self._close_conn()
+            self._conn = _open_conn(db_path)
+            self._conn_key = key
+            self.connects += 1
+        return self._conn
+
+    def _close_conn(self) -> None:
+        """关闭长期连接。"""
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = None
+        self._conn_key = None
+
+    def _commit(self, batch: List[_WriteJob]) -> None:
+        """把一组请求的全部条目写入同一个事务，并按请求拆分结果。"""
+        db_path = batch[0].db_path
+        items = [it for job in batch for it in job.items]
+        results: List[Dict[str, Any]] = []
+        backup = ""
+        try:
+            conn = self._connection(db_path)
+            backup, journal = prepare_backup(db_path)
+            conn.execute("BEGIN IMMEDIATE")
+            writer = MediaInfoWriter(conn, db_path, journal)
+            for it in items:
+                results.append(writer.write(it))
+            conn.commit()
+            if journal is not None:
+                journal.flush()
+        except Exception as e:
+            if self._conn is not None:
+                try:
+                    self._conn.rollback()
+                except sqlite3.Error:
+                    pass
+            # 连接状态未知，下次重建；整个事务已回滚，全部条目记为失败
+            self._close_conn()
+            results = [
+                {"success": False, "part_id": it.get("part_id"), "error": f"批量事务异常: {e}"}
+                for it in items
+            ]
+        with self._lock:
+            self.transactions += 1
+            self.requests += len(batch)
+            self.items += len(items)
+            self.max_coalesced = max(self.max_coalesced, len(batch))
+        pos = 0
+        for job in batch:
+            n = len(job.items)
+            job.future.set_result((results[pos:pos + n], backup))
+            pos += n
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回写线程统计。
+
+        :return: {transactions, requests, items, max_coalesced, connects, queued}
+        """
+        with self._lock:
+            return {
+                "transactions": self.transactions,
+                "requests": self.requests,
+                "items": self.items,
+                "max_coalesced": self.max_coalesced,
+                "connects": self.connects,
+                "queued": self._queue.qsize(),
+            }
+
+
+_STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    501: "Not Implemented",
+}
+
+
+class AsyncHelperServer:
+    """
+    asyncio 实现的最小 HTTP/1.1 服务：长连接复用，写请求交给单写线程合并提交。
+
+    只实现 helper 用到的部分（Content-Length 请求体、JSON 响应）；繁忙检测、数据库探测
+    等阻塞调用放到默认线程池，事件循环只做连接与协议处理。
+    """
+
+    server_version = "PlexMediaInfoHelper/1.1"
+
+    def __init__(self, writer: CoalescingWriter) -> None:
+        """
+        :param writer: 单写线程
+        """
+        self._writer = writer
+
+    async def serve(self, host: str, port: int) -> None:
+        """监听并持续服务。"""
+        server = await asyncio.start_server(self._client, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def _client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """处理一个连接上的连续请求，直到对端关闭、要求关闭或空闲超时。"""
+        peer = writer.get_extra_info("peername")
+        addr = peer[0] if peer else "?"
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    break
+                parts = line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self._send(writer, 400, {"success": False, "error": "请求行非法"}, False)
+                    break
+                method, path, version = parts
+                headers: Dict[str, str] = {}
+                while True:
+                    hline = await reader.readline()
+                    if hline in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = hline.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, 413, {"success": False, "error": "请求体过大"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                conn_header = headers.get("connection", "").lower()
+                if version == "HTTP/1.1":
+                    keep_alive = conn_header != "close"
+                else:
+                    keep_alive = conn_header == "keep-alive"
+                code, obj = await self._dispatch(method, path, headers, body)
+                await self._send(writer, code, obj, keep_alive)
+                print(f'[{_now_str()}] {addr} "{method} {path} {version}" {code}')
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _send(
+        self, writer: asyncio.StreamWriter, code: int, obj: Dict[str, Any], keep_alive: bool
+    ) -> None:
+        """发送 JSON 响应。"""
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {code} {_STATUS_TEXT.get(code, 'OK')}\r\n"
+            f"Server: {self.server_version}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _dispatch(
+        self, method: str, path: str, headers: Dict[str, str], body: bytes
+    ) -> Tuple[int, Dict[str, Any]]:
+        """
+        路由请求。
+
+        :return: (HTTP 状态码, 响应体)
+        """
+        loop = asyncio.get_running_loop()
+        if method == "GET" and path == "/health":
+            return 200, {"ok": True, "service": "plex-mediainfo-helper"}
+        if method not in ("GET", "POST"):
+            return 501, {"success": False, "error": f"不支持的方法 {method}"}
+        if not _token_valid(headers.get("x-pth-token", "")):
+            return 401, {"success": False, "error": "token 校验失败"}
+        if method == "GET":
+            if path == "/dbinfo":
+                info = await loop.run_in_executor(None, _dbinfo_response)
+                info["writer"] = self._writer.stats()
+                if _BUSY_MONITOR is not None:
+                    info["busy_monitor"] = _BUSY_MONITOR.stats()
+                return 200, info
+            if path == "/busy":
+                state = busy_state(block=False)
+                if state is None:
+                    state = await loop.run_in_executor(None, busy_state)
+                return 200, _busy_response(state)
+            return 404, {"success": False, "error": "未知路径"}
+
+        try:
+            payload = json.loads(body.decode("utf-8")) if body else {}
+        except ValueError:
+            return 400, {"success": False, "error": "请求体非合法 JSON"}
+        if path not in ("/write", "/write_batch"):
+            return 404, {"success": False, "error": "未知路径"}
+        db = await loop.run_in_executor(None, discover_db_path)
+        if not db:
+            return 500, {"success": False, "error": "未找到 Plex 数据库，请设置 PTH_DB_PATH"}
+        if not payload.get("force"):
+            state = busy_state(block=False)
+            if state is None:
+                state = await loop.run_in_executor(None, busy_state)
+            busy, reason = state[0], state[1]
+            if busy:
+                return 409, {"success": False, "error": f"Plex 繁忙：{reason}", "busy": True}
+        items = [payload] if path == "/write" else (payload.get("items") or [])
+        if not items:
+            return _write_response(path, [], "")
+        results, backup = await asyncio.wrap_future(self._writer.submit(db, items))
+        return _write_response(path, results, backup)
+
+
 class Handler(BaseHTTPRequestHandler):
     """HTTP 请求处理器：提供健康检查、DB 探测、繁忙检测、写入接口。"""
 
@@ -452,9 +1523,7 @@ class Handler(BaseHTTPRequestHandler):
 
     def _check_token(self) -> bool:
         """校验访问 token。未配置 token 时不校验。"""
-        if not ACCESS_TOKEN:
-            return True
-        return self.headers.get("X-PTH-Token", "") == ACCESS_TOKEN
+        return _token_valid(self.headers.get("X-PTH-Token", ""))
 
     def log_message(self, fmt: str, *args: Any) -> None:
         """精简访问日志输出。"""
@@ -469,20 +1538,10 @@ class Handler(BaseHTTPRequestHandler):
             self._send(401, {"success": False, "error": "token 校验失败"})
             return
         if self.path == "/dbinfo":
-            db = discover_db_path()
-            self._send(
-                200,
-                {
-                    "success": bool(db),
-                    "db_path": db,
-                    "candidates": list_db_candidates(),
-                    "backup_keep": BACKUP_KEEP,
-                },
-            )
+            self._send(200, _dbinfo_response())
             return
         if self.path == "/busy":
-            busy, reason = plex_is_busy()
-            self._send(200, {"success": True, "busy": busy, "reason": reason})
+            self._send(200, _busy_response())
             return
         self._send(404, {"success": False, "error": "未知路径"})
 
@@ -509,7 +1568,7 @@ class Handler(BaseHTTPRequestHandler):
 
         force = bool(payload.get("force"))
         if not force:
-            busy, reason = plex_is_busy()
+            busy, reason, _age, _at = busy_state()
             if busy:
                 self._send(
                     409, {"success": False, "error": f"Plex 繁忙：{reason}", "busy": True}
@@ -517,15 +1576,15 @@ class Handler(BaseHTTPRequestHandler):
                 return
 
         with _WRITE_LOCK:
-            backup = backup_db(db) if BACKUP_ON_WRITE else ""
+            backup, journal = prepare_backup(db)
             if self.path == "/write":
-                res = write_media_info(db, payload)
+                res = write_media_info(db, payload, journal)
                 res["backup"] = backup
                 self._send(200 if res.get("success") else 500, res)
                 return
             if self.path == "/write_batch":
                 items = payload.get("items") or []
-                ok, results = write_media_info_batch(db, items)
+                ok, results = write_media_info_batch(db, items, journal)
                 self._send(
                     200,
                     {
@@ -555,11 +1614,37 @@ def main() -> None:
             print(f"  - {c}")
         print("请通过环境变量 PTH_DB_PATH 指定数据库路径。")
     print(f"备份保留: {BACKUP_KEEP} 份")
-    print(f"写前备份: {'开' if BACKUP_ON_WRITE else '关（PTH_BACKUP_ON_WRITE=1 可开启）'}")
+    if not BACKUP_ON_WRITE:
+        print("写前备份: 关（PTH_BACKUP_ON_WRITE=1 可开启）")
+    elif BACKUP_MODE == "journal":
+        print(f"写前备份: 行镜像日志（保留 {JOURNAL_KEEP_DAYS:g} 天）")
+    else:
+        print(f"写前备份: 整库在线备份，至多每 {BACKUP_MIN_INTERVAL:g} 秒一次")
     print(f"繁忙拒写: {'开' if REFUSE_WHEN_PLAYING else '关'}")
+    print(f"服务模式: {SERVER_MODE}")
+    global _BUSY_MONITOR
+    if BUSY_POLL_SECONDS > 0 and PLEX_TOKEN:
+        _BUSY_MONITOR = BusyMonitor(BUSY_POLL_SECONDS)
+        _BUSY_MONITOR.start()
+        print(f"繁忙检测: 后台每 {BUSY_POLL_SECONDS:g} 秒轮询，请求读取缓存")
+    else:
+        print("繁忙检测: 每次请求实时检测")
     print("=" * 60)
-    ThreadingHTTPServer((LISTEN_HOST, LISTEN_PORT), Handler).serve_forever()
+    if SERVER_MODE == "threaded":
+        ThreadingHTTPServer((LISTEN_HOST, LISTEN_PORT), Handler).serve_forever()
+        return
+    writer = CoalescingWriter()
+    try:
+        asyncio.run(AsyncHelperServer(writer).serve(LISTEN_HOST, LISTEN_PORT))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 3 and sys.argv[1] == "rollback":
+        # 按行镜像日志回滚：python3 plex_mediainfo_helper.py rollback <批次号>
+        print(json.dumps(rollback_journal(discover_db_path(), sys.argv[2]), ensure_ascii=False))
+    else:
+        main()
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
-"""helper 写库逻辑本地自测：用模拟 Plex 表结构验证 upsert/列自省/备份。"""
+"""helper 写库逻辑本地自测：用模拟 Plex 表结构验证 upsert/列自省缓存/流指纹差量/批量写入/在线备份与行镜像回滚/长连接服务/繁忙快照。"""
 
+import asyncio
+import http.client
+import json
 import os
+import socket
 import sqlite3
 import sys
 import tempfile
+import threading
+import time
 
 sys.path.insert(0, os.path.dirname(__file__))
 import plex_mediainfo_helper as h
@@ -37,10 +43,223 @@ def build_fake_db(path: str) -> None:
             VALUES (200, 100, '/strm/test.strm');
         """
     )
+    for i in range(1, 41):
+        conn.execute("INSERT INTO media_items (id) VALUES (?)", (1000 + i,))
+        conn.execute(
+            "INSERT INTO media_parts (id, media_item_id, file) VALUES (?, ?, ?)",
+            (2000 + i, 1000 + i, f"/strm/{i}.strm"),
+        )
     conn.commit()
     conn.close()
 
 
+def check_async_server(db: str, payload: dict) -> None:
+    """async 模式：多客户端长连接并发写入，单写线程合并事务。"""
+    h.DB_PATH = db
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    writer = h.CoalescingWriter()
+    server = h.AsyncHelperServer(writer)
+    threading.Thread(
+        target=lambda: asyncio.run(server.serve("127.0.0.1", port)), daemon=True
+    ).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            threading.Event().wait(0.05)
+
+    errors = []
+
+    def client(n: int) -> None:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        sockets = set()
+        for k in range(4):
+            part_id = 2000 + n * 4 + k + 1
+            body = json.dumps({"items": [dict(payload, part_id=part_id)]})
+            conn.request("POST", "/write_batch", body, {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            data = json.loads(resp.read())
+            sockets.add(id(conn.sock))
+            if resp.status != 200 or data["ok"] != 1:
+                errors.append(data)
+        if len(sockets) != 1:
+            errors.append("长连接未复用")
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = writer.stats()
+    print("async 服务:", stats)
+    assert not errors, errors
+    assert stats["items"] == 40 and stats["connects"] == 1, stats
+    assert stats["transactions"] <= stats["requests"], stats
+    conn = sqlite3.connect(db)
+    n = conn.execute(
+        "SELECT COUNT(DISTINCT media_part_id) FROM media_streams WHERE media_part_id > 2000"
+    ).fetchone()[0]
+    conn.close()
+    assert n == 40, n
+
+
+def _snapshot(db: str) -> list:
+    """读出三张写入表的全部内容，用于比较回滚前后。"""
+    conn = sqlite3.connect(db)
+    try:
+        return [
+            conn.execute(f"SELECT * FROM {t} ORDER BY id").fetchall()
+            for t in ("media_items", "media_parts", "media_streams")
+        ]
+    finally:
+        conn.close()
+
+
+def check_backup_under_writes(tmp: str) -> None:
+    """源库被持续写入时分页备份会不断重来，应在有限时间内退回一次性复制完成。"""
+    db = os.path.join(tmp, "busy", "com.plexapp.plugins.library.db")
+    os.makedirs(os.path.dirname(db))
+    conn = sqlite3.connect(db)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE filler (id INTEGER PRIMARY KEY, data BLOB)")
+    conn.executemany("INSERT INTO filler (data) VALUES (?)", [(os.urandom(2000),)] * 5000)
+    conn.commit()
+    conn.close()
+
+    stop = threading.Event()
+
+    def writer() -> None:
+        c = sqlite3.connect(db, timeout=30)
+        while not stop.is_set():
+            c.execute("INSERT INTO filler (data) VALUES (?)", (b"x",))
+            c.commit()
+            stop.wait(0.02)
+        c.close()
+
+    saved = (h.BACKUP_PAGES_PER_STEP, h.BACKUP_STEP_SLEEP, h.BACKUP_MAX_SECONDS)
+    h.BACKUP_PAGES_PER_STEP, h.BACKUP_STEP_SLEEP, h.BACKUP_MAX_SECONDS = 8, 0.01, 30
+    t = threading.Thread(target=writer)
+    t.start()
+    try:
+        started = time.monotonic()
+        bak = h.backup_db(db)
+        elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        t.join()
+        h.BACKUP_PAGES_PER_STEP, h.BACKUP_STEP_SLEEP, h.BACKUP_MAX_SECONDS = saved
+    print(f"持续写入下备份: {elapsed:.2f}s")
+    assert elapsed < 10, elapsed
+    conn = sqlite3.connect(bak)
+    assert conn.execute("SELECT COUNT(*) FROM filler").fetchone()[0] >= 5000
+    conn.close()
+
+
+def check_backup(tmp: str, payload: dict) -> None:
+    """整库备份限频去重；journal 模式只记改动行，可按批次回滚到写入前。"""
+    db = os.path.join(tmp, "backup", "com.plexapp.plugins.library.db")
+    os.makedirs(os.path.dirname(db))
+    build_fake_db(db)
+    h.write_media_info(db, payload)
+
+    # 窗口内与库未变化时复用同一份备份
+    h.BACKUP_MIN_INTERVAL = 0
+    first = h.ensure_backup(db)
+    assert h.ensure_backup(db) == first
+    h.BACKUP_MIN_INTERVAL = 3600
+    h.write_media_info(db, dict(payload, width=1280))
+    assert h.ensure_backup(db) == first
+    conn = sqlite3.connect(first)
+    assert conn.execute("SELECT COUNT(*) FROM media_streams").fetchone()[0] == 3
+    conn.close()
+    print("整库备份:", first)
+
+    check_backup_under_writes(tmp)
+
+    h.BACKUP_ON_WRITE, h.BACKUP_MODE = True, "journal"
+    try:
+        before = _snapshot(db)
+        backup, journal = h.prepare_backup(db)
+        assert backup.startswith("journal:"), backup
+        items = [
+            dict(payload, width=720, streams=payload["streams"][:1]),
+            dict(payload, part_id=999),
+            dict(payload, part_id=2001),
+        ]
+        ok, _results = h.write_media_info_batch(db, items, journal)
+        assert ok == 2, _results
+        jconn = sqlite3.connect(h._journal_path(db))
+        tables = sorted(r[0] for r in jconn.execute("SELECT tbl FROM row_journal"))
+        jconn.close()
+        # part 200：part 行未变不记录；part 2001：item/part/streams（原为空）各一条；失败的 999 不记录
+        assert tables == ["media_items"] * 2 + ["media_parts"] + ["media_streams"] * 2, tables
+        assert _snapshot(db) != before
+        res = h.rollback_journal(db, backup.split(":", 1)[1])
+        print("行镜像回滚:", res)
+        assert res["success"] and res["rows"] == 5, res
+        assert _snapshot(db) == before
+    finally:
+        h.BACKUP_ON_WRITE, h.BACKUP_MODE = False, "full"
+
+
+def check_busy_monitor() -> None:
+    """繁忙监视器：请求读缓存快照，不再每次实时查询 Plex。"""
+    calls = []
+    orig = h.plex_is_busy
+    h.plex_is_busy = lambda: (calls.append(1) or (True, "存在 1 个播放会话"))
+    monitor = h.BusyMonitor(0.1)
+    h._BUSY_MONITOR = monitor
+    try:
+        monitor.start()
+        threading.Event().wait(0.05)
+        before = len(calls)
+        states = [h.busy_state() for _ in range(1000)]
+        assert all(st[0] for st in states), states[0]
+        assert len(calls) - before <= 1, len(calls) - before
+        resp = h._busy_response()
+        print("繁忙快照:", resp)
+        assert resp["busy"] and resp["cached"] and resp["age_seconds"] < 1, resp
+    finally:
+        monitor.stop()
+        h._BUSY_MONITOR = None
+        h.plex_is_busy = orig
+
+
+def check_busy_single_flight() -> None:
+    """繁忙监视器：慢检测期间快照不过期，并发的实时检测只跑一次。"""
+    calls = []
+    orig = h.plex_is_busy
+
+    def slow_probe():
+        calls.append(1)
+        threading.Event().wait(0.2)
+        return False, "空闲"
+
+    h.plex_is_busy = slow_probe
+    try:
+        monitor = h.BusyMonitor(5)
+        # 一次检测最多耗时两次请求超时，间隔 + 检测耗时内快照都应有效
+        assert monitor._max_age >= 5 + 2 * h.BUSY_PROBE_TIMEOUT_SECONDS, monitor._max_age
+        results = []
+        workers = [
+            threading.Thread(target=lambda: results.append(monitor.check()))
+            for _ in range(8)
+        ]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        print("并发实时检测:", len(calls), "次,", monitor.stats())
+        assert len(results) == 8 and not any(r[0] for r in results), results
+        assert len(calls) == 1 and monitor.live_checks == 1, (len(calls), monitor.live_checks)
+    finally:
+        h.plex_is_busy = orig
+
+
 def main() -> None:
     """执行自测流程并打印结果。"""
     tmp = tempfile.mkdtemp()
@@ -90,16 +309,61 @@ def main() -> None:
     ).fetchone()[0]
     assert ns == 3, ns
 
-    # 二次写入（overwrite）应先删旧流再写，仍是 3 条
+    # 二次写入相同内容：指纹一致，不产生任何写入
+    ids = conn.execute("SELECT id FROM media_streams WHERE media_part_id=200").fetchall()
     res2 = h.write_media_info(db, payload)
     print("二次写入:", res2)
-    assert res2["streams_deleted"] == 3, res2
-    ns2 = conn.execute(
-        "SELECT COUNT(*) FROM media_streams WHERE media_part_id=200"
-    ).fetchone()[0]
-    assert ns2 == 3, ns2
+    assert res2["unchanged"] and res2["streams_kept"] == 3, res2
+    assert conn.execute(
+        "SELECT id FROM media_streams WHERE media_part_id=200"
+    ).fetchall() == ids
+
+    # 差量写入：改一条音轨、去掉字幕，只更新 1 条、删除 1 条，视频流保持原记录
+    changed = dict(payload, streams=[
+        dict(payload["streams"][0]),
+        dict(payload["streams"][1], language="chi"),
+    ])
+    res_delta = h.write_media_info(db, changed)
+    print("差量写入:", res_delta)
+    assert not res_delta["unchanged"], res_delta
+    assert (res_delta["streams_updated"], res_delta["streams_deleted"], res_delta["streams_kept"]) == (1, 1, 1), res_delta
+    rows = conn.execute(
+        "SELECT id, language FROM media_streams WHERE media_part_id=200 ORDER BY id"
+    ).fetchall()
+    assert rows == [(ids[0][0], None), (ids[1][0], "chi")], rows
+    conn.close()
+
+    # 批量写入：表结构已缓存，整批不应再出现 PRAGMA table_info
+    pragmas = []
+    orig_open = h._open_conn
+
+    def traced_open(path: str) -> sqlite3.Connection:
+        c = orig_open(path)
+        c.set_trace_callback(lambda sql: pragmas.append(sql) if "table_info" in sql else None)
+        return c
+
+    h._open_conn = traced_open
+    ok, results = h.write_media_info_batch(db, [payload, dict(payload, part_id=999)])
+    h._open_conn = orig_open
+    print("批量写入:", ok, [r.get("error") for r in results])
+    assert ok == 1 and not results[1]["success"], results
+    assert not pragmas, pragmas
+
+    # 旧版 SQLite（无 UPSERT）退回先查后写
+    h.SQLITE_HAS_UPSERT = False
+    res3 = h.write_media_info(db, dict(payload, width=3840))
+    h.SQLITE_HAS_UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+    print("兼容写入:", res3)
+    assert res3["media_items"] == "update", res3
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT width FROM media_items WHERE id=100").fetchone()[0] == 3840
     conn.close()
 
+    check_backup(tmp, payload)
+    check_async_server(db, payload)
+    check_busy_monitor()
+    check_busy_single_flight()
+
     print("\n全部自测通过 ✅")
 
 
@@ -4,25 +4,35 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
-from httpx import Client
+from httpx import AsyncClient, Client
 
 from app.log import logger
 
+from .http_pool import send
+
 
 class HelperClient:
     """封装对 122 上 plex-mediainfo-helper 写库服务的调用。"""
 
-    def __init__(self, base_url: str, token: str = "", timeout: float = 60.0) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        token: str = "",
+        timeout: float = 60.0,
+        session: Optional[Client] = None,
+    ) -> None:
         """
         初始化 helper 客户端。
 
         :param base_url: helper 地址，如 http://192.168.0.122:9001
         :param token: 访问 token（对应 helper 的 PTH_TOKEN）
         :param timeout: 请求超时秒数
+        :param session: 插件共享的长连接会话；为 None 时每次请求新建连接
         """
         self._base = base_url.rstrip("/")
         self._token = token
         self._timeout = timeout
+        self._session = session
 
     def _headers(self) -> Dict[str, str]:
         """构建带 token 的请求头。"""
@@ -38,9 +48,8 @@ class HelperClient:
         :return: 服务可用返回 True
         """
         try:
-            with Client(timeout=10.0) as client:
-                resp = client.get(f"{self._base}/health")
-                return resp.status_code == 200
+            resp = send(self._session, "GET", f"{self._base}/health", 10.0)
+            return resp.status_code == 200
         except Exception:
             return False
 
@@ -51,15 +60,35 @@ class HelperClient:
         :return: dbinfo 响应，失败返回 None
         """
         try:
-            with Client(timeout=15.0) as client:
-                resp = client.get(f"{self._base}/dbinfo", headers=self._headers())
-                if resp.status_code == 200:
-                    return resp.json()
-                logger.warning("helper /dbinfo 返回 %s", resp.status_code)
+            resp = send(
+                self._session, "GET", f"{self._base}/dbinfo", 15.0,
+                headers=self._headers(),
+            )
+            if resp.status_code == 200:
+                return resp.json()
+            logger.warning("helper /dbinfo 返回 %s", resp.status_code)
         except Exception as e:
             logger.warning("helper /dbinfo 失败: %s", e)
         return None
 
+    def busy(self) -> Optional[bool]:
+        """
+        查询 helper 所在主机上的 Plex 是否繁忙（播放中 / 扫描中）。
+
+        :return: 繁忙返回 True，空闲返回 False，查询失败返回 None
+        """
+        try:
+            resp = send(
+                self._session, "GET", f"{self._base}/busy", 15.0,
+                headers=self._headers(),
+            )
+            if resp.status_code == 200:
+                return bool(resp.json().get("busy"))
+            logger.debug("helper /busy 返回 %s", resp.status_code)
+        except Exception as e:
+            logger.debug("helper /busy 失败: %s", e)
+        return None
+
     def write_batch(
         self, items: List[Dict[str, Any]], force: bool = False
     ) -> Optional[Dict[str, Any]]:
@@ -73,20 +102,51 @@ class HelperClient:
         if not items:
             return {"success": True, "total": 0, "ok": 0, "results": []}
         try:
-            with Client(timeout=self._timeout) as client:
-                resp = client.post(
-                    f"{self._base}/write_batch",
-                    headers=self._headers(),
-                    json={"items": items, "force": force},
-                )
-                if resp.status_code in (200, 409):
-                    data = resp.json()
-                    self._log_batch_result(data, len(items))
-                    return data
-                logger.warning(
-                    "helper /write_batch 返回 %s，本批 %s 条全部未写入",
-                    resp.status_code, len(items),
-                )
+            resp = send(
+                self._session, "POST", f"{self._base}/write_batch", self._timeout,
+                headers=self._headers(),
+                json={"items": items, "force": force},
+            )
+            if resp.status_code in (200, 409):
+                data = resp.json()
+                self._log_batch_result(data, len(items))
+                return data
+            logger.warning(
+                "helper /write_batch 返回 %s，本批 %s 条全部未写入",
+                resp.status_code, len(items),
+            )
+        except Exception as e:
+            logger.warning("helper /write_batch 失败: %s（本批 %s 条未写入）", e, len(items))
+        return None
+
+    async def write_batch_async(
+        self, client: AsyncClient, items: List[Dict[str, Any]], force: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        write_batch 的异步版本（复用调用方的连接池），返回值相同。
+
+        :param client: 共享的 httpx AsyncClient
+        :param items: 每项为 helper payload（含 part_id 等）
+        :param force: 是否忽略 Plex 繁忙检测强制写入
+        :return: 写入结果，失败返回 None
+        """
+        if not items:
+            return {"success": True, "total": 0, "ok": 0, "results": []}
+        try:
+            resp = await client.post(
+                f"{self._base}/write_batch",
+                headers=self._headers(),
+                json={"items": items, "force": force},
+                timeout=self._timeout,
+            )
+            if resp.status_code in (200, 409):
+                data = resp.json()
+                self._log_batch_result(data, len(items))
+                return data
+            logger.warning(
+                "helper /write_batch 返回 %s，本批 %s 条全部未写入",
+                resp.status_code, len(items),
+            )
         except Exception as e:
             logger.warning("helper /write_batch 失败: %s（本批 %s 条未写入）", e, len(items))
         return None
@@ -120,5 +180,9 @@ class HelperClient:
             if len(failed) > 50:
                 logger.warning("  （另有 %s 条失败明细省略）", len(failed) - 50)
         else:
-            logger.info("helper 写入完成：成功 %s / 共 %s，全部成功", ok, sent)
+            unchanged = sum(1 for r in results if r.get("unchanged"))
+            logger.info(
+                "helper 写入完成：成功 %s / 共 %s，全部成功（其中 %s 条内容未变，未改动数据库）",
+                ok, sent, unchanged,
+            )
 
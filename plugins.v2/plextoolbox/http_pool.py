@@ -0,0 +1,189 @@
+"""插件级共享 HTTP 会话池：长连接复用、连接数上限、可选 HTTP/2，附请求与连接复用统计。"""
+
+from threading import Lock
+from time import monotonic, sleep
+from typing import Any, Dict, Optional
+
+from httpx import Client, Limits, Request, Response
+
+from app.log import logger
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
+# 默认连接池参数
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE = 10
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+
+class _SessionStats:
+    """单个会话的请求 / 新建连接计数（多线程共用，加锁累加）。"""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.requests = 0
+        self.connects = 0
+        self.tls_handshakes = 0
+
+    def on_request(self, request: Request) -> None:
+        """请求钩子：计数并挂上 trace 回调以感知新建连接。"""
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        """httpcore trace 回调：只有新建连接才会出现 connect_tcp / start_tls 事件。"""
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connects += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出计数与连接复用率。"""
+        with self._lock:
+            reused = max(0, self.requests - self.connects)
+            return {
+                "requests": self.requests,
+                "new_connections": self.connects,
+                "tls_handshakes": self.tls_handshakes,
+                "reuse_ratio": round(reused / self.requests, 4) if self.requests else None,
+            }
+
+
+class HttpSessionPool:
+    """
+    按用途命名的长连接 httpx.Client 集合，整个插件实例共享。
+
+    Plex / Emby / helper / TMDB 等客户端传入同一个池取会话，不再每次请求新建
+    Client（新 TCP/TLS 握手）。httpx.Client 本身线程安全，可供补全线程池并发使用。
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        http2: bool = False,
+    ) -> None:
+        """
+        初始化会话池（会话按需创建）。
+
+        :param max_connections: 每个会话的最大连接数
+        :param max_keepalive: 每个会话保持的最大空闲长连接数
+        :param keepalive_expiry: 空闲长连接保留秒数
+        :param http2: 是否启用 HTTP/2（未安装 h2 时自动退回 HTTP/1.1）
+        """
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("PlexToolbox 未安装 h2，HTTP/2 不可用，使用 HTTP/1.1 长连接")
+            http2 = False
+        self._limits = Limits(
+            max_connections=max(1, max_connections),
+            max_keepalive_connections=max(0, min(max_keepalive, max_connections)),
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._http2 = http2
+        self._lock = Lock()
+        self._clients: Dict[str, Client] = {}
+        self._stats: Dict[str, _SessionStats] = {}
+        self._closed = False
+
+    def session(self, name: str, proxy: Optional[str] = None) -> Optional[Client]:
+        """
+        取（首次则创建）指定用途的共享会话。
+
+        :param name: 会话用途名，如 plex / emby / helper / tmdb
+        :param proxy: 该会话使用的代理地址（仅首次创建时生效）
+        :return: httpx.Client；池已关闭时返回 None（调用方退回一次性 Client）
+        """
+        with self._lock:
+            if self._closed:
+                return None
+            client = self._clients.get(name)
+            if client is None:
+                stats = self._stats.setdefault(name, _SessionStats())
+                client = Client(
+                    limits=self._limits,
+                    http2=self._http2,
+                    proxy=proxy,
+                    event_hooks={"request": [stats.on_request]},
+                )
+                self._clients[name] = client
+            return client
+
+    def close(self) -> None:
+        """关闭全部会话（释放长连接），之后 session 返回 None。"""
+        with self._lock:
+            self._closed = True
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception as e:
+                logger.debug("PlexToolbox 关闭 HTTP 会话异常: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回各会话的请求数与连接复用统计。
+
+        :return: {http2, max_connections, sessions: {name: {...}}}
+        """
+        with self._lock:
+            items = list(self._stats.items())
+        return {
+            "http2": self._http2,
+            "max_connections": self._limits.max_connections,
+            "max_keepalive": self._limits.max_keepalive_connections,
+            "sessions": {name: s.snapshot() for name, s in items},
+        }
+
+
+class RateLimiter:
+    """
+    线程安全的请求速率限制器（按固定间隔放行），用于限制对单个上游主机的请求速率。
+    """
+
+    def __init__(self, rate_per_second: float) -> None:
+        """
+        :param rate_per_second: 每秒最多放行的请求数；<=0 表示不限速
+        """
+        self._interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._lock = Lock()
+        self._next_at = 0.0
+
+    def acquire(self) -> None:
+        """阻塞到下一个可用时隙（不限速时立即返回）。"""
+        if not self._interval:
+            return
+        with self._lock:
+            now = monotonic()
+            slot = max(now, self._next_at)
+            self._next_at = slot + self._interval
+        if slot > now:
+            sleep(slot - now)
+
+
+def send(
+    session: Optional[Client], method: str, url: str, timeout: float, **kwargs: Any
+) -> Response:
+    """
+    优先用共享会话发请求；未提供会话时退回一次性 Client（旧行为）。
+
+    :param session: 共享 httpx.Client，可为 None
+    :param method: HTTP 方法
+    :param url: 完整 URL
+    :param timeout: 超时秒数
+    :param kwargs: 透传给 httpx 的 headers/json 等参数
+    :return: 已读取响应体的 Response
+    """
+    if session is not None:
+        return session.request(method, url, timeout=timeout, **kwargs)
+    with Client(timeout=timeout) as client:
+        return client.request(method, url, **kwargs)
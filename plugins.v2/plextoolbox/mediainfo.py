@@ -2,14 +2,43 @@
 
 from __future__ import annotations
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Callable, Dict, List, Optional
+from asyncio import Semaphore, create_task, get_running_loop, to_thread, wait
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from httpx import AsyncClient
 
 from app.log import logger
 
-from .emby_client import EmbyClient
+from .emby_client import EmbyClient, EmbyLibraryIndex
+from .ffprobe_source import FfprobePool
 from .helper_client import HelperClient
 from .plex_client import PlexClient
+from .result_cache import MediaInfoResultCache, strm_identity
+from .write_queue import WRITE_CHUNK_MAX_ITEMS, HelperWriteScheduler, PendingWriteQueue
+
+# 播前补全：为 helper 写入预留的时间（秒），数据源查询须在截止前这么久结束
+PREPLAY_WRITE_RESERVE_SECONDS = 0.8
+# 全量补全流水线：阶段间队列容量（条）
+PIPELINE_QUEUE_SIZE = 200
+# 全量补全流水线：线程等待队列的轮询间隔（秒），用于及时响应停止
+PIPELINE_POLL_SECONDS = 0.5
+# 全量补全：距上次写入超过该秒数时，未满一块也先写入
+WRITE_FLUSH_SECONDS = 15.0
+# 未解析文件明细最多记录 / 打印的条数
+UNRESOLVED_LOG_LIMIT = 50
+
+# 数据源模式：仅 Emby / Emby 未命中再 ffprobe / 先 ffprobe 未果再 Emby
+SOURCE_MODE_EMBY = "emby"
+SOURCE_MODE_EMBY_FFPROBE = "emby_ffprobe"
+SOURCE_MODE_FFPROBE_EMBY = "ffprobe_emby"
+_SOURCE_ORDERS = {
+    SOURCE_MODE_EMBY: ("emby",),
+    SOURCE_MODE_EMBY_FFPROBE: ("emby", "ffprobe"),
+    SOURCE_MODE_FFPROBE_EMBY: ("ffprobe", "emby"),
+}
 
 
 class MediaInfoCompleter:
@@ -24,6 +53,12 @@ class MediaInfoCompleter:
         overwrite_streams: bool = True,
         concurrency: int = 3,
         force_write: bool = False,
+        write_chunk_size: int = WRITE_CHUNK_MAX_ITEMS,
+        emby_prefetch: bool = True,
+        result_cache: Optional[MediaInfoResultCache] = None,
+        ffprobe: Optional[FfprobePool] = None,
+        source_mode: str = SOURCE_MODE_EMBY,
+        pending_writes: Optional[PendingWriteQueue] = None,
     ) -> None:
         """
         初始化补全器。
@@ -35,6 +70,12 @@ class MediaInfoCompleter:
         :param overwrite_streams: 写入前是否清空该 part 旧流
         :param concurrency: 数据源探测并发数
         :param force_write: 是否忽略 Plex 繁忙强制写入
+        :param write_chunk_size: 全量补全时每块写入 helper 的条数
+        :param emby_prefetch: 全量补全时是否先分页预取 Emby 全库建立文件名索引
+        :param result_cache: 插件共享的解析结果持久化缓存，命中时不再查数据源
+        :param ffprobe: 插件共享的 ffprobe 探测池
+        :param source_mode: 数据源模式，见 SOURCE_MODE_*
+        :param pending_writes: 插件共享的待写队列，写不进去的条目留待 Plex 空闲后补写
         """
         self._plex = plex
         self._helper = helper
@@ -43,23 +84,99 @@ class MediaInfoCompleter:
         self._overwrite = overwrite_streams
         self._concurrency = max(1, concurrency)
         self._force = force_write
+        self._write_chunk = max(1, write_chunk_size)
+        self._writer = HelperWriteScheduler(
+            helper, pending_writes, force=force_write, max_items=self._write_chunk
+        )
+        self._emby_prefetch = emby_prefetch
+        self._result_cache = result_cache
+        self._ffprobe = ffprobe if ffprobe is not None and ffprobe.available else None
+        # 按模式排出实际可用的数据源查询顺序
+        self._sources = tuple(
+            src for src in _SOURCE_ORDERS.get(source_mode, ("emby",))
+            if (src == "emby" and self._use_emby) or (src == "ffprobe" and self._ffprobe)
+        )
+        # 全量补全期间的 Emby 全库索引：首次缓存未命中时才预取，run 结束即释放
+        self._library_index: Optional[EmbyLibraryIndex] = None
+        self._prefetch_pending = False
+        self._prefetch_lock = Lock()
 
     def _resolve_one(self, part: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
-        为单个 STRM part 从 Emby 解析媒体信息。
+        为单个 STRM part 按数据源顺序解析媒体信息（先查结果缓存）。
 
         :param part: {part_id, file, title, ...}
         :return: helper payload（含 part_id 与流信息），失败返回 None
         """
         file_path = part.get("file") or ""
-        info: Optional[Dict[str, Any]] = None
+        identity, info = self._cached_info(file_path)
+        if info:
+            return self._finish_payload(part, info)
 
-        if self._use_emby and self._emby:
-            try:
-                info = self._emby.find_streams_by_name(file_path)
-            except Exception as e:
-                logger.debug("Emby 数据源失败 %s: %s", file_path, e)
+        for source in self._sources:
+            if source == "emby":
+                info = self._library_lookup(file_path)
+                if not info:
+                    try:
+                        info = self._emby.find_streams_by_name(file_path)
+                    except Exception as e:
+                        logger.debug("Emby 数据源失败 %s: %s", file_path, e)
+            else:
+                info = self._ffprobe.probe_strm(file_path)
+            if info:
+                break
+        self._remember(identity, info)
+        return self._finish_payload(part, info)
+
+    def _cached_info(self, file_path: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        计算 STRM 标识并查解析结果缓存（读 STRM 文件与查库，阻塞调用）。
+
+        :param file_path: STRM 文件路径
+        :return: (标识, 缓存的媒体信息)；未启用缓存时为 ("", None)
+        """
+        if self._result_cache is None:
+            return "", None
+        identity = strm_identity(file_path)
+        return identity, self._result_cache.get(identity)
+
+    def _remember(self, identity: str, info: Optional[Dict[str, Any]]) -> None:
+        """
+        把数据源解析结果写入缓存（写缓冲，满批才落盘）。
+
+        :param identity: STRM 标识
+        :param info: 数据源返回的媒体信息，None 不缓存
+        """
+        if self._result_cache is not None and identity and info:
+            self._result_cache.put(identity, info)
+
+    def _library_lookup(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        在 Emby 全库索引中查找；全量补全中首次调用时才分页预取建立索引。
+
+        全部命中结果缓存的重跑因此不会产生任何 Emby 请求。
 
+        :param file_path: STRM 文件路径
+        :return: 媒体信息，未命中或未启用预取返回 None
+        """
+        if self._prefetch_pending:
+            with self._prefetch_lock:
+                if self._prefetch_pending:
+                    self._library_index = self._prefetch_library()
+                    self._prefetch_pending = False
+        index = self._library_index
+        return index.lookup(file_path) if index is not None else None
+
+    def _finish_payload(
+        self, part: Dict[str, Any], info: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        为数据源结果补上 part_id 与写入选项，组成 helper payload。
+
+        :param part: {part_id, file, ...}
+        :param info: 数据源返回的媒体信息，None 表示未解析
+        :return: helper payload，未解析返回 None
+        """
         if not info:
             return None
         info["part_id"] = part["part_id"]
@@ -105,23 +222,27 @@ class MediaInfoCompleter:
         else:
             logger.info("PlexToolbox 写入成功[%s]：%s 条全部写入", scope, ok)
 
-    def _log_unresolved(self, scope: str, unresolved_files: List[str]) -> None:
+    def _log_unresolved(
+        self, scope: str, unresolved_files: List[str], total: Optional[int] = None
+    ) -> None:
         """
         打印未能从任何数据源取到媒体信息的文件明细。
 
         :param scope: 日志范围描述
-        :param unresolved_files: 未解析成功的文件路径列表
+        :param unresolved_files: 未解析成功的文件路径列表（可只含前若干条）
+        :param total: 未解析总数，缺省为 unresolved_files 的长度
         """
         if not unresolved_files:
             return
+        total = len(unresolved_files) if total is None else total
         logger.warning(
             "PlexToolbox 未取到媒体信息[%s]：%s 个文件（Emby 未命中）",
-            scope, len(unresolved_files),
+            scope, total,
         )
-        for f in unresolved_files[:50]:
+        for f in unresolved_files[:UNRESOLVED_LOG_LIMIT]:
             logger.warning("  未解析: %s", f)
-        if len(unresolved_files) > 50:
-            logger.warning("  （另有 %s 个未解析文件省略）", len(unresolved_files) - 50)
+        if total > UNRESOLVED_LOG_LIMIT:
+            logger.warning("  （另有 %s 个未解析文件省略）", total - UNRESOLVED_LOG_LIMIT)
 
     def run_rating_key(
         self, rating_key: str, only_missing: bool = True, forward: int = 5
@@ -137,32 +258,197 @@ class MediaInfoCompleter:
         :param forward: 单集场景下向后预取的集数
         :return: 汇总结果
         """
-        summary: Dict[str, Any] = {
+        summary = self._window_summary(rating_key, self._plex.item_label(rating_key))
+        parts = self._plex.collect_window_parts_by_rating_key(
+            rating_key, forward=forward, only_missing=only_missing
+        )
+        summary["strm_parts"] = len(parts)
+        if not parts:
+            return summary
+        infos = [self._resolve_one(p) for p in parts]
+        payloads, item_index = self._tally_resolved(summary, parts, infos)
+        if payloads:
+            res = self._writer.send(payloads)
+            self._tally_write(summary, payloads, res, item_index)
+            self._defer_unwritten(summary, payloads, res, item_index)
+        if self._result_cache is not None:
+            self._result_cache.flush()
+        return summary
+
+    async def run_rating_key_async(
+        self,
+        client: AsyncClient,
+        rating_key: str,
+        only_missing: bool = True,
+        forward: int = 5,
+        section_keys: Optional[Set[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        run_rating_key 的异步版本，供 302 代理播前补全在事件循环内直接调用。
+
+        复用代理的连接池；当前条目元数据只取一次（同时用于媒体库校验、标签与窗口），
+        窗口内各集详情与 Emby 查询并发执行。给定 deadline 时，Emby 查询最晚在
+        deadline 前 PREPLAY_WRITE_RESERVE_SECONDS 截止，未完成的查询取消，
+        已解析的条目照常写入；整体被取消时所有在途请求一并中止。
+
+        :param client: 共享的 httpx AsyncClient
+        :param rating_key: 当前播放条目的 ratingKey（电影或单集）
+        :param only_missing: 是否仅处理缺失媒体信息的 part
+        :param forward: 单集场景下向后预取的集数
+        :param section_keys: 允许补全的媒体库 key；为 None 不校验
+        :param deadline: 事件循环时钟（loop.time()）上的截止时间；为 None 不限时
+        :return: 汇总结果；条目不存在或不在所选媒体库时返回 None
+        """
+        metas = await self._plex.metadata_async(client, rating_key)
+        if not metas:
+            logger.warning("PlexToolbox 无法获取条目元数据，跳过播前补全 ratingKey=%s", rating_key)
+            return None
+        if section_keys is not None:
+            section_key = self._plex.meta_section_key(metas[0])
+            if section_key not in section_keys:
+                logger.info(
+                    "PlexToolbox 跳过播前补全：条目不在已选媒体库 ratingKey=%s section=%s",
+                    rating_key, section_key or "?",
+                )
+                return None
+        summary = self._window_summary(rating_key, self._plex.meta_label(metas[0]))
+        parts = await self._plex.collect_window_parts_async(
+            client, metas, forward=forward, only_missing=only_missing
+        )
+        summary["strm_parts"] = len(parts)
+        if not parts:
+            return summary
+
+        loop = get_running_loop()
+        slots = Semaphore(self._concurrency)
+        # 窗口按集号排列，当前集最先拿到并发名额
+        tasks = [
+            create_task(self._resolve_one_async(client, p, slots)) for p in parts
+        ]
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - loop.time() - PREPLAY_WRITE_RESERVE_SECONDS)
+        try:
+            _done, pending = await wait(tasks, timeout=timeout)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if pending:
+            summary["timed_out"] = len(pending)
+            logger.info(
+                "PlexToolbox 播前补全数据源超时[%s]：%s/%s 条未完成，先写入已解析部分",
+                summary.get("label") or f"ratingKey={rating_key}",
+                len(pending), len(parts),
+            )
+        infos = [
+            t.result() if t.done() and not t.cancelled() else None for t in tasks
+        ]
+        payloads, item_index = self._tally_resolved(summary, parts, infos)
+        if payloads:
+            res = await self._helper.write_batch_async(
+                client, payloads, force=self._force
+            )
+            self._tally_write(summary, payloads, res, item_index)
+            if res is None or res.get("busy"):
+                await to_thread(self._defer_unwritten, summary, payloads, res, item_index)
+        if self._result_cache is not None:
+            await to_thread(self._result_cache.flush)
+        return summary
+
+    async def _resolve_one_async(
+        self, client: AsyncClient, part: Dict[str, Any], slots: Semaphore
+    ) -> Optional[Dict[str, Any]]:
+        """
+        _resolve_one 的异步版本。
+
+        :param client: 共享的 httpx AsyncClient
+        :param part: {part_id, file, title, ...}
+        :param slots: 并发名额
+        :return: helper payload，失败返回 None
+        """
+        file_path = part.get("file") or ""
+        identity, info = "", None
+        if self._result_cache is not None:
+            # 读 STRM 文件与查库放到线程里，不阻塞代理事件循环
+            identity, info = await to_thread(self._cached_info, file_path)
+            if info:
+                return self._finish_payload(part, info)
+        for source in self._sources:
+            if source == "emby":
+                try:
+                    async with slots:
+                        info = await self._emby.find_streams_by_name_async(client, file_path)
+                except Exception as e:
+                    logger.debug("Emby 数据源失败 %s: %s", file_path, e)
+            else:
+                # 探测池自带总并发与按主机并发上限，不占 Emby 查询名额
+                info = await self._ffprobe.probe_strm_async(file_path)
+            if info:
+                break
+        if identity and info and self._result_cache is not None:
+            # put 可能触发满批落盘（同步 SQLite），放到线程执行，不阻塞代理事件循环
+            await to_thread(self._remember, identity, info)
+        return self._finish_payload(part, info)
+
+    @staticmethod
+    def _count_source(summary: Dict[str, Any], source: Optional[str]) -> None:
+        """
+        按数据源累加命中计数（emby_hits / ffprobe_hits / cache_hits）。
+
+        :param summary: 当前汇总（就地更新）
+        :param source: payload 的 source 字段
+        """
+        key = f"{source}_hits"
+        if key in summary:
+            summary[key] += 1
+
+    @staticmethod
+    def _window_summary(rating_key: str, label: str) -> Dict[str, Any]:
+        """
+        构建单条目窗口补全的初始汇总。
+
+        :param rating_key: 当前播放条目的 ratingKey
+        :param label: 条目可读标签
+        :return: 汇总字典
+        """
+        return {
             "rating_key": rating_key,
-            "label": self._plex.item_label(rating_key),
+            "label": label,
             "strm_parts": 0,
             "resolved": 0,
             "emby_hits": 0,
+            "ffprobe_hits": 0,
+            "cache_hits": 0,
             "unresolved": 0,
             "written_ok": 0,
             "write_failed": 0,
+            "write_queued": 0,
+            "write_unchanged": 0,
             "helper_busy": False,
             "items": [],
         }
-        parts = self._plex.collect_window_parts_by_rating_key(
-            rating_key, forward=forward, only_missing=only_missing
-        )
-        summary["strm_parts"] = len(parts)
-        # 日志范围优先用可读剧名/片名，取不到再退回 ratingKey
-        scope = summary.get("label") or f"ratingKey={rating_key}"
-        if not parts:
-            return summary
 
+    def _tally_resolved(
+        self,
+        summary: Dict[str, Any],
+        parts: List[Dict[str, Any]],
+        infos: List[Optional[Dict[str, Any]]],
+    ) -> Tuple[List[Dict[str, Any]], Dict[Any, Dict[str, Any]]]:
+        """
+        汇总窗口内各 part 的解析结果，生成待写入 payload 与明细项。
+
+        :param summary: 当前汇总（就地更新计数与 items）
+        :param parts: 窗口内 STRM part
+        :param infos: 与 parts 一一对应的解析结果（None 为未解析）
+        :return: (去掉 source 字段的 payload 列表, part_id -> 明细项)
+        """
         payloads: List[Dict[str, Any]] = []
         unresolved_files: List[str] = []
         # part_id -> 明细项引用，写入阶段回填状态
         item_index: Dict[Any, Dict[str, Any]] = {}
-        for p in parts:
+        for p, info in zip(parts, infos):
             item = {
                 "label": p.get("label") or p.get("title") or "",
                 "part_id": p.get("part_id"),
@@ -170,49 +456,92 @@ class MediaInfoCompleter:
             }
             summary["items"].append(item)
             item_index[p.get("part_id")] = item
-            info = self._resolve_one(p)
             if info:
                 payloads.append(info)
                 summary["resolved"] += 1
                 item["status"] = "resolved"
-                if info.get("source") == "emby":
-                    summary["emby_hits"] += 1
+                self._count_source(summary, info.get("source"))
             else:
                 summary["unresolved"] += 1
                 unresolved_files.append(p.get("file") or str(p.get("part_id")))
 
-        scope = summary.get("label") or f"ratingKey={rating_key}"
+        scope = summary.get("label") or f"ratingKey={summary.get('rating_key')}"
         self._log_unresolved(scope, unresolved_files)
-
         for p in payloads:
             p.pop("source", None)
-        if payloads:
-            res = self._helper.write_batch(payloads, force=self._force)
-            if res is None:
-                summary["write_failed"] = len(payloads)
-                for p in payloads:
-                    it = item_index.get(p.get("part_id"))
-                    if it:
+        return payloads, item_index
+
+    def _tally_write(
+        self,
+        summary: Dict[str, Any],
+        payloads: List[Dict[str, Any]],
+        res: Optional[Dict[str, Any]],
+        item_index: Dict[Any, Dict[str, Any]],
+    ) -> None:
+        """
+        按 helper 写入结果回填汇总计数与逐条状态，并打印写入日志。
+
+        :param summary: 当前汇总（就地更新）
+        :param payloads: 本次发送的 payload
+        :param res: helper.write_batch 返回值
+        :param item_index: part_id -> 明细项
+        """
+        if res is None:
+            summary["write_failed"] = len(payloads)
+            for p in payloads:
+                it = item_index.get(p.get("part_id"))
+                if it:
+                    it["status"] = "write_failed"
+        elif res.get("busy"):
+            summary["helper_busy"] = True
+            summary["write_failed"] = len(payloads)
+            for p in payloads:
+                it = item_index.get(p.get("part_id"))
+                if it:
+                    it["status"] = "busy"
+        else:
+            summary["written_ok"] = res.get("ok", 0)
+            summary["write_failed"] = len(payloads) - res.get("ok", 0)
+            summary["write_unchanged"] = self._count_unchanged(res)
+            # 按 helper 返回的逐条结果回填写入状态（内容未变、helper 跳过写入的记为 unchanged）
+            for r in res.get("results") or []:
+                it = item_index.get(r.get("part_id"))
+                if it:
+                    if not r.get("success"):
                         it["status"] = "write_failed"
-            elif res.get("busy"):
-                summary["helper_busy"] = True
-                summary["write_failed"] = len(payloads)
-                for p in payloads:
-                    it = item_index.get(p.get("part_id"))
-                    if it:
-                        it["status"] = "busy"
-            else:
-                summary["written_ok"] = res.get("ok", 0)
-                summary["write_failed"] = len(payloads) - res.get("ok", 0)
-                # 按 helper 返回的逐条结果回填写入状态
-                for r in res.get("results") or []:
-                    it = item_index.get(r.get("part_id"))
-                    if it:
-                        it["status"] = "written" if r.get("success") else "write_failed"
-                        if not r.get("success") and r.get("error"):
-                            it["error"] = str(r.get("error"))[:120]
-            self._log_write_outcome(scope, len(payloads), res, summary)
-        return summary
+                    else:
+                        it["status"] = "unchanged" if r.get("unchanged") else "written"
+                    if not r.get("success") and r.get("error"):
+                        it["error"] = str(r.get("error"))[:120]
+        scope = summary.get("label") or f"ratingKey={summary.get('rating_key')}"
+        self._log_write_outcome(scope, len(payloads), res, summary)
+
+    def _defer_unwritten(
+        self,
+        summary: Dict[str, Any],
+        payloads: List[Dict[str, Any]],
+        res: Optional[Dict[str, Any]],
+        item_index: Dict[Any, Dict[str, Any]],
+    ) -> None:
+        """
+        窗口写入整体未成功（helper 无响应 / Plex 繁忙）时，把 payload 放入待写队列。
+
+        :param summary: 当前汇总（就地更新 write_queued 与明细状态）
+        :param payloads: 本次发送的 payload
+        :param res: helper.write_batch 返回值
+        :param item_index: part_id -> 明细项
+        """
+        if res is not None and not res.get("busy"):
+            return
+        queued = self._writer.defer(payloads)
+        if not queued:
+            return
+        summary["write_queued"] = queued
+        summary["write_failed"] = max(0, summary["write_failed"] - queued)
+        for p in payloads:
+            it = item_index.get(p.get("part_id"))
+            if it:
+                it["status"] = "queued"
 
     def run(
         self,
@@ -221,7 +550,16 @@ class MediaInfoCompleter:
         progress_cb: Optional[Callable[[Dict[str, Any]], None]] = None,
     ) -> Dict[str, Any]:
         """
-        执行补全：枚举分区 STRM part，解析数据源并写入 helper。
+        执行补全：枚举 → 解析 → 写入三段流水线。
+
+        枚举线程边发现边把 STRM part 放进有界队列，concurrency 个解析线程取出后
+        查询数据源，结果再经有界队列交给当前线程按块写入 helper（满 write_chunk_size
+        条或距上次写入超过 WRITE_FLUSH_SECONDS 即写一块，再按字节上限细分，Plex 繁忙时
+        退避重试，仍写不进去的放入待写队列）。写入端阻塞时队列逐级填满，解析与枚举随之放缓。
+        开始前先在 Plex 空闲时补写上次留下的待写队列。
+        队列占用与媒体库大小无关，写入在枚举未结束时就开始，单块失败不影响其他块。
+        解析线程先查解析结果缓存；缓存首次未命中时分页拉取 Emby 全库建立文件名索引
+        （启用预取时），索引未命中再逐条搜索。
 
         :param section_keys: 要处理的 Plex 分区 key 列表
         :param only_missing: 是否仅处理缺失媒体信息的 part
@@ -233,64 +571,201 @@ class MediaInfoCompleter:
             "strm_parts": 0,
             "resolved": 0,
             "emby_hits": 0,
+            "ffprobe_hits": 0,
+            "cache_hits": 0,
             "unresolved": 0,
             "written_ok": 0,
             "write_failed": 0,
+            "write_queued": 0,
+            "write_unchanged": 0,
             "helper_busy": False,
+            "chunks_written": 0,
+            "chunks_failed": 0,
             "details": [],
         }
+        parts_q: "Queue[Optional[Dict[str, Any]]]" = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        results_q: Queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        stop = Event()
+        enumerated = [0]
+        workers = self._concurrency
 
-        # 1. 枚举 STRM part
-        all_parts: List[Dict[str, Any]] = []
-        for skey in section_keys:
-            all_parts.extend(self._plex.collect_strm_parts(skey, only_missing))
-        summary["strm_parts"] = len(all_parts)
-        if not all_parts:
-            return summary
-        if progress_cb:
-            progress_cb({"phase": "enumerated", "count": len(all_parts)})
+        def _put(q: Queue, item: Any) -> bool:
+            """阻塞放入队列，流水线停止时放弃。"""
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=PIPELINE_POLL_SECONDS)
+                    return True
+                except Full:
+                    continue
+            return False
 
-        # 2. 并发解析数据源
-        payloads: List[Dict[str, Any]] = []
+        def _enumerate() -> None:
+            """枚举线程：逐分区流式产出 STRM part，结束后给每个解析线程发结束标记。"""
+            try:
+                for skey in section_keys:
+                    for part in self._plex.iter_strm_parts(skey, only_missing):
+                        if not _put(parts_q, part):
+                            return
+                        enumerated[0] += 1
+            except Exception as e:
+                logger.error("PlexToolbox 枚举 STRM 失败: %s", e, exc_info=True)
+            finally:
+                for _ in range(workers):
+                    _put(parts_q, None)
+
+        def _resolve() -> None:
+            """解析线程：取 part 查数据源，(part, payload) 交给写入端；退出时必发结束标记。"""
+            try:
+                while not stop.is_set():
+                    try:
+                        part = parts_q.get(timeout=PIPELINE_POLL_SECONDS)
+                    except Empty:
+                        continue
+                    if part is None:
+                        return
+                    try:
+                        info = self._resolve_one(part)
+                    except Exception as e:
+                        logger.error(
+                            "PlexToolbox 解析 part_id=%s 失败: %s",
+                            part.get("part_id"), e, exc_info=True,
+                        )
+                        info = None
+                    if not _put(results_q, (part, info)):
+                        return
+            finally:
+                _put(results_q, None)
+
+        drained = self._writer.drain()
+        if drained["written"] or drained["pending"]:
+            summary["pending_drain"] = drained
+        Thread(target=_enumerate, name="plextoolbox-enum-feed", daemon=True).start()
+        self._library_index = None
+        self._prefetch_pending = bool(self._use_emby and self._emby and self._emby_prefetch)
+        for i in range(workers):
+            Thread(target=_resolve, name=f"plextoolbox-resolve-{i}", daemon=True).start()
+
+        chunk: List[Dict[str, Any]] = []
         unresolved_files: List[str] = []
-        with ThreadPoolExecutor(max_workers=self._concurrency) as pool:
-            futures = {pool.submit(self._resolve_one, p): p for p in all_parts}
-            done = 0
-            for fut in as_completed(futures):
-                done += 1
-                src_part = futures[fut]
-                info = fut.result()
-                if info:
-                    payloads.append(info)
-                    summary["resolved"] += 1
-                    if info.get("source") == "emby":
-                        summary["emby_hits"] += 1
-                else:
-                    summary["unresolved"] += 1
-                    unresolved_files.append(
-                        src_part.get("file") or str(src_part.get("part_id"))
-                    )
-                if progress_cb and done % 10 == 0:
-                    progress_cb(
-                        {"phase": "resolving", "done": done, "total": len(all_parts)}
-                    )
-
-        self._log_unresolved("全量补全", unresolved_files)
-
-        # 3. 写入 helper（去掉 source 字段再发）
-        for p in payloads:
-            p.pop("source", None)
-        if payloads:
-            res = self._helper.write_batch(payloads, force=self._force)
-            if res is None:
-                summary["write_failed"] = len(payloads)
-            elif res.get("busy"):
-                summary["helper_busy"] = True
-                summary["write_failed"] = len(payloads)
-            else:
-                summary["written_ok"] = res.get("ok", 0)
-                summary["write_failed"] = len(payloads) - res.get("ok", 0)
-            self._log_write_outcome("全量补全", len(payloads), res, summary)
+        finished = 0
+        done = 0
+        last_res: Optional[Dict[str, Any]] = None
+        last_flush = monotonic()
+        try:
+            while finished < workers:
+                wait_s = max(0.1, WRITE_FLUSH_SECONDS - (monotonic() - last_flush))
+                try:
+                    item = results_q.get(timeout=wait_s)
+                except Empty:
+                    item = False
+                if item is None:
+                    finished += 1
+                elif item:
+                    part, info = item
+                    done += 1
+                    if info:
+                        self._count_source(summary, info.pop("source", None))
+                        summary["resolved"] += 1
+                        chunk.append(info)
+                    else:
+                        summary["unresolved"] += 1
+                        if len(unresolved_files) < UNRESOLVED_LOG_LIMIT:
+                            unresolved_files.append(
+                                part.get("file") or str(part.get("part_id"))
+                            )
+                    if progress_cb and done % 10 == 0:
+                        progress_cb(
+                            {"phase": "resolving", "done": done, "total": enumerated[0]}
+                        )
+                if chunk and (
+                    len(chunk) >= self._write_chunk
+                    or monotonic() - last_flush >= WRITE_FLUSH_SECONDS
+                ):
+                    last_res = self._flush_chunk(chunk, summary)
+                    chunk = []
+                    last_flush = monotonic()
+            if chunk:
+                last_res = self._flush_chunk(chunk, summary)
+        finally:
+            stop.set()
+            self._prefetch_pending = False
+            index, self._library_index = self._library_index, None
+            if self._result_cache is not None:
+                self._result_cache.flush()
+
+        summary["strm_parts"] = enumerated[0]
+        if index is not None:
+            summary["emby_prefetch"] = index.stats()
+        self._log_unresolved("全量补全", unresolved_files, total=summary["unresolved"])
+        sent = summary["written_ok"] + summary["write_failed"]
+        if summary["chunks_written"]:
+            # 至少一块写成功时按累计结果汇总，否则沿用最后一块的失败原因
+            last_res = {"ok": summary["written_ok"]}
+        self._log_write_outcome("全量补全", sent, last_res, summary)
+        if summary["write_unchanged"]:
+            logger.info(
+                "PlexToolbox 全量补全：%s 条媒体信息与库中一致，helper 未改动数据库",
+                summary["write_unchanged"],
+            )
+        if summary["write_queued"]:
+            logger.info(
+                "PlexToolbox 全量补全：%s 条因 Plex 繁忙/helper 无响应放入待写队列，空闲后补写",
+                summary["write_queued"],
+            )
         if progress_cb:
             progress_cb({"phase": "done", **summary})
         return summary
+
+    def _prefetch_library(self) -> Optional[EmbyLibraryIndex]:
+        """
+        全量补全前分页预取 Emby 全库，建立文件名索引。
+
+        :return: 索引；未启用 Emby / 预取，或预取失败时返回 None（逐条查询）
+        """
+        if not (self._use_emby and self._emby and self._emby_prefetch):
+            return None
+        try:
+            return self._emby.build_library_index()
+        except Exception as e:
+            logger.warning("PlexToolbox Emby 全库预取失败，改为逐条查询: %s", e)
+            return None
+
+    def _flush_chunk(
+        self, chunk: List[Dict[str, Any]], summary: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        按字节上限细分后逐块写入，繁忙退避由调度器处理，仍失败的块放入待写队列，结果计入汇总。
+
+        :param chunk: 本块 payload（已去掉 source 字段）
+        :param summary: 当前汇总（就地更新）
+        :return: 最后一次 helper.write_batch 返回值
+        """
+        res: Optional[Dict[str, Any]] = None
+        for sub in self._writer.split(chunk):
+            res = self._writer.send(sub)
+            if res is None or res.get("busy"):
+                if res is not None:
+                    summary["helper_busy"] = True
+                queued = self._writer.defer(sub)
+                summary["write_queued"] += queued
+                summary["write_failed"] += len(sub) - queued
+                summary["chunks_failed"] += 1
+            else:
+                ok = res.get("ok", 0)
+                summary["written_ok"] += ok
+                summary["write_failed"] += len(sub) - ok
+                summary["write_unchanged"] += self._count_unchanged(res)
+                summary["chunks_written"] += 1
+        return res
+
+    @staticmethod
+    def _count_unchanged(res: Dict[str, Any]) -> int:
+        """
+        统计 helper 逐条结果中内容未变、未产生写入的条数。
+
+        :param res: helper.write_batch 返回值
+        :return: unchanged 条数
+        """
+        return sum(
+            1 for r in res.get("results") or [] if r.get("success") and r.get("unchanged")
+        )
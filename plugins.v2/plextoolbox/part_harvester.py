@@ -0,0 +1,247 @@
+"""元数据响应的增量 Part 抽取：边转发边解析，不缓存整包响应体。"""
+
+from json import loads
+from typing import Any, List, Optional, Tuple
+from xml.etree.ElementTree import Element, ParseError, XMLPullParser
+
+from app.log import logger
+
+try:
+    import ijson
+except Exception:
+    ijson = None
+    logger.warning("PlexToolbox 未安装 ijson，JSON 元数据响应将整包缓冲后再解析 Part")
+
+# (part_key, file_path, rating_key)
+PartTuple = Tuple[str, str, str]
+
+
+class StreamingPartHarvester:
+    """
+    从分块到达的 Plex 元数据响应中增量抽取 Part 的 (key, file, ratingKey)。
+
+    XML 用 XMLPullParser 增量解析，元素处理完即释放；JSON 在安装了 ijson 时用其
+    事件流解析，未安装时退回整包缓冲后解析（行为与旧逻辑一致）。
+    解析失败只影响 Part 缓存，不影响响应转发。
+    """
+
+    def __init__(self, content_type: str) -> None:
+        """
+        按响应 Content-Type 选择解析方式。
+
+        :param content_type: 上游响应 Content-Type（已小写）
+        """
+        self.parts: List[PartTuple] = []
+        self.bytes_seen = 0
+        self._failed = False
+        self._mode = ""
+        self._xml: Optional[XMLPullParser] = None
+        self._json_coro: Any = None
+        self._json_events: Any = None
+        self._json_buffer: Optional[bytearray] = None
+        # XML：祖先元素与其 ratingKey 栈；JSON：当前 Metadata ratingKey 与 Part 字段
+        self._elem_stack: List[Element] = []
+        self._rating_stack: List[str] = []
+        self._json_rating_key = ""
+        self._json_part: Optional[dict] = None
+        if "application/json" in content_type:
+            self._mode = "json"
+            if ijson is not None:
+                self._json_events = ijson.sendable_list()
+                self._json_coro = ijson.parse_coro(self._json_events)
+            else:
+                self._json_buffer = bytearray()
+        elif "xml" in content_type:
+            self._mode = "xml"
+            self._xml = XMLPullParser(events=("start", "end"))
+
+    @property
+    def active(self) -> bool:
+        """是否仍在解析（不支持的类型或已解析失败时为 False）。"""
+        return bool(self._mode) and not self._failed
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        喂入一个响应分块。
+
+        :param chunk: 响应体分块
+        """
+        if not self.active or not chunk:
+            return
+        self.bytes_seen += len(chunk)
+        try:
+            if self._xml is not None:
+                self._xml.feed(chunk)
+                self._drain_xml()
+            elif self._json_coro is not None:
+                self._json_coro.send(chunk)
+                self._drain_json()
+            elif self._json_buffer is not None:
+                self._json_buffer.extend(chunk)
+        except Exception:
+            self._fail()
+
+    def close(self) -> List[PartTuple]:
+        """
+        结束解析并返回抽取到的全部 Part。
+
+        :return: (part_key, file_path, rating_key) 列表
+        """
+        if not self.active:
+            return self.parts
+        try:
+            if self._xml is not None:
+                self._xml.close()
+                self._drain_xml()
+            elif self._json_coro is not None:
+                self._json_coro.close()
+                self._drain_json()
+            elif self._json_buffer is not None:
+                self.parts.extend(extract_parts_from_json(loads(bytes(self._json_buffer))))
+                self._json_buffer = None
+        except Exception:
+            self._fail()
+        return self.parts
+
+    def _fail(self) -> None:
+        """标记解析失败并释放解析器状态。"""
+        logger.debug("增量解析元数据响应失败，跳过 Part 缓存", exc_info=True)
+        self._failed = True
+        self._xml = None
+        self._elem_stack = []
+        self._json_coro = None
+        self._json_buffer = None
+
+    def _drain_xml(self) -> None:
+        """消费 XMLPullParser 已就绪的事件。"""
+        for event, elem in self._xml.read_events():
+            if event == "start":
+                self._elem_stack.append(elem)
+                rating_key = elem.get("ratingKey") or (
+                    self._rating_stack[-1] if self._rating_stack else ""
+                )
+                self._rating_stack.append(rating_key)
+                if elem.tag == "Part" and rating_key:
+                    key = elem.get("key")
+                    file_path = elem.get("file")
+                    if key and file_path:
+                        self.parts.append((key, file_path, str(rating_key)))
+            else:
+                if self._rating_stack:
+                    self._rating_stack.pop()
+                if self._elem_stack:
+                    self._elem_stack.pop()
+                # 已处理完的子树立即释放并从父元素摘除，峰值内存与响应大小无关
+                elem.clear()
+                if self._elem_stack:
+                    self._elem_stack[-1].remove(elem)
+
+    def _drain_json(self) -> None:
+        """消费 ijson 已就绪的 (prefix, event, value) 事件。"""
+        for prefix, event, value in self._json_events:
+            if event == "start_map":
+                if prefix.endswith("Part.item"):
+                    self._json_part = {}
+            elif event == "end_map":
+                if prefix.endswith("Part.item") and self._json_part is not None:
+                    key = self._json_part.get("key")
+                    file_path = self._json_part.get("file")
+                    if isinstance(key, str) and isinstance(file_path, str):
+                        self.parts.append((key, file_path, self._json_rating_key))
+                    self._json_part = None
+                elif prefix.endswith("Metadata.item"):
+                    self._json_rating_key = ""
+            elif prefix.endswith("Metadata.item.ratingKey"):
+                self._json_rating_key = str(value or "")
+            elif self._json_part is not None and (
+                prefix.endswith("Part.item.key") or prefix.endswith("Part.item.file")
+            ):
+                self._json_part[prefix.rsplit(".", 1)[1]] = value
+        del self._json_events[:]
+
+
+def extract_parts_from_json(data: Any) -> List[PartTuple]:
+    """
+    从 Plex JSON 响应的 MediaContainer 中抽取所有 Part 的 (key, file, ratingKey)
+
+    :param data: Plex API JSON 响应
+    :return: (part_key, file_path, rating_key) 列表
+    """
+    result: List[PartTuple] = []
+    if not isinstance(data, dict):
+        return result
+    container = data.get("MediaContainer")
+    if not isinstance(container, dict):
+        return result
+    metadata_arr: List[dict] = []
+    hubs = container.get("Hub")
+    if isinstance(hubs, list):
+        for hub in hubs:
+            if isinstance(hub, dict) and isinstance(hub.get("Metadata"), list):
+                metadata_arr.extend(
+                    m for m in hub["Metadata"] if isinstance(m, dict)
+                )
+    if isinstance(container.get("Metadata"), list):
+        metadata_arr.extend(
+            m for m in container["Metadata"] if isinstance(m, dict)
+        )
+    for metadata in metadata_arr:
+        rating_key = str(metadata.get("ratingKey") or "")
+        media_list = metadata.get("Media")
+        if not isinstance(media_list, list):
+            continue
+        for media in media_list:
+            if not isinstance(media, dict):
+                continue
+            parts = media.get("Part")
+            if not isinstance(parts, list):
+                continue
+            for part in parts:
+                if not isinstance(part, dict):
+                    continue
+                key = part.get("key")
+                file_path = part.get("file")
+                if isinstance(key, str) and isinstance(file_path, str):
+                    result.append((key, file_path, rating_key))
+    return result
+
+
+def extract_parts_from_xml(text: str) -> List[PartTuple]:
+    """
+    从 Plex XML 响应中抽取所有 Part 的 (key, file, ratingKey)
+
+    :param text: XML 文本
+    :return: (part_key, file_path, rating_key) 列表
+    """
+    from xml.etree import ElementTree
+
+    result: List[PartTuple] = []
+    try:
+        root = ElementTree.fromstring(text)
+    except ParseError:
+        return result
+    for metadata in root.iter():
+        rating_key = metadata.get("ratingKey") or ""
+        if not rating_key:
+            continue
+        for part in metadata.iter("Part"):
+            key = part.get("key")
+            file_path = part.get("file")
+            if key and file_path:
+                result.append((key, file_path, str(rating_key)))
+    return result
+
+
+def parse_parts_body(content_type: str, body: bytes) -> List[PartTuple]:
+    """
+    按 Content-Type 解析整包元数据响应体并抽取 Part（可在工作线程中调用）
+
+    :param content_type: 响应 Content-Type（已小写）
+    :param body: 响应体字节串
+    :return: (part_key, file_path, rating_key) 列表
+    """
+    if "application/json" in content_type:
+        return extract_parts_from_json(loads(body))
+    if "xml" in content_type:
+        return extract_parts_from_xml(body.decode("utf-8", errors="replace"))
+    return []
@@ -0,0 +1,196 @@
+"""302 代理 Part 解析结果的持久化索引：代理重启后预热内存缓存，消除首播冷启动。"""
+
+import sqlite3
+from queue import Empty, Queue
+from threading import Thread
+from time import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+# 后台写线程每批最多合并的记录数
+PART_INDEX_FLUSH_BATCH = 500
+# 后台写线程等待新记录的最长时间（秒），到点即刷盘
+PART_INDEX_FLUSH_INTERVAL_SECONDS = 2.0
+# 索引保留的最大行数，超出时按更新时间淘汰最旧的行
+PART_INDEX_MAX_ROWS = 50000
+# 索引行最长保留时间（秒）：超过则视为陈旧，启动时不再加载并清理
+PART_INDEX_MAX_AGE_SECONDS = 7 * 86400
+
+# file_at / strm_at 分别记录 Part 路径与 STRM 地址最近一次确认的时间，
+# updated_at 为两者中较新的一个，用于清理陈旧行
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS part_index (
+    part_key   TEXT PRIMARY KEY,
+    file       TEXT,
+    rating_key TEXT,
+    strm_url   TEXT,
+    updated_at REAL NOT NULL,
+    file_at    REAL,
+    strm_at    REAL
+);
+CREATE INDEX IF NOT EXISTS idx_part_index_updated ON part_index(updated_at);
+"""
+
+# 旧版索引库缺少的列（启动时补齐，旧行的时间回退到 updated_at）
+_ADDED_COLUMNS = (("file_at", "REAL"), ("strm_at", "REAL"))
+
+# COALESCE 保证只更新本次带值的列，Part 路径与 STRM 地址分别写入互不覆盖
+_UPSERT_SQL = """
+INSERT INTO part_index (part_key, file, rating_key, strm_url, updated_at, file_at, strm_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(part_key) DO UPDATE SET
+    file = COALESCE(excluded.file, part_index.file),
+    rating_key = COALESCE(excluded.rating_key, part_index.rating_key),
+    strm_url = COALESCE(excluded.strm_url, part_index.strm_url),
+    updated_at = MAX(excluded.updated_at, part_index.updated_at),
+    file_at = COALESCE(excluded.file_at, part_index.file_at),
+    strm_at = COALESCE(excluded.strm_at, part_index.strm_at)
+"""
+
+
+class PartIndex:
+    """
+    基于 SQLite 的 Part.key -> (文件路径, ratingKey, STRM 地址) 索引。
+
+    写入只进内存队列，由单个后台线程批量合并落盘，热路径不做任何磁盘 IO；
+    代理启动时一次性读出最近的记录灌入内存缓存。
+    """
+
+    def __init__(self, db_path: str) -> None:
+        """
+        初始化索引并启动后台写线程。
+
+        :param db_path: SQLite 文件路径（位于插件数据目录下）
+        """
+        self._db_path = db_path
+        self._queue: "Queue[Optional[Tuple[Any, ...]]]" = Queue()
+        self._writer = Thread(target=self._write_loop, name="plextoolbox-part-index", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开索引库连接并确保表结构存在。"""
+        conn = sqlite3.connect(self._db_path, timeout=10.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(part_index)")}
+        for name, decl in _ADDED_COLUMNS:
+            if name not in columns:
+                conn.execute(f"ALTER TABLE part_index ADD COLUMN {name} {decl}")
+        return conn
+
+    def load(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        读取最近更新的索引记录，并顺带清理陈旧/超量的行（阻塞调用，需在线程中执行）。
+
+        :param limit: 最多读取的记录数（通常等于内存缓存容量）
+        :return: [{part_key, file, rating_key, strm_url, file_at, strm_at}]，按更新时间从旧到新排列
+        """
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            logger.warning("Part 索引打开失败 %s: %s", self._db_path, e)
+            return []
+        try:
+            conn.execute(
+                "DELETE FROM part_index WHERE updated_at < ?",
+                (time() - PART_INDEX_MAX_AGE_SECONDS,),
+            )
+            conn.execute(
+                "DELETE FROM part_index WHERE part_key NOT IN ("
+                "SELECT part_key FROM part_index ORDER BY updated_at DESC LIMIT ?)",
+                (PART_INDEX_MAX_ROWS,),
+            )
+            conn.commit()
+            rows = conn.execute(
+                "SELECT part_key, file, rating_key, strm_url, "
+                "COALESCE(file_at, updated_at), COALESCE(strm_at, updated_at) FROM part_index "
+                "ORDER BY updated_at DESC LIMIT ?",
+                (max(0, int(limit)),),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Part 索引读取失败: %s", e)
+            return []
+        finally:
+            conn.close()
+        # 旧在前、新在后：依次写入 LRU 缓存时最新的记录留在队尾
+        return [
+            {
+                "part_key": r[0],
+                "file": r[1],
+                "rating_key": r[2],
+                "strm_url": r[3],
+                "file_at": r[4],
+                "strm_at": r[5],
+            }
+            for r in reversed(rows)
+        ]
+
+    def record_part(self, part_key: str, file_path: str, rating_key: str = "") -> None:
+        """
+        记录 Part 路径映射（非阻塞，进入后台写队列）；映射未变时调用即刷新其确认时间。
+
+        :param part_key: Part key 路径，如 /library/parts/1/2/file
+        :param file_path: 媒体文件真实路径
+        :param rating_key: 条目 ratingKey
+        """
+        if part_key and file_path:
+            now = time()
+            self._queue.put((part_key, file_path, rating_key or None, None, now, now, None))
+
+    def record_strm(self, part_path: str, strm_url: str) -> None:
+        """
+        记录 STRM 内容解析结果（非阻塞，进入后台写队列）。
+
+        :param part_path: Part key 路径
+        :param strm_url: STRM 指向的远程地址
+        """
+        if part_path and strm_url:
+            now = time()
+            self._queue.put((part_path, None, None, strm_url, now, None, now))
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        通知后台线程刷完剩余记录并退出（阻塞调用）。
+
+        :param timeout: 等待后台线程结束的最长秒数
+        """
+        self._queue.put(None)
+        self._writer.join(timeout=timeout)
+
+    def _write_loop(self) -> None:
+        """后台写线程：合并队列中的记录，按批次 upsert 落盘。"""
+        conn: Optional[sqlite3.Connection] = None
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=PART_INDEX_FLUSH_INTERVAL_SECONDS)
+            except Empty:
+                continue
+            batch = []
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= PART_INDEX_FLUSH_BATCH:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except Empty:
+                    break
+            if not batch:
+                continue
+            try:
+                if conn is None:
+                    conn = self._connect()
+                conn.executemany(_UPSERT_SQL, batch)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.debug("Part 索引写入失败（%s 条）: %s", len(batch), e)
+                if conn is not None:
+                    conn.close()
+                conn = None
+        if conn is not None:
+            conn.close()
@@ -2,28 +2,71 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from asyncio import gather
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 from urllib.parse import quote
 
-from httpx import Client
+from httpx import AsyncClient, Client
 
 from app.log import logger
 
+from .http_pool import RateLimiter, send
+
+# 分区枚举默认并发请求数
+DEFAULT_ENUM_IN_FLIGHT = 6
+# 批量枚举每页条数（X-Plex-Container-Size）
+DEFAULT_ENUM_PAGE_SIZE = 500
+# 一次 /library/metadata/{k1,k2,...} 请求最多合并的 ratingKey 数
+METADATA_BATCH_SIZE = 50
+# 分区类型 -> 叶子条目类型（/all?type=）：电影 1，单集 4
+_LEAF_TYPES = {"movie": 1, "show": 4}
+
 
 class PlexClient:
     """封装 Plex 服务器只读查询，用于枚举需要补全媒体信息的 STRM 条目。"""
 
-    def __init__(self, base_url: str, token: str, timeout: float = 30.0) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        timeout: float = 30.0,
+        session: Optional[Client] = None,
+        max_in_flight: int = DEFAULT_ENUM_IN_FLIGHT,
+        rate_limit: float = 0.0,
+        bulk_enum: bool = True,
+        page_size: int = DEFAULT_ENUM_PAGE_SIZE,
+    ) -> None:
         """
         初始化 Plex 客户端。
 
         :param base_url: Plex 服务器根地址（可直连真实后端，如 http://192.168.0.122:32400）
         :param token: X-Plex-Token
         :param timeout: 请求超时秒数
+        :param session: 插件共享的长连接会话；为 None 时每次请求新建连接
+        :param max_in_flight: 分区枚举时的最大并发请求数
+        :param rate_limit: 对该 Plex 主机的每秒最大请求数，<=0 不限速
+        :param bulk_enum: 是否优先用分页批量接口枚举叶子条目（失败时退回逐层遍历）
+        :param page_size: 批量枚举每页条数
         """
         self._base = base_url.rstrip("/")
         self._token = token
         self._timeout = timeout
+        self._session = session
+        self._max_in_flight = max(1, max_in_flight)
+        self._limiter = RateLimiter(rate_limit)
+        self._bulk_enum = bulk_enum
+        self._page_size = max(1, page_size)
+
+    def _url(self, path: str) -> str:
+        """
+        拼接带 token 的完整请求地址。
+
+        :param path: 相对路径（含查询串）
+        :return: 完整 URL
+        """
+        sep = "&" if "?" in path else "?"
+        return f"{self._base}{path}{sep}X-Plex-Token={quote(self._token, safe='')}"
 
     def _get(self, path: str) -> Optional[dict]:
         """
@@ -32,14 +75,37 @@ class PlexClient:
         :param path: 相对路径（含查询串）
         :return: 解析后的 JSON，失败返回 None
         """
-        sep = "&" if "?" in path else "?"
-        url = f"{self._base}{path}{sep}X-Plex-Token={quote(self._token, safe='')}"
+        url = self._url(path)
+        self._limiter.acquire()
+        try:
+            resp = send(
+                self._session, "GET", url, self._timeout,
+                headers={"Accept": "application/json"},
+            )
+            if resp.status_code == 200:
+                return resp.json()
+            logger.warning("Plex API %s 返回 %s", path, resp.status_code)
+        except Exception as e:
+            logger.warning("Plex API 请求失败 %s: %s", path, e)
+        return None
+
+    async def _aget(self, client: AsyncClient, path: str) -> Optional[dict]:
+        """
+        异步发起 GET 请求并解析 JSON（复用调用方的连接池）。
+
+        :param client: 共享的 httpx AsyncClient
+        :param path: 相对路径（含查询串）
+        :return: 解析后的 JSON，失败返回 None
+        """
         try:
-            with Client(timeout=self._timeout) as client:
-                resp = client.get(url, headers={"Accept": "application/json"})
-                if resp.status_code == 200:
-                    return resp.json()
-                logger.warning("Plex API %s 返回 %s", path, resp.status_code)
+            resp = await client.get(
+                self._url(path),
+                headers={"Accept": "application/json"},
+                timeout=self._timeout,
+            )
+            if resp.status_code == 200:
+                return resp.json()
+            logger.warning("Plex API %s 返回 %s", path, resp.status_code)
         except Exception as e:
             logger.warning("Plex API 请求失败 %s: %s", path, e)
         return None
@@ -51,14 +117,15 @@ class PlexClient:
         :param path: 相对路径（含查询串）
         :return: 2xx 返回 True
         """
-        sep = "&" if "?" in path else "?"
-        url = f"{self._base}{path}{sep}X-Plex-Token={quote(self._token, safe='')}"
+        url = self._url(path)
         try:
-            with Client(timeout=self._timeout) as client:
-                resp = client.put(url, headers={"Accept": "application/json"})
-                if 200 <= resp.status_code < 300:
-                    return True
-                logger.warning("Plex PUT %s 返回 %s", path, resp.status_code)
+            resp = send(
+                self._session, "PUT", url, self._timeout,
+                headers={"Accept": "application/json"},
+            )
+            if 200 <= resp.status_code < 300:
+                return True
+            logger.warning("Plex PUT %s 返回 %s", path, resp.status_code)
         except Exception as e:
             logger.warning("Plex PUT 请求失败 %s: %s", path, e)
         return False
@@ -131,6 +198,12 @@ class PlexClient:
         """
         metas: List[Dict[str, Any]] = []
         if item_type == "show":
+            # allLeaves 只取第一集，一次请求即可拿到 Part 路径
+            page = self._get_page(f"/library/metadata/{rating_key}/allLeaves", 0, 1)
+            for meta in page[0] if page else []:
+                for p in self._extract_parts(meta):
+                    if p.get("file"):
+                        return p["file"]
             for season in self._children(rating_key):
                 skey = season.get("ratingKey")
                 if not skey:
@@ -208,6 +281,106 @@ class PlexClient:
             return []
         return data.get("MediaContainer", {}).get("Metadata", [])
 
+    def _get_page(
+        self, path: str, start: int, size: int
+    ) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        """
+        分页请求 Metadata 列表（X-Plex-Container-Start/Size）。
+
+        :param path: 相对路径（可含查询串）
+        :param start: 起始偏移
+        :param size: 本页条数
+        :return: (本页 Metadata 列表, 总条数)，失败返回 None；总条数未知时为 -1
+        """
+        sep = "&" if "?" in path else "?"
+        data = self._get(
+            f"{path}{sep}X-Plex-Container-Start={start}&X-Plex-Container-Size={size}"
+        )
+        if not data:
+            return None
+        container = data.get("MediaContainer", {})
+        try:
+            total = int(container.get("totalSize"))
+        except (TypeError, ValueError):
+            total = -1
+        return container.get("Metadata", []) or [], total
+
+    @staticmethod
+    def _batch_paths(keys: List[str]) -> List[Tuple[List[str], str]]:
+        """
+        把 ratingKey 列表切成若干合并请求路径 /library/metadata/{k1,k2,...}。
+
+        :param keys: ratingKey 列表
+        :return: [(本批 keys, 请求路径)]
+        """
+        return [
+            (keys[i:i + METADATA_BATCH_SIZE],
+             "/library/metadata/" + ",".join(keys[i:i + METADATA_BATCH_SIZE]))
+            for i in range(0, len(keys), METADATA_BATCH_SIZE)
+        ]
+
+    @staticmethod
+    def _order_by_keys(
+        keys: List[str], metas: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str]]:
+        """
+        按 ratingKey 归组合并请求的结果，并找出未返回的 key。
+
+        :param keys: 请求的 ratingKey 列表
+        :param metas: 合并请求返回的 Metadata 列表
+        :return: (ratingKey -> Metadata 列表, 缺失的 ratingKey 列表)
+        """
+        by_key: Dict[str, List[Dict[str, Any]]] = {}
+        for m in metas:
+            by_key.setdefault(str(m.get("ratingKey") or ""), []).append(m)
+        return by_key, [k for k in keys if k not in by_key]
+
+    def _metadata_many(self, keys: List[str]) -> List[Dict[str, Any]]:
+        """
+        批量获取多个条目的详情 Metadata（含 Stream），顺序与 keys 一致。
+
+        以逗号拼接 ratingKey 合并为一次请求；合并请求失败或漏返回的条目
+        再逐条请求兜底。
+
+        :param keys: ratingKey 列表
+        :return: Metadata 列表
+        """
+        by_key: Dict[str, List[Dict[str, Any]]] = {}
+        for batch, path in self._batch_paths(keys):
+            data = self._get(path)
+            metas = data.get("MediaContainer", {}).get("Metadata", []) if data else []
+            got, missing = self._order_by_keys(batch, metas)
+            by_key.update(got)
+            for k in missing:
+                by_key[k] = self._metadata(k)
+        return [m for k in keys for m in by_key.get(k, [])]
+
+    async def _metadata_many_async(
+        self, client: AsyncClient, keys: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        _metadata_many 的异步版本（兜底的逐条请求并发执行）。
+
+        :param client: 共享的 httpx AsyncClient
+        :param keys: ratingKey 列表
+        :return: Metadata 列表
+        """
+        by_key: Dict[str, List[Dict[str, Any]]] = {}
+        missing: List[str] = []
+        for batch, path in self._batch_paths(keys):
+            data = await self._aget(client, path)
+            metas = data.get("MediaContainer", {}).get("Metadata", []) if data else []
+            got, lost = self._order_by_keys(batch, metas)
+            by_key.update(got)
+            missing.extend(lost)
+        if missing:
+            by_key.update(
+                zip(missing, await gather(
+                    *(self.metadata_async(client, k) for k in missing)
+                ))
+            )
+        return [m for k in keys for m in by_key.get(k, [])]
+
     @staticmethod
     def _build_label(metadata: Dict[str, Any]) -> str:
         """
@@ -240,12 +413,44 @@ class PlexClient:
         metas = self._metadata(rating_key)
         return self._build_label(metas[0]) if metas else ""
 
+    @staticmethod
+    def meta_label(metadata: Dict[str, Any]) -> str:
+        """
+        由已取到的条目 Metadata 构建可读标签（免去再次请求）。
+
+        :param metadata: 条目 Metadata
+        :return: 标签字符串
+        """
+        return PlexClient._build_label(metadata)
+
     def item_section_key(self, rating_key: str) -> str:
         """返回单个条目所属的 Plex 媒体库 key。"""
         metas = self._metadata(rating_key)
         if not metas:
             return ""
-        meta = metas[0]
+        return self.meta_section_key(metas[0])
+
+    async def metadata_async(self, client: AsyncClient, rating_key: str) -> List[Dict[str, Any]]:
+        """
+        异步获取条目元数据的 Metadata 数组。
+
+        :param client: 共享的 httpx AsyncClient
+        :param rating_key: 条目 ratingKey
+        :return: Metadata 列表
+        """
+        data = await self._aget(client, f"/library/metadata/{rating_key}")
+        if not data:
+            return []
+        return data.get("MediaContainer", {}).get("Metadata", [])
+
+    @staticmethod
+    def meta_section_key(meta: Dict[str, Any]) -> str:
+        """
+        从条目 Metadata 中取所属媒体库 key。
+
+        :param meta: 条目 Metadata
+        :return: 媒体库 key，取不到返回空串
+        """
         return str(
             meta.get("librarySectionID")
             or meta.get("librarySectionKey")
@@ -299,24 +504,178 @@ class PlexClient:
         :param only_missing: 是否仅返回缺失媒体信息的 part
         :return: STRM part 列表
         """
-        parts: List[Dict[str, Any]] = []
-        for item in self._iter_section_items(section_key):
-            rating_key = item["rating_key"]
-            itype = item.get("type")
-            if itype in ("show",):
-                # 剧集：show -> season -> episode
-                for season in self._children(rating_key):
-                    skey = season.get("ratingKey")
-                    if not skey:
-                        continue
-                    for episode in self._children(skey):
-                        parts.extend(self._collect_from_meta(episode, only_missing))
-            else:
-                for meta in self._metadata(rating_key):
-                    parts.extend(
-                        self._collect_from_meta(meta, only_missing, detailed=True)
-                    )
-        return parts
+        return list(self.iter_strm_parts(section_key, only_missing))
+
+    def iter_strm_parts(
+        self,
+        section_key: str,
+        only_missing: bool = True,
+        max_in_flight: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        边发现边产出分区下的 STRM part（顺序不保证）。
+
+        电影 / 剧集分区优先用 /all?type= 分页批量列出全部叶子条目，请求数约为
+        条目数 / page_size；批量接口不可用或中途失败时退回并发逐层遍历，
+        已产出的 part 不会重复产出。
+
+        :param section_key: 分区 key
+        :param only_missing: 是否仅返回缺失媒体信息的 part
+        :param max_in_flight: 逐层遍历的最大并发请求数，缺省用客户端配置
+        :return: STRM part 迭代器
+        """
+        leaf_type = _LEAF_TYPES.get(self.section_type(section_key)) if self._bulk_enum else None
+        if leaf_type is None:
+            yield from self._walk_strm_parts(section_key, only_missing, max_in_flight)
+            return
+        seen: Set[Any] = set()
+        completed = yield from self._iter_leaf_parts(
+            section_key, leaf_type, only_missing, seen
+        )
+        if completed:
+            return
+        logger.warning(
+            "PlexToolbox 分区 %s 批量枚举失败（已产出 %s 个 part），退回逐层遍历",
+            section_key, len(seen),
+        )
+        for part in self._walk_strm_parts(section_key, only_missing, max_in_flight):
+            if part["part_id"] not in seen:
+                yield part
+
+    def _iter_leaf_parts(
+        self,
+        section_key: str,
+        leaf_type: int,
+        only_missing: bool,
+        seen: Set[Any],
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        分页批量列出分区叶子条目并产出 STRM part。
+
+        列表接口的 Part 不含 Stream，无法区分「已补全」与「有时长但流被 Plex 清空」。
+        only_missing 时，本页中有时长、流数未知的 STRM 条目按 ratingKey 合并请求详情，
+        再按详情数据规则过滤（同逐条 _metadata 路径）。
+
+        :param section_key: 分区 key
+        :param leaf_type: 叶子条目类型（1 电影 / 4 单集）
+        :param only_missing: 是否仅返回缺失媒体信息的 part
+        :param seen: 已产出的 part_id 集合（就地更新，供退回遍历时去重）
+        :return: STRM part 迭代器；生成器返回值表示是否完整枚举
+        """
+        path = f"/library/sections/{section_key}/all?type={leaf_type}"
+        start = 0
+        while True:
+            page = self._get_page(path, start, self._page_size)
+            if page is None:
+                return False
+            metas, total = page
+            for meta in self._detail_unknown_streams(metas, only_missing):
+                detailed = meta.pop("_detailed", False)
+                for part in self._collect_from_meta(meta, only_missing, detailed=detailed):
+                    seen.add(part["part_id"])
+                    yield part
+            start += len(metas)
+            if len(metas) < self._page_size or 0 <= total <= start:
+                return True
+
+    def _detail_unknown_streams(
+        self, metas: List[Dict[str, Any]], only_missing: bool
+    ) -> List[Dict[str, Any]]:
+        """
+        把列表数据中「有时长但流数未知」的 STRM 条目换成详情数据。
+
+        换入的详情 Metadata 带 _detailed 标记；合并请求拿不到详情的条目保留列表数据。
+
+        :param metas: 列表接口返回的 Metadata
+        :param only_missing: 是否仅处理缺失媒体信息的条目；为 False 时原样返回
+        :return: Metadata 列表
+        """
+        if not only_missing:
+            return metas
+        keys = [
+            str(meta["ratingKey"])
+            for meta in metas
+            if meta.get("ratingKey")
+            and any(
+                p["existing_duration"] and p["existing_streams"] is None
+                for p in self._extract_parts(meta)
+                if (p.get("file") or "").lower().endswith(".strm")
+            )
+        ]
+        if not keys:
+            return metas
+        detailed: Dict[str, List[Dict[str, Any]]] = {}
+        for m in self._metadata_many(keys):
+            detailed.setdefault(str(m.get("ratingKey") or ""), []).append(
+                {**m, "_detailed": True}
+            )
+        out: List[Dict[str, Any]] = []
+        for meta in metas:
+            out.extend(detailed.get(str(meta.get("ratingKey") or "")) or [meta])
+        return out
+
+    def _walk_strm_parts(
+        self,
+        section_key: str,
+        only_missing: bool = True,
+        max_in_flight: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        并发遍历分区条目树，边发现边产出 STRM part（顺序不保证）。
+
+        show -> season -> episode 各层请求放进有界线程池并发执行，任一请求完成
+        即展开其子节点；待处理的顶层条目按需补充，在途请求数不超过 max_in_flight。
+        请求速率受客户端 rate_limit 约束。提前停止迭代时未开始的请求会被取消。
+
+        :param section_key: 分区 key
+        :param only_missing: 是否仅返回缺失媒体信息的 part
+        :param max_in_flight: 最大并发请求数，缺省用客户端配置
+        :return: STRM part 迭代器
+        """
+        limit = max(1, max_in_flight or self._max_in_flight)
+        items = iter(self._iter_section_items(section_key))
+
+        def fetch(kind: str, rating_key: str) -> Tuple[str, List[Dict[str, Any]]]:
+            """show/season 取子项，其余条目取详情。"""
+            if kind in ("show", "season"):
+                return kind, self._children(rating_key)
+            return kind, self._metadata(rating_key)
+
+        pending: Set[Future] = set()
+        with ThreadPoolExecutor(
+            max_workers=limit, thread_name_prefix="plextoolbox-enum"
+        ) as pool:
+            try:
+                while True:
+                    # 只在在途请求不足时才展开新的顶层条目，内存随并发数而非库大小增长
+                    while len(pending) < limit:
+                        item = next(items, None)
+                        if item is None:
+                            break
+                        kind = "show" if item.get("type") == "show" else "item"
+                        pending.add(pool.submit(fetch, kind, item["rating_key"]))
+                    if not pending:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        kind, metas = fut.result()
+                        if kind == "show":
+                            for season in metas:
+                                if season.get("ratingKey"):
+                                    pending.add(
+                                        pool.submit(fetch, "season", season["ratingKey"])
+                                    )
+                        elif kind == "season":
+                            for episode in metas:
+                                yield from self._collect_from_meta(episode, only_missing)
+                        else:
+                            for meta in metas:
+                                yield from self._collect_from_meta(
+                                    meta, only_missing, detailed=True
+                                )
+            finally:
+                for fut in pending:
+                    fut.cancel()
 
     def collect_strm_parts_by_rating_key(
         self, rating_key: str, only_missing: bool = True
@@ -377,7 +736,93 @@ class PlexClient:
             # 缺少定位信息时退化为仅当前集
             return self._collect_from_meta(meta, only_missing, detailed=True)
 
-        siblings = self._children(season_key)
+        window = self._episode_window(meta, self._children(season_key), forward)
+        current_key = meta.get("ratingKey")
+        # 当前集详情已在手，其余各集合并为一次批量详情请求
+        keys = [str(e["ratingKey"]) for e in window if e.get("ratingKey")]
+        fetched = self._metadata_many([k for k in keys if k != str(current_key)])
+        parts = []
+        for m in self._merge_window(keys, current_key, metas, fetched):
+            parts.extend(self._collect_from_meta(m, only_missing, detailed=True))
+        return parts
+
+    async def collect_window_parts_async(
+        self,
+        client: AsyncClient,
+        metas: List[Dict[str, Any]],
+        forward: int = 5,
+        only_missing: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        collect_window_parts_by_rating_key 的异步版本（规则相同）。
+
+        直接使用调用方已取到的当前条目元数据，窗口内其余各集的详情并发请求。
+
+        :param client: 共享的 httpx AsyncClient
+        :param metas: 当前条目 /library/metadata/{rk} 的 Metadata 列表
+        :param forward: 单集场景下向后预取的集数
+        :param only_missing: 是否仅返回缺失媒体信息的 part
+        :return: 窗口内待补全的 STRM part 列表
+        """
+        if not metas:
+            return []
+        meta = metas[0]
+        if meta.get("type") != "episode":
+            parts: List[Dict[str, Any]] = []
+            for m in metas:
+                parts.extend(self._collect_from_meta(m, only_missing, detailed=True))
+            return parts
+        season_key = meta.get("parentRatingKey")
+        if not season_key or meta.get("index") is None:
+            return self._collect_from_meta(meta, only_missing, detailed=True)
+        data = await self._aget(client, f"/library/metadata/{season_key}/children")
+        siblings = data.get("MediaContainer", {}).get("Metadata", []) if data else []
+        window = self._episode_window(meta, siblings, forward)
+        current_key = meta.get("ratingKey")
+        # 当前集详情已在手，其余各集合并为一次批量详情请求
+        keys = [str(e["ratingKey"]) for e in window if e.get("ratingKey")]
+        fetched = await self._metadata_many_async(
+            client, [k for k in keys if k != str(current_key)]
+        )
+        parts = []
+        for m in self._merge_window(keys, current_key, metas, fetched):
+            parts.extend(self._collect_from_meta(m, only_missing, detailed=True))
+        return parts
+
+    @staticmethod
+    def _merge_window(
+        keys: List[str],
+        current_key: Any,
+        current: List[Dict[str, Any]],
+        fetched: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """
+        按窗口顺序合并当前集与批量取回的各集详情。
+
+        :param keys: 窗口内各集 ratingKey（按集号排序）
+        :param current_key: 当前集 ratingKey
+        :param current: 当前集详情 Metadata 列表
+        :param fetched: 其余各集详情 Metadata 列表
+        :return: 按窗口顺序排列的 Metadata 列表
+        """
+        by_key: Dict[str, List[Dict[str, Any]]] = {str(current_key): current}
+        for m in fetched:
+            by_key.setdefault(str(m.get("ratingKey") or ""), []).append(m)
+        return [m for k in keys for m in by_key.get(k, [])]
+
+    @staticmethod
+    def _episode_window(
+        meta: Dict[str, Any], siblings: List[Dict[str, Any]], forward: int
+    ) -> List[Dict[str, Any]]:
+        """
+        按集号从同季各集中取「当前集 + 后 forward 集」窗口。
+
+        :param meta: 当前集 Metadata
+        :param siblings: 同季各集（children 接口）
+        :param forward: 向后预取的集数
+        :return: 窗口内各集 Metadata，取不到时仅含当前集
+        """
+        cur_index = meta.get("index")
         # 按集号排序，过滤出当前集及其后 forward 集
         indexed = [
             e for e in siblings
@@ -388,17 +833,7 @@ class PlexClient:
             e for e in indexed
             if cur_index <= e.get("index") <= cur_index + forward
         ]
-        if not window:
-            window = [meta]
-
-        parts = []
-        for e in window:
-            ek = e.get("ratingKey")
-            if not ek:
-                continue
-            for m in self._metadata(ek):
-                parts.extend(self._collect_from_meta(m, only_missing, detailed=True))
-        return parts
+        return window or [meta]
 
 
     def _collect_from_meta(
@@ -22,11 +22,12 @@ import re
 import shutil
 from typing import Any, Dict, List, Optional, Tuple
 
-from httpx import Client
+from httpx import Client, Response
 
 from app.core.config import settings
 from app.log import logger
 
+from .http_pool import HttpSessionPool
 from .plex_client import PlexClient
 
 # 剧根/影片级有效海报文件名（小写比较）；seasonXX-poster.jpg 不算
@@ -131,11 +132,12 @@ def _atomic_write(target: str, data: bytes) -> None:
 class TmdbPosterSource:
     """按「原产语言 → zh → 无字 → 任意」优先级从 TMDB 取海报。"""
 
-    def __init__(self, timeout: float = 30.0) -> None:
+    def __init__(self, timeout: float = 30.0, pool: Optional[HttpSessionPool] = None) -> None:
         """
         初始化 TMDB 海报源。
 
         :param timeout: 请求超时秒数
+        :param pool: 插件共享的 HTTP 会话池；为 None 时每次请求新建连接
         """
         self._api = f"https://{settings.TMDB_API_DOMAIN}/3"
         self._img = f"https://{settings.TMDB_IMAGE_DOMAIN}/t/p/original"
@@ -150,11 +152,25 @@ class TmdbPosterSource:
         except Exception:
             self._proxy = None
         self._timeout = timeout
+        self._pool = pool
 
     def _client(self) -> Client:
         """构建 httpx 客户端（httpx>=0.28 使用 proxy 参数）。"""
         return Client(timeout=self._timeout, proxy=self._proxy)
 
+    def _fetch(self, url: str) -> Response:
+        """
+        GET 请求：有会话池时复用 TMDB 长连接（API 与图片域名各自保活），否则临时建连。
+
+        :param url: 完整 URL
+        :return: 已读取响应体的 Response
+        """
+        session = self._pool.session("tmdb", proxy=self._proxy) if self._pool else None
+        if session is not None:
+            return session.get(url, timeout=self._timeout)
+        with self._client() as client:
+            return client.get(url)
+
     def _get_json(self, path: str) -> Optional[dict]:
         """
         GET TMDB API 并解析 JSON。
@@ -165,11 +181,10 @@ class TmdbPosterSource:
         sep = "&" if "?" in path else "?"
         url = f"{self._api}{path}{sep}api_key={self._key}"
         try:
-            with self._client() as client:
-                resp = client.get(url)
-                if resp.status_code == 200:
-                    return resp.json()
-                logger.warning("TMDB %s 返回 %s", path, resp.status_code)
+            resp = self._fetch(url)
+            if resp.status_code == 200:
+                return resp.json()
+            logger.warning("TMDB %s 返回 %s", path, resp.status_code)
         except Exception as exc:
             logger.warning("TMDB 请求失败 %s: %s", path, exc)
         return None
@@ -218,11 +233,10 @@ class TmdbPosterSource:
             return None
         url = f"{self._img}{file_path}"
         try:
-            with self._client() as client:
-                resp = client.get(url)
-                if resp.status_code == 200 and resp.content:
-                    return resp.content
-                logger.warning("TMDB 海报下载失败 %s: %s", url, resp.status_code)
+            resp = self._fetch(url)
+            if resp.status_code == 200 and resp.content:
+                return resp.content
+            logger.warning("TMDB 海报下载失败 %s: %s", url, resp.status_code)
         except Exception as exc:
             logger.warning("TMDB 海报下载异常 %s: %s", url, exc)
         return None
@@ -231,14 +245,15 @@ class TmdbPosterSource:
 class PosterFixer:
     """编排「缺 poster.jpg 扫描 + 补全 + Plex 刷新」流程。"""
 
-    def __init__(self, plex: PlexClient) -> None:
+    def __init__(self, plex: PlexClient, pool: Optional[HttpSessionPool] = None) -> None:
         """
         初始化。
 
         :param plex: Plex 客户端（直连）
+        :param pool: 插件共享的 HTTP 会话池
         """
         self._plex = plex
-        self._tmdb = TmdbPosterSource()
+        self._tmdb = TmdbPosterSource(pool=pool)
 
     def _media_dir(self, rating_key: str, itype: str) -> str:
         """
@@ -0,0 +1,172 @@
+"""302 代理 STRM 预热调度：有界优先级队列 + 固定并发工作协程 + 去重。"""
+
+from asyncio import CancelledError, PriorityQueue, Task, create_task, wait_for
+from itertools import count
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.log import logger
+
+# 预热来源优先级（数值越小越先处理）
+PRIORITY_PLAYQUEUE = 0
+PRIORITY_ON_DECK = 1
+PRIORITY_DETAIL = 2
+PRIORITY_SEASON = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_PLAYQUEUE: "playqueue",
+    PRIORITY_ON_DECK: "on_deck",
+    PRIORITY_DETAIL: "detail",
+    PRIORITY_SEASON: "season",
+}
+
+
+class PrewarmScheduler:
+    """
+    STRM 预热调度器。
+
+    元数据响应抽取到的 STRM Part 按来源优先级入队（播放队列 > 继续观看/On Deck >
+    详情页 > 季列表），由固定数量的工作协程依次解析；已在解析中（单飞）、已缓存或
+    已排队的 Part 不重复入队。队列满时丢弃新任务，绝不挤占起播热路径。
+    """
+
+    def __init__(
+        self,
+        resolver: Callable[[Any, str], Awaitable[Any]],
+        is_settled: Callable[[str], bool],
+        workers: int = 2,
+        max_pending: int = 200,
+        timeout: float = 10.0,
+    ) -> None:
+        """
+        初始化调度器（需在事件循环内调用 start 启动工作协程）。
+
+        :param resolver: 解析协程函数，参数为 (context, part_path)
+        :param is_settled: 判断 part_path 是否已缓存或正在解析，True 则跳过
+        :param workers: 并发工作协程数
+        :param max_pending: 队列中最多等待的任务数
+        :param timeout: 单个预热任务超时秒数
+        """
+        self._resolver = resolver
+        self._is_settled = is_settled
+        self._workers = max(1, workers)
+        self._max_pending = max(1, max_pending)
+        self._timeout = timeout
+        self._queue: Optional[PriorityQueue] = None
+        self._tasks: List[Task] = []
+        self._pending: Set[str] = set()
+        self._seq = count()
+        self._active = 0
+        self._dequeued = 0
+        self.submitted = 0
+        self.deduped = 0
+        self.dropped = 0
+        self.done = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._run_max = 0.0
+        self._by_priority: Dict[int, int] = {}
+
+    def start(self) -> None:
+        """创建队列并启动工作协程。"""
+        if self._tasks:
+            return
+        self._queue = PriorityQueue()
+        self._tasks = [create_task(self._worker()) for _ in range(self._workers)]
+
+    async def stop(self) -> None:
+        """取消全部工作协程并清空待处理任务。"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except CancelledError:
+                pass
+        self._tasks = []
+        self._pending.clear()
+
+    def submit(self, part_path: str, priority: int, context: Any) -> bool:
+        """
+        提交一个预热任务（非阻塞）。
+
+        :param part_path: Part key 路径
+        :param priority: 来源优先级，见 PRIORITY_*
+        :param context: 透传给 resolver 的上下文（触发预热的请求）
+        :return: 成功入队返回 True；重复、已缓存或队列满返回 False
+        """
+        if self._queue is None or not part_path:
+            return False
+        if part_path in self._pending or self._is_settled(part_path):
+            self.deduped += 1
+            return False
+        if len(self._pending) >= self._max_pending:
+            self.dropped += 1
+            return False
+        self._pending.add(part_path)
+        self.submitted += 1
+        self._by_priority[priority] = self._by_priority.get(priority, 0) + 1
+        self._queue.put_nowait(
+            (priority, next(self._seq), part_path, context, monotonic())
+        )
+        return True
+
+    async def _worker(self) -> None:
+        """工作协程：按优先级取任务并解析，失败静默。"""
+        while True:
+            _priority, _seq, part_path, context, enqueued = await self._queue.get()
+            started = monotonic()
+            wait = started - enqueued
+            self._dequeued += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._active += 1
+            try:
+                # 排队期间可能已被起播请求解析过，出队时再查一次
+                if self._is_settled(part_path):
+                    self.deduped += 1
+                    continue
+                try:
+                    await wait_for(self._resolver(context, part_path), self._timeout)
+                    self.done += 1
+                    logger.debug("STRM 预热完成: %s", part_path)
+                except CancelledError:
+                    raise
+                except Exception:
+                    self.failed += 1
+                    logger.debug("STRM 预热失败: %s", part_path, exc_info=True)
+                elapsed = monotonic() - started
+                self._run_total += elapsed
+                self._run_max = max(self._run_max, elapsed)
+            finally:
+                self._active -= 1
+                self._pending.discard(part_path)
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回预热队列统计。
+
+        :return: 队列深度、处理计数与排队/解析耗时（毫秒）
+        """
+        finished = self.done + self.failed
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "active": self._active,
+            "workers": self._workers,
+            "max_pending": self._max_pending,
+            "submitted": self.submitted,
+            "submitted_by_source": {
+                PRIORITY_NAMES.get(p, str(p)): n for p, n in self._by_priority.items()
+            },
+            "deduped": self.deduped,
+            "dropped": self.dropped,
+            "done": self.done,
+            "failed": self.failed,
+            "queue_wait_avg_ms": round(self._wait_total / self._dequeued * 1000, 1) if self._dequeued else None,
+            "queue_wait_max_ms": round(self._wait_max * 1000, 1),
+            "resolve_avg_ms": round(self._run_total / finished * 1000, 1) if finished else None,
+            "resolve_max_ms": round(self._run_max * 1000, 1),
+        }
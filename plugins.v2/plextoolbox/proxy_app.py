@@ -1,8 +1,20 @@
-from asyncio import Lock, create_task, gather, get_event_loop, to_thread, wait_for
+from asyncio import (
+    Lock,
+    Semaphore,
+    Task,
+    create_task,
+    gather,
+    get_event_loop,
+    get_running_loop,
+    shield,
+    to_thread,
+    wait,
+)
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from re import compile as re_compile
-from time import monotonic
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from time import monotonic, time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from urllib.parse import quote, urlparse
 
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
@@ -22,18 +34,66 @@ from websockets import connect
 
 from app.log import logger
 
+from .part_harvester import (
+    StreamingPartHarvester,
+    extract_parts_from_json,
+    parse_parts_body,
+)
+from .part_index import PartIndex
+from .prewarm import (
+    PRIORITY_DETAIL,
+    PRIORITY_ON_DECK,
+    PRIORITY_PLAYQUEUE,
+    PRIORITY_SEASON,
+    PrewarmScheduler,
+)
+from .proxy_metrics import ProxyMetrics, RouteTimingMiddleware
+from .ttl_cache import LruTtlCache
+
 # 直链解析结果缓存 TTL（秒）：缓存的是 STRM 内部地址/规则替换结果（稳定中间地址），可长缓存
 REDIRECT_URL_CACHE_TTL_SECONDS = 900
 # Part 路径缓存 TTL（秒）：来自元数据 API 的 Part.key -> file 映射
 PART_INFO_CACHE_TTL_SECONDS = 3600
+# Part 映射未变时刷新索引确认时间的间隔（秒）：映射持续被浏览时按此节流落盘
+PART_INDEX_TOUCH_INTERVAL_SECONDS = PART_INFO_CACHE_TTL_SECONDS / 2
 # 直链缓存最大条目数
 REDIRECT_URL_CACHE_MAX_SIZE = 500
 # Part 路径缓存最大条目数
 PART_INFO_CACHE_MAX_SIZE = 2000
+# 确认不可 302 的 Part（本地文件 / STRM 无可用地址）负缓存 TTL（秒）：短 TTL，避免重试与 Range 请求反复查上游
+NEGATIVE_CACHE_TTL_SECONDS = 60
+# 负缓存最大条目数
+NEGATIVE_CACHE_MAX_SIZE = 2000
+# 视为瞬时故障的上游状态码（另加全部 5xx），此类结果不记负缓存
+TRANSIENT_STATUS_CODES = frozenset({401, 403, 408, 429})
 # 详情页预热：响应中 Part 数不超过该值时才触发 STRM 预热（避免整库列表触发风暴）
 PREWARM_MAX_PARTS = 5
+# 各预热来源单个响应最多入队的 STRM Part 数
+PREWARM_SOURCE_LIMITS = {
+    PRIORITY_PLAYQUEUE: 20,
+    PRIORITY_ON_DECK: 30,
+    PRIORITY_DETAIL: PREWARM_MAX_PARTS,
+    PRIORITY_SEASON: 30,
+}
+# 预热并发工作协程数（与起播请求共享上游连接，保持较小）
+PREWARM_WORKERS = 2
+# 预热队列最多等待的任务数，超出丢弃
+PREWARM_MAX_PENDING = 200
+# 单个预热任务超时（秒）
+PREWARM_TIMEOUT_SECONDS = 15.0
+# 继续观看 / On Deck 类 hub 路径前缀
+ON_DECK_PATH_PREFIXES = (
+    "/hubs/home/continueWatching",
+    "/hubs/home/onDeck",
+    "/hubs/continueWatching",
+    "/library/onDeck",
+)
 # 热路径（起播关键路径）上游请求超时（秒）：收敛以避免拖慢起播
 HOT_PATH_TIMEOUT_SECONDS = 5.0
+# 元数据解析卸载阈值（字节）：响应体超过该大小后解析转到工作线程，避免阻塞事件循环
+PARSE_OFFLOAD_MIN_BYTES = 256 * 1024
+# 元数据解析工作线程数；排队中的解析任务上限为其 2 倍，超出时等待（背压）
+PARSE_WORKERS = 2
 
 # 非关键路径前缀：上游连接失败时静默降级为 DEBUG 日志（客户端高频轮询，失败无碍）
 SILENT_FAIL_PATH_PREFIXES = (
@@ -78,6 +138,33 @@ METADATA_PATH_PREFIXES = (
     "/status/sessions",
 )
 
+# 代理自身指标端点（不转发、不计时）
+METRICS_PATH = "/__proxy/metrics"
+
+
+def _route_family(path: str) -> Optional[str]:
+    """
+    按请求路径归类路由族，用于分路由延迟统计
+
+    :param path: 请求路径
+    :return: 路由族名；代理自身端点返回 None（不计时）
+    """
+    if path.startswith("/library/parts/"):
+        return "stream"
+    if path.startswith("/video/:/transcode/universal/start"):
+        return "transcode_start"
+    if path.startswith("/video/:/transcode/universal/decision"):
+        return "transcode_decision"
+    if path.startswith("/playQueues"):
+        return "playqueues"
+    if path.startswith(("/library/metadata/", "/status/sessions")) or path.startswith(
+        ON_DECK_PATH_PREFIXES
+    ) or (path.startswith("/library/sections/") and path.endswith("/all")):
+        return "metadata"
+    if path.startswith("/__proxy/"):
+        return None
+    return "catch_all"
+
 
 def create_app(
     plex_host: str,
@@ -86,6 +173,10 @@ def create_app(
     force_direct_play: bool = True,
     preplay_cooldown_seconds: int = 600,
     on_pre_play: Optional[Callable[[str], Any]] = None,
+    part_index_path: str = "",
+    on_pre_play_async: Optional[
+        Callable[[str, AsyncClient, float], Awaitable[Any]]
+    ] = None,
 ) -> FastAPI:
     """
     创建 Plex 302 反向代理 FastAPI 应用
@@ -96,11 +187,17 @@ def create_app(
     :param force_direct_play (bool): 是否在 decision 请求中强制 DirectPlay，避免转码使 302 失效
     :param on_pre_play (Callable): 播前补全回调，参数为 ratingKey，同步阻塞执行；
         在 playQueues 创建（含继续观看直接起播）时先补全该条目媒体流信息再放行
+    :param part_index_path (str): Part 解析结果持久化索引文件路径；为空则不持久化，
+        设置后代理启动时从中预热 Part/STRM 缓存，重启后首播无需再查 Plex
+    :param on_pre_play_async (Callable): 异步播前补全回调，参数为 (ratingKey, 共享
+        AsyncClient, 事件循环时钟上的截止时间)；提供时优先于 on_pre_play，
+        在事件循环内执行，预算到期即被取消
 
     :return FastAPI: 配置好的 FastAPI 应用实例
     """
     plex_host = plex_host.rstrip("/")
     pin_rules = pin_rules or []
+    metrics = ProxyMetrics()
 
     def _extract_token(request: Request) -> str:
         """
@@ -208,22 +305,124 @@ def create_app(
         app.state.http_client_no_follow = AsyncClient(
             follow_redirects=False, limits=limits
         )
-        # part_key(如 /library/parts/1/2/file) -> (file_path, expiry)
-        app.state.part_info_cache = {}
-        app.state.part_rating_cache = {}
-        # part_path -> (strm_content_url, expiry)
-        app.state.strm_content_cache = {}
+        # part_key(如 /library/parts/1/2/file) -> file_path
+        app.state.part_info_cache = LruTtlCache(
+            PART_INFO_CACHE_MAX_SIZE, PART_INFO_CACHE_TTL_SECONDS, name="part_info"
+        )
+        # part_key -> ratingKey
+        app.state.part_rating_cache = LruTtlCache(
+            PART_INFO_CACHE_MAX_SIZE, PART_INFO_CACHE_TTL_SECONDS, name="part_rating"
+        )
+        # part_path -> strm_content_url
+        app.state.strm_content_cache = LruTtlCache(
+            PART_INFO_CACHE_MAX_SIZE, PART_INFO_CACHE_TTL_SECONDS, name="strm_content"
+        )
+        # part_key -> True：近期已写入 / 刷新过索引的 Part 映射，到期后再次浏览才刷新确认时间
+        app.state.part_index_touched = LruTtlCache(
+            PART_INFO_CACHE_MAX_SIZE, PART_INDEX_TOUCH_INTERVAL_SECONDS, name="part_index_touched"
+        )
         app.state.part_info_lock = Lock()
-        # (part_key, header_hash) -> (final_url, expiry)
-        app.state.redirect_url_cache = {}
-        app.state.redirect_cache_order = []
+        # part_path -> final_url
+        app.state.redirect_url_cache = LruTtlCache(
+            REDIRECT_URL_CACHE_MAX_SIZE,
+            REDIRECT_URL_CACHE_TTL_SECONDS,
+            lazy_expire=False,
+            name="redirect_url",
+        )
         app.state.redirect_cache_lock = Lock()
+        # part_path -> 解析失败时的文件路径（未知为空串），命中即直接反代
+        app.state.negative_cache = LruTtlCache(
+            NEGATIVE_CACHE_MAX_SIZE,
+            NEGATIVE_CACHE_TTL_SECONDS,
+            lazy_expire=False,
+            name="negative",
+        )
         # 单飞合并：part_path -> Future[str]，并发相同请求共享一次解析
         app.state.inflight_redirects = {}
         app.state.inflight_lock = Lock()
+        # 大响应体 Part 解析的工作线程池
+        app.state.parse_executor = ThreadPoolExecutor(
+            max_workers=PARSE_WORKERS, thread_name_prefix="plextoolbox-parse"
+        )
+        app.state.parse_slots = Semaphore(PARSE_WORKERS * 2)
+        app.state.part_index = None
+        if part_index_path:
+            app.state.part_index = PartIndex(part_index_path)
+            await _warm_from_part_index(app)
+        app.state.prewarm = PrewarmScheduler(
+            _prewarm_resolve,
+            lambda part_path: _prewarm_settled(app, part_path),
+            workers=PREWARM_WORKERS,
+            max_pending=PREWARM_MAX_PENDING,
+            timeout=PREWARM_TIMEOUT_SECONDS,
+        )
+        app.state.prewarm.start()
+        app.state.metrics = metrics
         yield
+        await app.state.prewarm.stop()
         await app.state.http_client_follow.aclose()
         await app.state.http_client_no_follow.aclose()
+        app.state.parse_executor.shutdown(wait=False)
+        if app.state.part_index is not None:
+            await to_thread(app.state.part_index.close)
+
+    def _prewarm_settled(app: FastAPI, part_path: str) -> bool:
+        """
+        判断 Part 是否无需预热：已在单飞解析中、STRM/直链已缓存或处于负缓存
+
+        :param app: FastAPI 应用
+        :param part_path: Part key 路径
+        :return: 无需预热返回 True
+        """
+        state = app.state
+        return (
+            part_path in state.inflight_redirects
+            or state.strm_content_cache.peek(part_path) is not None
+            or state.redirect_url_cache.peek(part_path) is not None
+            or state.negative_cache.peek(part_path) is not None
+        )
+
+    async def _warm_from_part_index(app: FastAPI) -> None:
+        """
+        从持久化索引预热 Part 路径 / ratingKey / STRM 内容缓存
+
+        Part 路径与 STRM 地址分别按各自最近确认的时间（file_at / strm_at）计算剩余 TTL，
+        已过期的映射不恢复，避免把陈旧映射当作刚解析的结果重新给满 TTL。
+
+        :param app: FastAPI 应用
+        """
+        rows = await to_thread(app.state.part_index.load, PART_INFO_CACHE_MAX_SIZE)
+        now = time()
+        warmed = strm_count = 0
+        for row in rows:
+            key = row["part_key"]
+            file_age = now - float(row.get("file_at") or 0)
+            strm_age = now - float(row.get("strm_at") or 0)
+            file_ok = bool(row.get("file")) and file_age < PART_INFO_CACHE_TTL_SECONDS
+            strm_ok = bool(row.get("strm_url")) and strm_age < PART_INFO_CACHE_TTL_SECONDS
+            if file_ok:
+                ttl = PART_INFO_CACHE_TTL_SECONDS - file_age
+                app.state.part_info_cache.put(key, row["file"], ttl=ttl)
+                if row.get("rating_key"):
+                    app.state.part_rating_cache.put(key, row["rating_key"], ttl=ttl)
+                if file_age < PART_INDEX_TOUCH_INTERVAL_SECONDS:
+                    app.state.part_index_touched.put(
+                        key, True, ttl=PART_INDEX_TOUCH_INTERVAL_SECONDS - file_age
+                    )
+            if strm_ok:
+                app.state.strm_content_cache.put(
+                    key, row["strm_url"], ttl=PART_INFO_CACHE_TTL_SECONDS - strm_age
+                )
+                strm_count += 1
+            if file_ok or strm_ok:
+                warmed += 1
+        if rows:
+            logger.info(
+                "Part 索引预热完成: %s 条（STRM %s 条，跳过已过期 %s 条）",
+                warmed,
+                strm_count,
+                len(rows) - warmed,
+            )
 
     app = FastAPI(lifespan=lifespan)
 
@@ -234,6 +433,51 @@ def create_app(
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # 最外层：计时覆盖 CORS 与路由处理全过程
+    app.add_middleware(RouteTimingMiddleware, metrics=metrics, classify=_route_family)
+
+    # ---------- 运行指标 ----------
+
+    def _metrics_snapshot() -> Dict[str, Any]:
+        """
+        汇总代理运行指标：分路由/分阶段延迟、事件计数、缓存命中率、单飞与预热状态。
+        可在插件线程调用（status_api），只读取计数，不修改任何状态
+
+        :return: 指标字典
+        """
+        snapshot = metrics.snapshot()
+        state = app.state
+        caches = [
+            getattr(state, name, None)
+            for name in (
+                "part_info_cache",
+                "part_rating_cache",
+                "strm_content_cache",
+                "redirect_url_cache",
+                "negative_cache",
+            )
+        ]
+        snapshot["caches"] = {c.name: c.stats() for c in caches if c is not None}
+        inflight = getattr(state, "inflight_redirects", None)
+        snapshot["singleflight"] = {
+            "owners": metrics.counter("singleflight_owners"),
+            "joins": metrics.counter("singleflight_joins"),
+            "inflight": len(inflight) if inflight is not None else 0,
+        }
+        prewarm = getattr(state, "prewarm", None)
+        snapshot["prewarm"] = prewarm.stats() if prewarm is not None else None
+        return snapshot
+
+    app.state.metrics_snapshot = _metrics_snapshot
+
+    @app.get(METRICS_PATH, response_model=None)
+    async def proxy_metrics():
+        """
+        代理运行指标端点（JSON），不转发到 Plex
+
+        :return: 指标字典
+        """
+        return JSONResponse(content=_metrics_snapshot())
 
     # ---------- Part 路径缓存 ----------
 
@@ -247,24 +491,55 @@ def create_app(
         :param part_key: Part 的 key，如 /library/parts/123/456/file
         :param file_path: 媒体文件的真实路径
         """
-        if not part_key or not file_path:
-            return
-        cache = request.app.state.part_info_cache
+        await _cache_parts(request, [(part_key, file_path, rating_key)])
+
+    async def _cache_parts(
+        request: Request, pairs: List[Tuple[str, str, str]]
+    ) -> Dict[str, int]:
+        """
+        批量缓存 Part 映射：整批只获取一次锁、最多做一次容量淘汰
+
+        :param request: 当前请求
+        :param pairs: (part_key, file_path, rating_key) 列表
+        :return: {inserted, updated, evicted} 计数（以 Part 路径缓存为准）
+        """
+        index = request.app.state.part_index
+        touched = request.app.state.part_index_touched
+        part_cache = request.app.state.part_info_cache
+        rating_cache = request.app.state.part_rating_cache
+        negative_cache = request.app.state.negative_cache
+        part_rows: List[Tuple[str, str]] = []
+        rating_rows: List[Tuple[str, str]] = []
+        changed: List[Tuple[str, str, str]] = []
         async with request.app.state.part_info_lock:
-            if len(cache) >= PART_INFO_CACHE_MAX_SIZE:
-                now = monotonic()
-                expired = [k for k, v in cache.items() if v[1] < now]
-                for k in expired:
-                    cache.pop(k, None)
-                while len(cache) >= PART_INFO_CACHE_MAX_SIZE:
-                    cache.pop(next(iter(cache)), None)
-            # part_key 可能带查询参数，只取 path 部分
-            key = part_key.split("?", 1)[0]
-            cache[key] = (file_path, monotonic() + PART_INFO_CACHE_TTL_SECONDS)
-            if rating_key:
-                request.app.state.part_rating_cache[key] = (
-                    str(rating_key), monotonic() + PART_INFO_CACHE_TTL_SECONDS
-                )
+            for part_key, file_path, rating_key in pairs:
+                if not part_key or not file_path:
+                    continue
+                # part_key 可能带查询参数，只取 path 部分
+                key = part_key.split("?", 1)[0]
+                rating_key = str(rating_key or "")
+                part_rows.append((key, file_path))
+                is_changed = part_cache.peek(key) != file_path
+                if rating_key:
+                    rating_rows.append((key, rating_key))
+                    is_changed = is_changed or rating_cache.peek(key) != rating_key
+                # 映射未变但索引中的确认时间已过半个 TTL 时也重新落盘，
+                # 保证持续被浏览的热门 Part 重启后仍能预热
+                if is_changed or touched.peek(key) is None:
+                    changed.append((key, file_path, rating_key))
+                    touched.put(key, True)
+                # 文件路径变了（如本地文件换成 STRM）则作废负缓存，下次重新解析
+                negative = negative_cache.peek(key)
+                if negative is not None and negative != file_path:
+                    negative_cache.pop(key)
+            stats = part_cache.put_many(part_rows)
+            if rating_rows:
+                rating_cache.put_many(rating_rows)
+        # 仅在映射变化或需刷新确认时间时落盘，避免元数据浏览反复写入相同记录
+        if index is not None:
+            for key, file_path, rating_key in changed:
+                index.record_part(key, file_path, rating_key)
+        return stats
 
     async def _get_cached_part_path(request: Request, part_key: str) -> str:
         """
@@ -274,99 +549,13 @@ def create_app(
         :param part_key: Part 的 key（请求路径）
         :return: 命中的文件路径，未命中返回空串
         """
-        cache = request.app.state.part_info_cache
         async with request.app.state.part_info_lock:
-            entry = cache.get(part_key)
-            if not entry:
-                return ""
-            file_path, expiry = entry
-            if monotonic() >= expiry:
-                cache.pop(part_key, None)
-                return ""
-            return file_path
+            return request.app.state.part_info_cache.get(part_key, "")
 
     async def _get_cached_part_rating_key(request: Request, part_key: str) -> str:
         """读取 Part 对应的条目 ratingKey，供直接文件起播时补全兜底。"""
-        cache = request.app.state.part_rating_cache
         async with request.app.state.part_info_lock:
-            entry = cache.get(part_key)
-            if not entry:
-                return ""
-            rating_key, expiry = entry
-            if monotonic() >= expiry:
-                cache.pop(part_key, None)
-                return ""
-            return str(rating_key)
-
-    def _extract_parts_from_json(data: Any) -> List[Tuple[str, str, str]]:
-        """
-        从 Plex JSON 响应的 MediaContainer 中抽取所有 Part 的 (key, file) 对
-
-        :param data: Plex API JSON 响应
-        :return: (part_key, file_path) 列表
-        """
-        result: List[Tuple[str, str, str]] = []
-        if not isinstance(data, dict):
-            return result
-        container = data.get("MediaContainer")
-        if not isinstance(container, dict):
-            return result
-        metadata_arr: List[dict] = []
-        hubs = container.get("Hub")
-        if isinstance(hubs, list):
-            for hub in hubs:
-                if isinstance(hub, dict) and isinstance(hub.get("Metadata"), list):
-                    metadata_arr.extend(
-                        m for m in hub["Metadata"] if isinstance(m, dict)
-                    )
-        if isinstance(container.get("Metadata"), list):
-            metadata_arr.extend(
-                m for m in container["Metadata"] if isinstance(m, dict)
-            )
-        for metadata in metadata_arr:
-            rating_key = str(metadata.get("ratingKey") or "")
-            media_list = metadata.get("Media")
-            if not isinstance(media_list, list):
-                continue
-            for media in media_list:
-                if not isinstance(media, dict):
-                    continue
-                parts = media.get("Part")
-                if not isinstance(parts, list):
-                    continue
-                for part in parts:
-                    if not isinstance(part, dict):
-                        continue
-                    key = part.get("key")
-                    file_path = part.get("file")
-                    if isinstance(key, str) and isinstance(file_path, str):
-                        result.append((key, file_path, rating_key))
-        return result
-
-    def _extract_parts_from_xml(text: str) -> List[Tuple[str, str, str]]:
-        """
-        从 Plex XML 响应中抽取所有 Part 的 (key, file) 对
-
-        :param text: XML 文本
-        :return: (part_key, file_path) 列表
-        """
-        from xml.etree import ElementTree
-
-        result: List[Tuple[str, str, str]] = []
-        try:
-            root = ElementTree.fromstring(text)
-        except ElementTree.ParseError:
-            return result
-        for metadata in root.iter():
-            rating_key = metadata.get("ratingKey") or ""
-            if not rating_key:
-                continue
-            for part in metadata.iter("Part"):
-                key = part.get("key")
-                file_path = part.get("file")
-                if key and file_path:
-                    result.append((key, file_path, str(rating_key)))
-        return result
+            return request.app.state.part_rating_cache.get(part_key, "")
 
     async def _harvest_parts_from_response(
         request: Request, content_type: str, body: bytes
@@ -379,41 +568,79 @@ def create_app(
         :param body: 响应体字节串
         :return: 缓存的 Part 数量
         """
-        pairs: List[Tuple[str, str, str]] = []
         try:
-            if "application/json" in content_type:
-                from json import loads
-
-                pairs = _extract_parts_from_json(loads(body))
-            elif "xml" in content_type:
-                pairs = _extract_parts_from_xml(body.decode("utf-8", errors="replace"))
+            if len(body) >= PARSE_OFFLOAD_MIN_BYTES:
+                pairs = await _offload_parse(
+                    request, parse_parts_body, content_type, body
+                )
+            else:
+                pairs = parse_parts_body(content_type, body)
         except Exception:
             logger.debug("解析元数据响应失败，跳过 Part 缓存", exc_info=True)
             return 0
-        for key, file_path, rating_key in pairs:
-            await _cache_part_info(request, key, file_path, rating_key)
-        # 单集详情页（Part 数少）时后台预热 STRM 解析，正式播放可直接命中缓存
-        if 0 < len(pairs) <= PREWARM_MAX_PARTS:
+        return await _cache_harvested_parts(request, pairs)
+
+    async def _offload_parse(request: Request, func: Callable, *args: Any) -> Any:
+        """
+        在解析线程池中执行 Part 解析，排队任务数超过上限时等待空位
+
+        :param request: 当前请求
+        :param func: 解析函数
+        :param args: 解析函数参数
+        :return: 解析函数返回值
+        """
+        async with request.app.state.parse_slots:
+            return await get_event_loop().run_in_executor(
+                request.app.state.parse_executor, func, *args
+            )
+
+    async def _cache_harvested_parts(
+        request: Request, pairs: List[Tuple[str, str, str]]
+    ) -> int:
+        """
+        缓存从元数据响应中抽取到的 Part 信息，并按来源优先级提交 STRM 预热
+
+        :param request: 当前请求
+        :param pairs: (part_key, file_path, rating_key) 列表
+        :return: 缓存的 Part 数量
+        """
+        stats = await _cache_parts(request, pairs)
+        if stats["evicted"]:
+            logger.debug(
+                "Part 缓存批量写入: 新增 %s, 更新 %s, 淘汰 %s",
+                stats["inserted"], stats["updated"], stats["evicted"],
+            )
+        # 播放队列 / 继续观看 / 详情页 / 季列表中的 STRM 提前解析，正式播放可直接命中缓存
+        priority = _prewarm_priority(request.scope.get("path", ""), len(pairs))
+        if priority is not None:
+            limit = PREWARM_SOURCE_LIMITS[priority]
+            prewarm = request.app.state.prewarm
             for key, file_path, _rating_key in pairs:
+                if limit <= 0:
+                    break
                 if file_path.lower().endswith(".strm"):
-                    create_task(
-                        _prewarm_strm(request, key.split("?", 1)[0])
-                    )
+                    prewarm.submit(key.split("?", 1)[0], priority, request)
+                    limit -= 1
         return len(pairs)
 
-    async def _prewarm_strm(request: Request, part_path: str) -> None:
+    def _prewarm_priority(path: str, part_count: int) -> Optional[int]:
         """
-        后台预热：提前解析 STRM 内容并写入缓存，失败静默
+        按元数据请求路径判断预热来源优先级
 
-        :param request: 触发预热的元数据请求（借用其 token 与共享客户端）
-        :param part_path: Part 的 key 路径
+        :param path: 请求路径
+        :param part_count: 响应中的 Part 数
+        :return: PRIORITY_* 之一；不需要预热返回 None
         """
-        try:
-            url = await _resolve_strm_content(request, part_path)
-            if url:
-                logger.debug("STRM 预热完成: %s", part_path)
-        except Exception:
-            logger.debug("STRM 预热失败: %s", part_path, exc_info=True)
+        if path.startswith("/playQueues"):
+            return PRIORITY_PLAYQUEUE
+        if path.startswith(ON_DECK_PATH_PREFIXES):
+            return PRIORITY_ON_DECK
+        if path.startswith("/library/metadata/"):
+            return PRIORITY_SEASON if path.endswith("/children") else PRIORITY_DETAIL
+        # 其他来源（会话、分区列表等）仅在 Part 很少时按详情页处理，避免整库列表触发风暴
+        if 0 < part_count <= PREWARM_MAX_PARTS:
+            return PRIORITY_DETAIL
+        return None
 
     # ---------- Plex API 查询 ----------
 
@@ -449,15 +676,16 @@ def create_app(
             return ""
         url = f"{plex_host}/library/parts/{part_id}?X-Plex-Token={quote(token, safe='')}"
         try:
-            resp = await client.get(
-                url,
-                headers={"Accept": "application/json"},
-                timeout=HOT_PATH_TIMEOUT_SECONDS,
-            )
+            with metrics.stage("fetch_part_path"):
+                resp = await client.get(
+                    url,
+                    headers={"Accept": "application/json"},
+                    timeout=HOT_PATH_TIMEOUT_SECONDS,
+                )
             if resp.status_code == 200:
-                pairs = _extract_parts_from_json(resp.json())
-                for key, file_path, rating_key in pairs:
-                    await _cache_part_info(request, key, file_path, rating_key)
+                pairs = extract_parts_from_json(resp.json())
+                await _cache_parts(request, pairs)
+                for key, file_path, _rating_key in pairs:
                     if key.split("?", 1)[0] == part_path:
                         return file_path
                 if pairs:
@@ -466,7 +694,9 @@ def create_app(
             logger.debug("Plex parts API 查询失败: %s", url, exc_info=True)
         return ""
 
-    async def _resolve_strm_content(request: Request, part_path: str) -> str:
+    async def _resolve_strm_content(
+        request: Request, part_path: str, failures: Optional[List[str]] = None
+    ) -> str:
         """
         通过 Plex download 接口 HEAD 请求解析 STRM 文件内容指向的远程地址
 
@@ -475,41 +705,39 @@ def create_app(
 
         :param request: 当前请求
         :param part_path: 播放请求路径
+        :param failures: 传入时记录未能确认结果的原因（无 token、超时、上游 5xx 等瞬时故障）
         :return: STRM 指向的远程 URL，失败返回空串
         """
         strm_cache = request.app.state.strm_content_cache
-        entry = strm_cache.get(part_path)
-        if entry:
-            content, expiry = entry
-            if monotonic() < expiry:
-                logger.debug("STRM 内容缓存命中: %s", part_path)
-                return content
-            strm_cache.pop(part_path, None)
+        content = strm_cache.get(part_path)
+        if content:
+            logger.debug("STRM 内容缓存命中: %s", part_path)
+            return content
         token = _extract_token(request)
         if not token:
+            if failures is not None:
+                failures.append("no_token")
             return ""
         url = f"{plex_host}{part_path}?download=1&X-Plex-Token={quote(token, safe='')}"
         client = request.app.state.http_client_no_follow
         try:
-            resp = await client.head(url, timeout=HOT_PATH_TIMEOUT_SECONDS)
+            with metrics.stage("strm_head"):
+                resp = await client.head(url, timeout=HOT_PATH_TIMEOUT_SECONDS)
+            if failures is not None and (
+                resp.status_code >= 500 or resp.status_code in TRANSIENT_STATUS_CODES
+            ):
+                failures.append(f"http_{resp.status_code}")
             if 300 < resp.status_code < 309:
                 location = resp.headers.get("location", "")
                 if location and not location.startswith(plex_host):
-                    if len(strm_cache) >= PART_INFO_CACHE_MAX_SIZE:
-                        now = monotonic()
-                        for k in [
-                            k for k, v in strm_cache.items() if v[1] < now
-                        ]:
-                            strm_cache.pop(k, None)
-                        while len(strm_cache) >= PART_INFO_CACHE_MAX_SIZE:
-                            strm_cache.pop(next(iter(strm_cache)), None)
-                    strm_cache[part_path] = (
-                        location,
-                        monotonic() + PART_INFO_CACHE_TTL_SECONDS,
-                    )
+                    strm_cache.put(part_path, location)
+                    if request.app.state.part_index is not None:
+                        request.app.state.part_index.record_strm(part_path, location)
                     return location
         except Exception:
             logger.debug("STRM 内容解析失败: %s", part_path, exc_info=True)
+            if failures is not None:
+                failures.append("transport")
         return ""
 
     # ---------- 302 重定向核心 ----------
@@ -531,23 +759,37 @@ def create_app(
         # 缓存的是稳定中间地址（与客户端无关），仅按路径缓存以提高跨客户端命中率
         cache_key = part_path
         cache = request.app.state.redirect_url_cache
-        order = request.app.state.redirect_cache_order
         lock = request.app.state.redirect_cache_lock
 
-        async with lock:
-            entry = cache.get(cache_key)
-            if entry:
-                final_url, expiry = entry
-                if monotonic() < expiry:
-                    logger.debug("直链缓存命中: %s", part_path)
-                    return RedirectResponse(url=final_url, status_code=302)
-                cache.pop(cache_key, None)
-                try:
-                    order.remove(cache_key)
-                except ValueError:
-                    pass
-
-        # 单飞合并：相同 part_path 的并发解析只执行一次
+        with metrics.stage("cache_lookup"):
+            async with lock:
+                final_url = cache.get(cache_key)
+        if final_url:
+            logger.debug("直链缓存命中: %s", part_path)
+            metrics.incr("redirects")
+            return RedirectResponse(url=final_url, status_code=302)
+
+        # 直接 302 到中间地址（STRM 内部 redirect_url 或规则替换结果），
+        # 由客户端自行跟随后续跳转，避免服务端预解析引入延迟
+        final_url = await _resolve_shared(request, part_path)
+        if not final_url:
+            return None
+
+        metrics.incr("redirects")
+        logger.info("302 重定向: %s -> %s", part_path, final_url)
+        return RedirectResponse(url=final_url, status_code=302)
+
+    async def _resolve_shared(request: Request, part_path: str) -> str:
+        """
+        单飞解析 part_path 的可 302 地址并写入直链缓存
+
+        起播请求与 STRM 预热共用同一份在途解析：相同 part_path 的并发解析只执行一次，
+        其余调用方等待同一结果
+
+        :param request: 当前请求（预热时为触发预热的元数据请求）
+        :param part_path: 播放请求路径
+        :return: 可 302 的地址，无法解析为空串
+        """
         inflight = request.app.state.inflight_redirects
         inflight_lock = request.app.state.inflight_lock
         owner = False
@@ -560,63 +802,72 @@ def create_app(
 
         if not owner:
             logger.debug("等待单飞解析: %s", part_path)
-            http_url = await fut
-        else:
-            try:
-                http_url = await _resolve_redirect_url(request, part_path)
-            except Exception:
-                logger.debug("解析直链异常: %s", part_path, exc_info=True)
-                http_url = ""
-            finally:
-                async with inflight_lock:
-                    inflight.pop(part_path, None)
-                if not fut.done():
-                    fut.set_result(http_url)
+            metrics.incr("singleflight_joins")
+            with metrics.stage("singleflight_wait"):
+                return await fut
 
-        if not http_url:
-            return None
+        metrics.incr("singleflight_owners")
+        http_url, confirmed = "", False
+        try:
+            with metrics.stage("resolve"):
+                http_url, confirmed = await _resolve_redirect_url(request, part_path)
+            if http_url:
+                async with request.app.state.redirect_cache_lock:
+                    request.app.state.redirect_url_cache.put(part_path, http_url)
+        except Exception:
+            logger.debug("解析直链异常: %s", part_path, exc_info=True)
+        finally:
+            async with inflight_lock:
+                inflight.pop(part_path, None)
+            if not fut.done():
+                fut.set_result(http_url)
+        # 确认无可 302 地址才记入负缓存（超时、上游错误等可能是瞬时故障，不记）
+        if confirmed and not http_url:
+            request.app.state.negative_cache.put(
+                part_path, request.app.state.part_info_cache.peek(part_path, "")
+            )
+        return http_url
 
-        # 直接 302 到中间地址（STRM 内部 redirect_url 或规则替换结果），
-        # 由客户端自行跟随后续跳转，避免服务端预解析引入延迟
-        final_url = http_url
+    async def _prewarm_resolve(request: Request, part_path: str) -> str:
+        """
+        STRM 预热解析：登记到起播单飞中，预热期间到来的起播请求直接等待同一次解析
 
-        async with lock:
-            now = monotonic()
-            expired = [k for k in order if cache.get(k) and cache[k][1] < now]
-            for k in expired:
-                cache.pop(k, None)
-            order[:] = [k for k in order if k not in frozenset(expired)]
-            while len(cache) >= REDIRECT_URL_CACHE_MAX_SIZE and order:
-                cache.pop(order.pop(0), None)
-            cache[cache_key] = (final_url, now + REDIRECT_URL_CACHE_TTL_SECONDS)
-            order.append(cache_key)
+        预热超时只放弃等待，不取消共享的解析，已在等待的起播请求照常拿到结果
 
-        logger.info("302 重定向: %s -> %s", part_path, final_url)
-        return RedirectResponse(url=final_url, status_code=302)
+        :param request: 触发预热的元数据请求
+        :param part_path: Part key 路径
+        :return: 可 302 的地址，无法解析为空串
+        """
+        return await shield(_resolve_shared(request, part_path))
 
-    async def _resolve_redirect_url(request: Request, part_path: str) -> str:
+    async def _resolve_redirect_url(request: Request, part_path: str) -> Tuple[str, bool]:
         """
         解析播放请求对应的可 302 远程地址（不含缓存/单飞逻辑）
 
         :param request: 当前请求
         :param part_path: 播放请求路径
-        :return: 可 302 的 HTTP(S) 地址，无法解析返回空串
+        :return: (可 302 的 HTTP(S) 地址，无法解析为空串, 是否确认不可 302)；
+                 仅“拿到本地非 STRM 文件路径”或“STRM 已读到但无可用地址”算确认，
+                 查不到路径、超时、上游错误等都不算
         """
         file_path = await _fetch_plex_file_path(request, part_path)
         http_url = ""
         if file_path:
             replaced = _apply_pin_rules(file_path, pin_rules)
             if _is_http_media_path(replaced):
-                http_url = replaced
-            elif file_path.lower().endswith(".strm"):
-                strm_url = await _resolve_strm_content(request, part_path)
-                if strm_url:
-                    strm_replaced = _apply_pin_rules(strm_url, pin_rules)
-                    http_url = (
-                        strm_replaced
-                        if _is_http_media_path(strm_replaced)
-                        else strm_url
-                    )
+                return replaced, False
+            if not file_path.lower().endswith(".strm"):
+                return "", True
+            failures: List[str] = []
+            strm_url = await _resolve_strm_content(request, part_path, failures)
+            if not strm_url:
+                return "", not failures
+            strm_replaced = _apply_pin_rules(strm_url, pin_rules)
+            http_url = (
+                strm_replaced
+                if _is_http_media_path(strm_replaced)
+                else strm_url
+            )
         else:
             # 无法拿到文件路径时，仍尝试 STRM 解析（Plex 会自己 30x）
             strm_url = await _resolve_strm_content(request, part_path)
@@ -624,7 +875,7 @@ def create_app(
                 strm_replaced = _apply_pin_rules(strm_url, pin_rules)
                 if _is_http_media_path(strm_replaced):
                     http_url = strm_replaced
-        return http_url
+        return http_url, False
 
     async def _handle_stream(request: Request, part_id: str, file_id: str = ""):
         """
@@ -637,17 +888,25 @@ def create_app(
         """
         logger.info("播放请求: %s", request.scope.get("path", ""))
         part_path = request.scope.get("path", "")
+        # 近期确认不可 302（本地文件等）：跳过上游查询与播前补全，直接流式反代
+        if request.app.state.negative_cache.get(part_path) is not None:
+            logger.debug("负缓存命中，直接反代: %s", part_path)
+            metrics.incr("negative_hits")
+            with metrics.stage("reverse_proxy"):
+                return await _reverse_proxy(request)
         rating_key = await _get_cached_part_rating_key(request, part_path)
         if not rating_key:
             await _fetch_plex_file_path(request, part_path)
             rating_key = await _get_cached_part_rating_key(request, part_path)
         if rating_key:
-            await _maybe_pre_play_complete(rating_key)
+            await _maybe_pre_play_complete(request, rating_key)
         resp = await _try_redirect(request)
         if resp:
             return resp
         logger.info("302 未命中，回退反代: %s", request.scope.get("path", ""))
-        return await _reverse_proxy(request)
+        metrics.incr("fallbacks")
+        with metrics.stage("reverse_proxy"):
+            return await _reverse_proxy(request)
 
     for _route in (
         "/library/parts/{part_id}/{file_id}/file",
@@ -736,7 +995,7 @@ def create_app(
                     url, headers={"Accept": "application/json"}, timeout=10
                 )
                 if resp.status_code == 200:
-                    pairs = _extract_parts_from_json(resp.json())
+                    pairs = extract_parts_from_json(resp.json())
                     media_index = int(request.query_params.get("mediaIndex") or 0)
                     part_index = int(request.query_params.get("partIndex") or 0)
                     idx = media_index + part_index
@@ -790,17 +1049,33 @@ def create_app(
     # ratingKey -> 上次播前补全的单调时间戳
     _preplay_recent: Dict[str, float] = {}
     _preplay_lock = Lock()
+    # 进行中的播前补全任务（持有引用，超出等待预算或请求断开后仍能跑完）
+    _preplay_tasks: Dict[Task, str] = {}
+
+    def _preplay_finished(task: Task) -> None:
+        """播前补全任务结束回调：释放引用并记录结果。"""
+        rating_key = _preplay_tasks.pop(task, "")
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.debug("播前补全异常 ratingKey=%s: %s", rating_key, exc)
+        else:
+            logger.info("播前补全完成: ratingKey=%s", rating_key)
 
-    async def _maybe_pre_play_complete(rating_key: str) -> None:
+    async def _maybe_pre_play_complete(request: Request, rating_key: str) -> None:
         """
         播前补全：在放行播放请求前，同步等待补全该条目媒体流信息。
 
-        带冷却窗口去重；等待预算内没完成就放行播放，补全在后台线程继续，
-        绝不为写库阻塞起播超过 PREPLAY_WAIT_BUDGET_SECONDS。
+        带冷却窗口去重，绝不为写库阻塞起播超过 PREPLAY_WAIT_BUDGET_SECONDS。
+        异步回调在事件循环内执行、复用代理连接池（数据源查询按 deadline 自行截止）；
+        仅有同步回调时放到线程执行。预算到期只是不再等待：补全（含写库）转入后台跑完，
+        慢条目也能补全，冷却记录保留，避免重复起补全。
 
+        :param request: 当前请求（取共享 httpx 客户端）
         :param rating_key: 即将播放条目的 ratingKey
         """
-        if on_pre_play is None or not rating_key:
+        if (on_pre_play is None and on_pre_play_async is None) or not rating_key:
             return
         now = monotonic()
         async with _preplay_lock:
@@ -816,20 +1091,24 @@ def create_app(
             for k in expired:
                 if k != rating_key:
                     _preplay_recent.pop(k, None)
-        try:
-            await wait_for(
-                to_thread(on_pre_play, rating_key),
-                timeout=PREPLAY_WAIT_BUDGET_SECONDS,
-            )
-            logger.info("播前补全完成: ratingKey=%s", rating_key)
-        except TimeoutError:
-            # to_thread 里的补全线程会继续跑完（写库仍生效），只是不再阻塞起播
+        if on_pre_play_async is not None:
+            deadline = get_running_loop().time() + PREPLAY_WAIT_BUDGET_SECONDS
+            job = create_task(on_pre_play_async(
+                rating_key, request.app.state.http_client_follow, deadline
+            ))
+        else:
+            job = create_task(to_thread(on_pre_play, rating_key))
+        _preplay_tasks[job] = rating_key
+        job.add_done_callback(_preplay_finished)
+        with metrics.stage("pre_play"):
+            done, _pending = await wait({job}, timeout=PREPLAY_WAIT_BUDGET_SECONDS)
+        if not done:
+            # 只限制等待时长，不取消任务：在途的 helper 写入不会被中断
+            metrics.incr("preplay_timeouts")
             logger.info(
                 "播前补全超过 %ss 预算，先放行播放（补全后台继续）: ratingKey=%s",
                 PREPLAY_WAIT_BUDGET_SECONDS, rating_key,
             )
-        except Exception as exc:
-            logger.debug("播前补全异常 ratingKey=%s: %s", rating_key, exc)
 
     def _extract_rating_key_from_playqueue(request: Request) -> str:
         """
@@ -862,14 +1141,15 @@ def create_app(
         if request.method == "POST":
             rating_key = _extract_rating_key_from_playqueue(request)
             if rating_key:
-                await _maybe_pre_play_complete(rating_key)
+                await _maybe_pre_play_complete(request, rating_key)
         return await _metadata_proxy(request)
 
     # ---------- 元数据 API：缓存 Part 信息 ----------
 
     async def _metadata_proxy(request: Request):
         """
-        代理元数据类 API，整包拉取响应并抽取缓存 Part.key -> file 映射
+        代理元数据类 API：响应流式透传给客户端，同时对转发的分块增量抽取
+        Part.key -> file 映射，首字节时间与内存占用不随媒体库大小增长
 
         :param request: 当前请求
         :return: 上游响应（原样透传）
@@ -885,13 +1165,15 @@ def create_app(
             return Response(status_code=204, content=b"")
         client = request.app.state.http_client_no_follow
         try:
-            resp = await client.request(
-                request.method,
-                target_url,
+            req = client.build_request(
+                method=request.method,
+                url=target_url,
                 headers=headers,
                 content=body if body else None,
                 timeout=60.0,
             )
+            with metrics.stage("metadata_upstream"):
+                resp = await client.send(req, stream=True)
         except Exception:
             logger.warning("元数据请求失败: %s", target_url, exc_info=True)
             return JSONResponse(
@@ -902,16 +1184,44 @@ def create_app(
                 },
             )
         ct = (resp.headers.get("content-type") or "").lower()
-        if resp.status_code == 200 and request.method == "GET":
-            count = await _harvest_parts_from_response(request, ct, resp.content)
-            if count:
-                logger.debug("元数据响应缓存 Part: path=%s, %s 条", path, count)
+        harvester: Optional[StreamingPartHarvester] = None
+        # playQueues 创建（POST）的响应里就是即将播放的条目，同样抽取
+        if resp.status_code == 200 and (
+            request.method == "GET" or path.startswith("/playQueues")
+        ):
+            harvester = StreamingPartHarvester(ct)
         excluded = HOP_BY_HOP_HEADERS | {"content-encoding", "content-length"}
         resp_headers = {
             k: v for k, v in resp.headers.multi_items() if k.lower() not in excluded
         }
-        return Response(
-            content=resp.content,
+
+        async def stream():
+            """
+            逐块透传上游响应，同时喂给增量解析器；全部转发完再缓存 Part。
+            累计超过卸载阈值后，分块解析转到工作线程，大列表不阻塞事件循环
+            """
+            try:
+                async for chunk in resp.aiter_bytes(chunk_size=65536):
+                    yield chunk
+                    if harvester is None or not harvester.active:
+                        continue
+                    if harvester.bytes_seen >= PARSE_OFFLOAD_MIN_BYTES:
+                        await _offload_parse(request, harvester.feed, chunk)
+                    else:
+                        harvester.feed(chunk)
+            finally:
+                await resp.aclose()
+            if harvester is not None and harvester.active:
+                if harvester.bytes_seen >= PARSE_OFFLOAD_MIN_BYTES:
+                    pairs = await _offload_parse(request, harvester.close)
+                else:
+                    pairs = harvester.close()
+                count = await _cache_harvested_parts(request, pairs)
+                if count:
+                    logger.debug("元数据响应缓存 Part: path=%s, %s 条", path, count)
+
+        return StreamingResponse(
+            stream(),
             status_code=resp.status_code,
             headers=resp_headers,
         )
@@ -922,6 +1232,10 @@ def create_app(
         "/library/sections/{section_id}/all",
         "/playQueues/{queue_id}",
         "/status/sessions",
+        "/hubs/home/continueWatching",
+        "/hubs/home/onDeck",
+        "/hubs/continueWatching",
+        "/library/onDeck",
     ):
         app.api_route(_meta_route, methods=["GET", "POST"], response_model=None)(
             _metadata_proxy
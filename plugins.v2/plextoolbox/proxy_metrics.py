@@ -0,0 +1,223 @@
+"""302 代理热路径耗时统计：分路由 / 分阶段的对数分桶延迟直方图与计数器。"""
+
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter, time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# 每个 2 的幂区间细分的子桶位数：5 位即每区间 16 个有效子桶，相对误差约 3%
+_SUB_BUCKET_BITS = 5
+_SUB_BUCKET_COUNT = 1 << _SUB_BUCKET_BITS
+# 可记录的最大耗时（微秒），超出按最大值计入
+_MAX_TRACKABLE_US = 600 * 1_000_000
+_MAX_MAGNITUDE = max(0, _MAX_TRACKABLE_US.bit_length() - _SUB_BUCKET_BITS)
+
+
+class LatencyHistogram:
+    """
+    HDR 风格的延迟直方图。
+
+    以微秒为单位，按 2 的幂分段、每段再等分子桶，桶数固定（与样本量无关），
+    记录为 O(1)，分位数误差有界（约 3%）。非线程安全，由 ProxyMetrics 统一加锁。
+    """
+
+    def __init__(self) -> None:
+        self._counts: List[int] = [0] * ((_MAX_MAGNITUDE + 1) * _SUB_BUCKET_COUNT)
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    @staticmethod
+    def _index(value_us: int) -> int:
+        """微秒值 -> 桶下标（单调递增）。"""
+        magnitude = max(0, value_us.bit_length() - _SUB_BUCKET_BITS)
+        return (magnitude << _SUB_BUCKET_BITS) + (value_us >> magnitude)
+
+    @staticmethod
+    def _upper_bound(index: int) -> int:
+        """桶下标 -> 该桶可表示的最大微秒值。"""
+        magnitude, sub = divmod(index, _SUB_BUCKET_COUNT)
+        return ((sub + 1) << magnitude) - 1
+
+    def record(self, seconds: float) -> None:
+        """
+        记录一次耗时。
+
+        :param seconds: 耗时秒数
+        """
+        value_us = min(_MAX_TRACKABLE_US, max(0, int(seconds * 1_000_000)))
+        self._counts[self._index(value_us)] += 1
+        self.count += 1
+        self.total_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def percentiles(self, quantiles: List[float]) -> List[float]:
+        """
+        一次遍历计算多个分位数。
+
+        :param quantiles: 升序的分位点列表，如 [0.5, 0.95, 0.99]
+        :return: 对应分位耗时（毫秒）；无样本时为 0
+        """
+        if not self.count:
+            return [0.0 for _ in quantiles]
+        result: List[float] = []
+        targets = [max(1, int(q * self.count + 0.5)) for q in quantiles]
+        seen = 0
+        pos = 0
+        for index, n in enumerate(self._counts):
+            if not n:
+                continue
+            seen += n
+            while pos < len(targets) and seen >= targets[pos]:
+                value_us = min(self._upper_bound(index), self.max_us)
+                result.append(round(value_us / 1000, 2))
+                pos += 1
+            if pos >= len(targets):
+                break
+        while len(result) < len(quantiles):
+            result.append(round(self.max_us / 1000, 2))
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        返回统计摘要。
+
+        :return: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}
+        """
+        p50, p95, p99 = self.percentiles([0.5, 0.95, 0.99])
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_us / self.count / 1000, 2) if self.count else 0.0,
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+            "max_ms": round(self.max_us / 1000, 2),
+        }
+
+
+class ProxyMetrics:
+    """
+    代理运行指标：按路由族 / 热路径阶段分别维护延迟直方图，另有若干事件计数。
+
+    记录在事件循环线程，读取（快照）可能来自插件线程，统一用一把轻量锁保护。
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._routes: Dict[str, LatencyHistogram] = {}
+        self._stages: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, int] = {}
+        self.started_at = time()
+
+    def observe_route(self, family: str, seconds: float) -> None:
+        """
+        记录一次请求的响应头耗时。
+
+        :param family: 路由族，如 stream / metadata
+        :param seconds: 从收到请求到发出响应头的秒数
+        """
+        with self._lock:
+            hist = self._routes.get(family)
+            if hist is None:
+                hist = self._routes[family] = LatencyHistogram()
+            hist.record(seconds)
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        """
+        记录一次热路径阶段耗时。
+
+        :param stage: 阶段名，如 strm_head / pre_play
+        :param seconds: 耗时秒数
+        """
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = LatencyHistogram()
+            hist.record(seconds)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """
+        阶段计时上下文（异常与取消同样计入）。
+
+        :param stage: 阶段名
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, perf_counter() - start)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        """
+        事件计数加 n。
+
+        :param name: 计数器名
+        :param n: 增量
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def counter(self, name: str) -> int:
+        """读取计数器当前值。"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        导出当前指标快照。
+
+        :return: {uptime_seconds, routes, stages, counters}
+        """
+        with self._lock:
+            return {
+                "uptime_seconds": round(time() - self.started_at, 1),
+                "routes": {k: h.summary() for k, h in sorted(self._routes.items())},
+                "stages": {k: h.summary() for k, h in sorted(self._stages.items())},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+
+class RouteTimingMiddleware:
+    """
+    纯 ASGI 中间件：按路由族记录「收到请求 → 发出响应头」耗时。
+
+    只包装 send，不缓冲响应体，对流式反代与 302 均无额外开销；
+    以响应头为终点，正好对应客户端感知的起播 / 首字节时间。
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        metrics: ProxyMetrics,
+        classify: Callable[[str], Optional[str]],
+    ) -> None:
+        """
+        :param app: 下游 ASGI 应用
+        :param metrics: 指标收集器
+        :param classify: 路径 -> 路由族；返回 None 的请求不计时
+        """
+        self.app = app
+        self.metrics = metrics
+        self.classify = classify
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope.get("type") != "http":
+            await self.app(scope, receive, send)
+            return
+        family = self.classify(scope.get("path", ""))
+        if family is None:
+            await self.app(scope, receive, send)
+            return
+        start = perf_counter()
+        recorded = False
+
+        async def timed_send(message) -> None:
+            nonlocal recorded
+            if not recorded and message.get("type") == "http.response.start":
+                recorded = True
+                self.metrics.observe_route(family, perf_counter() - start)
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
@@ -0,0 +1,218 @@
+"""媒体信息解析结果的持久化缓存：按 STRM 指向的目标寻址，Plex 重扫后免再查数据源。"""
+
+import json
+import sqlite3
+from hashlib import sha1
+from threading import Lock
+from time import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+from .ffprobe_source import read_strm_url
+
+# 缓存内容格式版本：归一化结构变化时递增，旧版本的行不再命中并在打开时清理
+RESULT_CACHE_VERSION = 1
+# 缓存保留的最大行数，超出时按更新时间淘汰最旧的行
+RESULT_CACHE_MAX_ROWS = 100000
+# 缓存行最长保留时间（秒）
+RESULT_CACHE_MAX_AGE_SECONDS = 90 * 86400
+# 写入缓冲满该条数即落盘
+RESULT_CACHE_FLUSH_BATCH = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mediainfo_cache (
+    identity   TEXT PRIMARY KEY,
+    version    INTEGER NOT NULL,
+    source     TEXT,
+    payload    TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mediainfo_cache_updated ON mediainfo_cache(updated_at);
+"""
+
+_UPSERT_SQL = """
+INSERT INTO mediainfo_cache (identity, version, source, payload, updated_at)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(identity) DO UPDATE SET
+    version = excluded.version,
+    source = excluded.source,
+    payload = excluded.payload,
+    updated_at = excluded.updated_at
+"""
+
+# payload 中与具体 part 绑定、不应进入缓存的字段
+_PART_FIELDS = ("part_id", "overwrite_streams", "source")
+
+
+def strm_identity(file_path: str) -> str:
+    """
+    计算 STRM 的稳定标识：能读到 STRM 内容时取其指向的地址，否则取 STRM 路径。
+
+    part_id 在 Plex 重扫后会变，STRM 指向的目标不变；目标变了（换源）自然不再命中。
+
+    :param file_path: Plex 中的 STRM 文件路径
+    :return: 标识摘要，路径为空时返回空串
+    """
+    if not file_path:
+        return ""
+    url = read_strm_url(file_path)
+    basis = f"url:{url}" if url else f"path:{file_path}"
+    return sha1(basis.encode("utf-8")).hexdigest()
+
+
+class MediaInfoResultCache:
+    """
+    基于 SQLite 的 STRM 标识 -> 归一化媒体信息 缓存（插件数据目录下单文件）。
+
+    读取先查写入缓冲再查库；写入先进缓冲，满一批或 flush/close 时合并落盘。
+    全量补全的多个解析线程与播前补全共用一个实例，连接访问统一加锁。
+    """
+
+    def __init__(self, db_path: str) -> None:
+        """
+        打开缓存库，清理旧版本与陈旧/超量的行。
+
+        :param db_path: SQLite 文件路径
+        """
+        self._db_path = db_path
+        self._lock = Lock()
+        self._pending: List[Tuple[str, int, Optional[str], str, float]] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        try:
+            self._conn = self._connect()
+            self._prune()
+        except sqlite3.Error as e:
+            logger.warning("PlexToolbox 媒体信息缓存打开失败 %s: %s", db_path, e)
+            self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开缓存库连接并确保表结构存在。"""
+        conn = sqlite3.connect(self._db_path, timeout=10.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _prune(self) -> None:
+        """清理旧版本、过期与超出容量的行。"""
+        conn = self._conn
+        conn.execute(
+            "DELETE FROM mediainfo_cache WHERE version != ? OR updated_at < ?",
+            (RESULT_CACHE_VERSION, time() - RESULT_CACHE_MAX_AGE_SECONDS),
+        )
+        conn.execute(
+            "DELETE FROM mediainfo_cache WHERE identity NOT IN ("
+            "SELECT identity FROM mediainfo_cache ORDER BY updated_at DESC LIMIT ?)",
+            (RESULT_CACHE_MAX_ROWS,),
+        )
+        conn.commit()
+
+    def get(self, identity: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的归一化媒体信息（先查尚未落盘的写入缓冲，刚解析的结果不会重复探测）。
+
+        :param identity: strm_identity 计算出的标识
+        :return: 媒体信息（source 字段为 "cache"），未命中返回 None
+        """
+        if not identity or self._conn is None:
+            return None
+        with self._lock:
+            # 同一标识可能缓冲多次，取最后一次
+            row = next(
+                ((r[3],) for r in reversed(self._pending) if r[0] == identity), None
+            )
+            if row is None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT payload FROM mediainfo_cache WHERE identity = ? AND version = ?",
+                        (identity, RESULT_CACHE_VERSION),
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.debug("PlexToolbox 媒体信息缓存读取失败: %s", e)
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        try:
+            info = json.loads(row[0])
+        except ValueError:
+            return None
+        info["source"] = "cache"
+        return info
+
+    def put(self, identity: str, info: Dict[str, Any]) -> None:
+        """
+        缓存一条解析结果（去掉 part 相关字段），缓冲满一批即落盘。
+
+        :param identity: strm_identity 计算出的标识
+        :param info: 数据源返回的归一化媒体信息
+        """
+        if not identity or not info or self._conn is None:
+            return
+        if info.get("source") == "cache":
+            return
+        payload = {k: v for k, v in info.items() if k not in _PART_FIELDS}
+        row = (
+            identity,
+            RESULT_CACHE_VERSION,
+            info.get("source"),
+            json.dumps(payload, ensure_ascii=False, separators=(",", ":")),
+            time(),
+        )
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= RESULT_CACHE_FLUSH_BATCH:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """把缓冲中的写入落盘。"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        """落盘缓冲（调用方已持锁）。"""
+        if not self._pending or self._conn is None:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            self._conn.executemany(_UPSERT_SQL, batch)
+            self._conn.commit()
+            self.stored += len(batch)
+        except sqlite3.Error as e:
+            logger.debug("PlexToolbox 媒体信息缓存写入失败（%s 条）: %s", len(batch), e)
+
+    def close(self) -> None:
+        """落盘剩余缓冲并关闭连接。"""
+        with self._lock:
+            self._flush_locked()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回缓存统计。
+
+        :return: {rows, hits, misses, stored, pending}
+        """
+        with self._lock:
+            rows = None
+            if self._conn is not None:
+                try:
+                    rows = self._conn.execute(
+                        "SELECT COUNT(*) FROM mediainfo_cache"
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    rows = None
+            return {
+                "rows": rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stored": self.stored,
+                "pending": len(self._pending),
+            }
@@ -0,0 +1,403 @@
+"""helper 写入调度：按条数与字节数分块，Plex 繁忙时指数退避，写不进去的条目持久化到 Plex 空闲再补写。"""
+
+import json
+import sqlite3
+from threading import Event, Lock
+from time import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+from .helper_client import HelperClient
+
+# 单块写入的最大条数与最大请求体字节数（两者先到为准）
+WRITE_CHUNK_MAX_ITEMS = 200
+WRITE_CHUNK_MAX_BYTES = 512 * 1024
+# 单块遇到 Plex 繁忙 / helper 无响应时的重试次数、首次退避秒数与退避上限
+WRITE_BUSY_RETRIES = 4
+WRITE_BACKOFF_SECONDS = 2.0
+WRITE_BACKOFF_MAX_SECONDS = 60.0
+# 待写队列最多保留的条数，超出时淘汰最早入队的
+PENDING_MAX_ROWS = 50000
+# 同一条目补写仍被 helper 拒绝（非繁忙原因）的次数上限，超过即丢弃
+PENDING_MAX_ATTEMPTS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_writes (
+    part_id   TEXT PRIMARY KEY,
+    payload   TEXT NOT NULL,
+    queued_at REAL NOT NULL,
+    attempts  INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_pending_writes_queued ON pending_writes(queued_at);
+"""
+
+# 同一 part 重复入队时以新 payload 为准，失败次数清零
+_UPSERT_SQL = """
+INSERT INTO pending_writes (part_id, payload, queued_at, attempts)
+VALUES (?, ?, ?, 0)
+ON CONFLICT(part_id) DO UPDATE SET
+    payload = excluded.payload,
+    queued_at = excluded.queued_at,
+    attempts = 0
+"""
+
+
+def _payload_bytes(payload: Dict[str, Any]) -> int:
+    """估算单条 payload 在请求体中的字节数。"""
+    return len(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def split_payloads(
+    payloads: List[Dict[str, Any]],
+    max_items: int = WRITE_CHUNK_MAX_ITEMS,
+    max_bytes: int = WRITE_CHUNK_MAX_BYTES,
+) -> List[List[Dict[str, Any]]]:
+    """
+    把 payload 按条数与字节数上限切成若干块（单条超限时独占一块）。
+
+    :param payloads: 待写入的 payload 列表
+    :param max_items: 每块最大条数
+    :param max_bytes: 每块最大字节数
+    :return: 分块列表
+    """
+    max_items = max(1, max_items)
+    chunks: List[List[Dict[str, Any]]] = []
+    chunk: List[Dict[str, Any]] = []
+    size = 0
+    for p in payloads:
+        n = _payload_bytes(p)
+        if chunk and (len(chunk) >= max_items or size + n > max_bytes):
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(p)
+        size += n
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class PendingWriteQueue:
+    """
+    基于 SQLite 的待写队列（插件数据目录下单文件），按 part_id 去重。
+
+    补全运行、播前补全与定时补写共用一个实例，连接访问统一加锁。
+    """
+
+    def __init__(self, db_path: str) -> None:
+        """
+        打开队列库。
+
+        :param db_path: SQLite 文件路径
+        """
+        self._db_path = db_path
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.queued = 0
+        self.drained = 0
+        self.dropped = 0
+        try:
+            self._conn = sqlite3.connect(db_path, timeout=10.0, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            logger.warning("PlexToolbox 待写队列打开失败 %s: %s", db_path, e)
+            self._conn = None
+
+    @property
+    def available(self) -> bool:
+        """队列库是否可用。"""
+        return self._conn is not None
+
+    def add(self, payloads: List[Dict[str, Any]]) -> int:
+        """
+        把未能写入的 payload 放入队列。
+
+        :param payloads: helper payload 列表（须含 part_id）
+        :return: 实际入队条数
+        """
+        now = time()
+        rows = [
+            (str(p["part_id"]), json.dumps(p, ensure_ascii=False, separators=(",", ":")), now)
+            for p in payloads if p.get("part_id") is not None
+        ]
+        if not rows or self._conn is None:
+            return 0
+        with self._lock:
+            try:
+                self._conn.executemany(_UPSERT_SQL, rows)
+                cur = self._conn.execute(
+                    "DELETE FROM pending_writes WHERE part_id NOT IN ("
+                    "SELECT part_id FROM pending_writes ORDER BY queued_at DESC LIMIT ?)",
+                    (PENDING_MAX_ROWS,),
+                )
+                self.dropped += max(0, cur.rowcount)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("PlexToolbox 待写队列写入失败（%s 条）: %s", len(rows), e)
+                return 0
+            self.queued += len(rows)
+        return len(rows)
+
+    def take(
+        self, limit: int, after: Optional[Tuple[float, str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[float, str]]]:
+        """
+        按入队先后取出最多 limit 条（不删除，写入成功后再 settle）。
+
+        一次补写内用 after 游标逐页向后取，被拒绝而留在队首的条目不会在同一次补写中被反复重发。
+
+        :param limit: 最多条数
+        :param after: 上一页返回的游标，只取排在其后的条目
+        :return: (payload 列表, 本页最后一条的游标；没有取到时为 None)
+        """
+        if self._conn is None:
+            return [], None
+        if after is None:
+            sql = (
+                "SELECT payload, queued_at, part_id FROM pending_writes "
+                "ORDER BY queued_at, part_id LIMIT ?"
+            )
+            params: Tuple[Any, ...] = (limit,)
+        else:
+            sql = (
+                "SELECT payload, queued_at, part_id FROM pending_writes "
+                "WHERE queued_at > ? OR (queued_at = ? AND part_id > ?) "
+                "ORDER BY queued_at, part_id LIMIT ?"
+            )
+            params = (after[0], after[0], after[1], limit)
+        with self._lock:
+            try:
+                rows = self._conn.execute(sql, params).fetchall()
+            except sqlite3.Error as e:
+                logger.debug("PlexToolbox 待写队列读取失败: %s", e)
+                return [], None
+        items: List[Dict[str, Any]] = []
+        for raw, _queued_at, _part_id in rows:
+            try:
+                items.append(json.loads(raw))
+            except ValueError:
+                continue
+        cursor = (rows[-1][1], rows[-1][2]) if rows else None
+        return items, cursor
+
+    def settle(self, written: List[Any], rejected: List[Any]) -> None:
+        """
+        补写后更新队列：写入成功的移除；被拒绝的累加失败次数，超过上限即丢弃。
+
+        :param written: 写入成功的 part_id
+        :param rejected: helper 返回失败（非繁忙）的 part_id
+        """
+        if self._conn is None or not (written or rejected):
+            return
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "DELETE FROM pending_writes WHERE part_id = ?",
+                    [(str(pid),) for pid in written],
+                )
+                self._conn.executemany(
+                    "UPDATE pending_writes SET attempts = attempts + 1 WHERE part_id = ?",
+                    [(str(pid),) for pid in rejected],
+                )
+                cur = self._conn.execute(
+                    "DELETE FROM pending_writes WHERE attempts >= ?", (PENDING_MAX_ATTEMPTS,)
+                )
+                self.dropped += max(0, cur.rowcount)
+                self._conn.commit()
+                self.drained += len(written)
+            except sqlite3.Error as e:
+                logger.debug("PlexToolbox 待写队列更新失败: %s", e)
+
+    def count(self) -> int:
+        """返回队列中的条数（库不可用时为 0）。"""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            try:
+                return self._conn.execute("SELECT COUNT(*) FROM pending_writes").fetchone()[0]
+            except sqlite3.Error:
+                return 0
+
+    def close(self) -> None:
+        """关闭连接。"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回队列统计。
+
+        :return: {pending, queued, drained, dropped}
+        """
+        return {
+            "pending": self.count(),
+            "queued": self.queued,
+            "drained": self.drained,
+            "dropped": self.dropped,
+        }
+
+
+class HelperWriteScheduler:
+    """
+    helper 写入调度器：分块发送，繁忙时退避重试，最终仍写不进去的块放入待写队列。
+
+    每块是 helper 侧的一个独立事务，避免一次大事务长时间占用 Plex 数据库写锁。
+    """
+
+    def __init__(
+        self,
+        helper: HelperClient,
+        pending: Optional[PendingWriteQueue] = None,
+        force: bool = False,
+        max_items: int = WRITE_CHUNK_MAX_ITEMS,
+        max_bytes: int = WRITE_CHUNK_MAX_BYTES,
+        retries: int = WRITE_BUSY_RETRIES,
+        stop: Optional[Event] = None,
+    ) -> None:
+        """
+        :param helper: helper 写库客户端
+        :param pending: 插件共享的待写队列；为 None 时写不进去的条目直接计为失败
+        :param force: 是否忽略 Plex 繁忙强制写入
+        :param max_items: 每块最大条数
+        :param max_bytes: 每块最大请求体字节数
+        :param retries: 单块繁忙 / 无响应时的重试次数
+        :param stop: 停止事件，置位后退避等待立即结束、不再重试
+        """
+        self._helper = helper
+        self._pending = pending if pending is not None and pending.available else None
+        self._force = force
+        self._max_items = max(1, max_items)
+        self._max_bytes = max(1, max_bytes)
+        self._retries = max(0, retries)
+        self._stop = stop or Event()
+        # 上一块退避用尽仍未写入：后续块只复查一次 /busy，仍繁忙就直接交给待写队列
+        self._gave_up = False
+
+    @property
+    def persistent(self) -> bool:
+        """是否有可用的待写队列。"""
+        return self._pending is not None
+
+    def split(self, payloads: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """按本调度器的条数 / 字节数上限分块。"""
+        return split_payloads(payloads, self._max_items, self._max_bytes)
+
+    def send(self, chunk: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        写入一块，helper 无响应或 Plex 繁忙时按指数退避重试。
+
+        重试前先查 helper /busy，仍繁忙就继续等待而不重发整块请求体。
+        某块退避用尽仍未写入后，本次运行的后续块不再逐块退避：先查一次 /busy，
+        仍繁忙或查询失败就立即返回，由调用方放入待写队列。
+
+        :param chunk: 本块 payload
+        :return: 最后一次 helper.write_batch 返回值；跳过发送时繁忙返回 {"busy": True}，
+            helper 无响应返回 None
+        """
+        if self._gave_up and not self._force:
+            busy = self._helper.busy()
+            if busy is not False:
+                logger.info("PlexToolbox Plex 仍繁忙，本块 %s 条不再退避重试", len(chunk))
+                return {"busy": True} if busy else None
+            self._gave_up = False
+        res: Optional[Dict[str, Any]] = None
+        for attempt in range(self._retries + 1):
+            if attempt:
+                delay = min(
+                    WRITE_BACKOFF_MAX_SECONDS, WRITE_BACKOFF_SECONDS * (2 ** (attempt - 1))
+                )
+                if self._stop.wait(delay):
+                    break
+                if not self._force and self._helper.busy():
+                    logger.info(
+                        "PlexToolbox Plex 仍繁忙，第 %s 次退避后跳过重发（本块 %s 条）",
+                        attempt, len(chunk),
+                    )
+                    continue
+                logger.info("PlexToolbox 重试写入第 %s 次：本块 %s 条", attempt, len(chunk))
+            res = self._helper.write_batch(chunk, force=self._force)
+            if res is not None and not res.get("busy"):
+                break
+        self._gave_up = res is None or bool(res.get("busy"))
+        return res
+
+    def defer(self, chunk: List[Dict[str, Any]]) -> int:
+        """
+        把写不进去的块放入待写队列。
+
+        :param chunk: 本块 payload
+        :return: 入队条数；无队列时为 0
+        """
+        if self._pending is None:
+            return 0
+        n = self._pending.add(chunk)
+        if n:
+            logger.info("PlexToolbox %s 条媒体信息已放入待写队列，Plex 空闲后补写", n)
+        return n
+
+    def drain(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Plex 空闲时把待写队列逐块补写进 helper（不重试，遇繁忙即停）。
+
+        每条在一次补写中至多发送一次，被拒绝的条目要跨多次补写才会累计到 PENDING_MAX_ATTEMPTS。
+
+        :param limit: 本次最多补写条数，缺省为全部
+        :return: {pending, written, rejected, busy}
+        """
+        result = {"pending": 0, "written": 0, "rejected": 0, "busy": False}
+        if self._pending is None:
+            return result
+        result["pending"] = self._pending.count()
+        if not result["pending"]:
+            return result
+        if not self._force and self._helper.busy() is not False:
+            # 繁忙或查询失败都不补写，留给下一次
+            result["busy"] = True
+            return result
+        remaining = result["pending"] if limit is None else min(limit, result["pending"])
+        cursor: Optional[Tuple[float, str]] = None
+        while remaining > 0 and not self._stop.is_set():
+            items, cursor = self._pending.take(min(self._max_items, remaining), cursor)
+            if cursor is None:
+                break
+            if not items:
+                continue
+            written, rejected, res = self._send_pending(items)
+            self._pending.settle(written, rejected)
+            result["written"] += len(written)
+            result["rejected"] += len(rejected)
+            if res is None or res.get("busy"):
+                result["busy"] = bool(res and res.get("busy"))
+                break
+            remaining -= len(items)
+        result["pending"] = self._pending.count()
+        if result["written"] or result["rejected"]:
+            logger.info(
+                "PlexToolbox 待写队列补写：成功 %s 条，失败 %s 条，剩余 %s 条",
+                result["written"], result["rejected"], result["pending"],
+            )
+        return result
+
+    def _send_pending(
+        self, items: List[Dict[str, Any]]
+    ) -> Tuple[List[Any], List[Any], Optional[Dict[str, Any]]]:
+        """
+        按字节上限分块补写一批队列条目。
+
+        :param items: 从队列取出的 payload
+        :return: (写入成功的 part_id, 被拒绝的 part_id, 最后一次返回值)
+        """
+        written: List[Any] = []
+        rejected: List[Any] = []
+        res: Optional[Dict[str, Any]] = None
+        for chunk in split_payloads(items, self._max_items, self._max_bytes):
+            res = self._helper.write_batch(chunk, force=self._force)
+            if res is None or res.get("busy"):
+                break
+            for r in res.get("results") or []:
+                (written if r.get("success") else rejected).append(r.get("part_id"))
+        return written, rejected, res